@@ -0,0 +1,316 @@
+import argparse
+import gc
+import json
+import platform
+import random
+import sys
+import time
+from typing import Callable, Dict, List
+
+from board import (SYMBOLS, CascadeCache, apply_gravity, calculate_points, fill_board,
+                   find_matches, generate_board, process_move)
+from moves import MoveIndex, parse_move
+
+BASELINE = "bench_baseline.json"
+# Códigos de saída: piora confirmada e linha de base ausente (nada a comparar)
+EXIT_REGRESSION = 1
+EXIT_NO_BASELINE = 2
+
+
+class Case:
+    """Um cenário medido: prepara entradas novas a cada repetição e roda func em todas"""
+
+    def __init__(self, name: str, func: Callable, make_inputs: Callable[[], List]):
+        self.name = name
+        self.func = func
+        self.make_inputs = make_inputs
+
+    def _time(self, inputs) -> float:
+        func = self.func
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for item in inputs:
+                func(item)
+            return time.perf_counter() - start
+        finally:
+            gc.enable()
+
+    def run(self, repeat: int, min_time: float = 0.02) -> float:
+        """Menor tempo por operação (ns) entre as repetições, sem o coletor de lixo (como timeit).
+
+        Cada repetição passa pelas entradas quantas vezes forem precisas para
+        durar pelo menos min_time segundos.
+        """
+        once = self._time(self.make_inputs())
+        loops = max(1, int(min_time / once) + 1) if once else 1
+        best = float("inf")
+        for _ in range(repeat):
+            inputs = [item for _ in range(loops) for item in self.make_inputs()]
+            best = min(best, self._time(inputs) / len(inputs))
+        return best * 1e9
+
+
+def _copy(board):
+    return [row[:] for row in board]
+
+
+def _with_holes(board, rng: random.Random, fraction: float):
+    board = _copy(board)
+    for row in board:
+        for j in range(len(row)):
+            if rng.random() < fraction:
+                row[j] = ' '
+    return board
+
+
+def _random_board(rng: random.Random):
+    """Tabuleiro sorteado célula a célula, com combinações"""
+    return [[rng.choice(SYMBOLS) for _ in range(6)] for _ in range(6)]
+
+
+def list_process_move(board, move, rng: random.Random = None, symbols=SYMBOLS):
+    """process_move como era antes do motor de bits: a cascata inteira em listas.
+
+    Serve de "antes" nos cenários */lists: mesmos tabuleiros, jogadas e
+    sorteios, só sem a validação e as mensagens de erro.
+    """
+    row1, col1, row2, col2 = parse_move(move) if isinstance(move, str) else move
+    current = [row.copy() for row in board]
+    current[row1][col1], current[row2][col2] = current[row2][col2], current[row1][col1]
+    matches = find_matches(current)
+    if not matches:
+        return {"valid": False, "board": board, "points": 0, "steps": []}
+    steps = []
+    total = 0
+    while matches:
+        steps.append({"board": [row.copy() for row in current], "points": total,
+                      "message": "Combinação encontrada!"})
+        total += calculate_points(matches)
+        for i, j in matches:
+            current[i][j] = ' '
+        steps.append({"board": [row.copy() for row in current], "points": total,
+                      "message": "Removendo peças..."})
+        apply_gravity(current)
+        fill_board(current, rng, symbols)
+        matches = find_matches(current)
+    return {"valid": True, "board": current, "points": total, "steps": steps}
+
+
+# Cenário medido -> o mesmo trabalho na implementação anterior, para o ganho
+SPEEDUPS = {
+    "process_move/valid": "process_move/valid_lists",
+    "process_move/deep_cascade": "process_move/deep_cascade_lists",
+    "process_move/64x64": "process_move/64x64_lists",
+}
+
+
+def _cascade_depth(result) -> int:
+    return len(result["steps"]) // 2
+
+
+def build_cases(size: int, seed: int = 2024) -> List[Case]:
+    """Distribuições fixas (seed), para os números serem comparáveis entre execuções"""
+    rng = random.Random(seed)
+    clean = [generate_board(rng) for _ in range(size)]
+    noisy = [_random_board(rng) for _ in range(size)]
+    # Pior caso: linhas longas, tabuleiro inteiro de um símbolo e listras
+    uniform = [[symbol] * 6 for symbol in ['R'] * 6]
+    stripes = [[SYMBOLS[i % len(SYMBOLS)]] * 6 for i in range(6)]
+    long_lines = [uniform, stripes] * (size // 2)
+    holes = [_with_holes(board, rng, 0.3) for board in clean]
+    column_holes = [[[' '] * 3 + row[3:] for row in board] for board in clean]
+    matches = [find_matches(board) for board in noisy]
+    full_matches = [find_matches(uniform)] * size
+
+    # Jogadas válidas comuns, jogadas inválidas e cascatas longas (3+ rodadas)
+    valid, deep = [], []
+    attempt = 0
+    while len(valid) < size or len(deep) < size // 4:
+        board = generate_board(rng)
+        hints = MoveIndex(board).hints()
+        if not hints:
+            continue
+        move = rng.choice(hints)
+        attempt += 1
+        move_seed = f"bench:{attempt}"
+        result = process_move(board, move, random.Random(move_seed))
+        entry = (board, move, move_seed)
+        if len(valid) < size:
+            valid.append(entry)
+        if _cascade_depth(result) >= 3 and len(deep) < size // 4:
+            deep.append(entry)
+    invalid = [(board, "A1 A1", None) for board in clean]
+
+    # Modo maratona: o custo deve crescer perto do linear no número de células
+    big = max(size // 20, 1)
+    marathon = [generate_board(rng, 64, 64) for _ in range(big)]
+    marathon_moves = [(board, rng.choice(MoveIndex(board).hints()), f"bench:64:{k}")
+                      for k, board in enumerate(marathon)]
+
+    def moves(entries):
+        return lambda: [(board, move, random.Random(s) if s else None) for board, move, s in entries]
+
+    # Sem cache: as mesmas entradas se repetem entre as rodadas do benchmark
+    def cold(entry):
+        return process_move(*entry, cache=None)
+
+    warm = CascadeCache(max_cells=10 ** 7)
+
+    def cached(entry):
+        return process_move(*entry, cache=warm)
+
+    # Cache ligado numa partida comum: jogadas que não se repetem, cada
+    # consulta é uma falta e paga a chave e a gravação (compare com valid)
+    def unique_moves():
+        cache = CascadeCache()
+        return [(board, move, random.Random(s), cache) for board, move, s in valid]
+
+    def missed(entry):
+        board, move, rng, cache = entry
+        return process_move(board, move, rng, cache=cache)
+
+    def lists(entry):
+        return list_process_move(*entry)
+
+    return [
+        Case("generate_board", generate_board, lambda: [random.Random(i) for i in range(size)]),
+        Case("find_matches/no_match", find_matches, lambda: clean),
+        Case("find_matches/random", find_matches, lambda: noisy),
+        Case("find_matches/long_lines", find_matches, lambda: long_lines),
+        Case("apply_gravity/holes", apply_gravity, lambda: [_copy(b) for b in holes]),
+        Case("apply_gravity/columns", apply_gravity, lambda: [_copy(b) for b in column_holes]),
+        Case("fill_board/holes", lambda b: fill_board(b, random.Random(0)), lambda: [_copy(b) for b in holes]),
+        Case("calculate_points/random", calculate_points, lambda: matches),
+        Case("calculate_points/full_board", calculate_points, lambda: full_matches),
+        Case("process_move/valid", cold, moves(valid)),
+        Case("process_move/valid_lists", lists, moves(valid)),
+        Case("process_move/deep_cascade", cold, moves(deep)),
+        Case("process_move/deep_cascade_lists", lists, moves(deep)),
+        Case("process_move/invalid", cold, moves(invalid)),
+        Case("process_move/cached", cached, moves(valid)),
+        Case("process_move/cache_miss", missed, unique_moves),
+        Case("generate_board/64x64", lambda r: generate_board(r, 64, 64),
+             lambda: [random.Random(i) for i in range(big)]),
+        Case("move_index/64x64", MoveIndex, lambda: marathon),
+        Case("process_move/64x64", cold, moves(marathon_moves)),
+        Case("process_move/64x64_lists", lists, moves(marathon_moves)),
+    ]
+
+
+def calibrate(repeat: int) -> float:
+    """Tempo (ns) de um laço Python de referência, para normalizar entre máquinas"""
+    def loop():
+        total = 0
+        for i in range(10000):
+            total += i * i % 7
+        return total
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        loop()
+        best = min(best, time.perf_counter() - start)
+    return best * 1e9
+
+
+def run(size: int, repeat: int, only: str = None, names=None) -> Dict:
+    cases = [case for case in build_cases(size)
+             if (not only or only in case.name) and (names is None or case.name in names)]
+    results = {}
+    references = []
+    for case in cases:
+        # Calibra junto de cada cenário: variações de frequência da CPU
+        # afetam os dois igualmente
+        reference = calibrate(repeat)
+        references.append(reference)
+        ns = case.run(repeat)
+        results[case.name] = {"ns_per_op": round(ns, 1), "relative": ns / reference}
+    reference = min(references)
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "calibration_ns": round(reference, 1),
+        "results": results,
+    }
+
+
+def keep_best(current: Dict, other: Dict):
+    """Fica, em cada cenário, com a rodada de menor tempo normalizado"""
+    for name, result in other["results"].items():
+        if result["relative"] < current["results"][name]["relative"]:
+            current["results"][name] = result
+    current["calibration_ns"] = min(current["calibration_ns"], other["calibration_ns"])
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Casos em que o tempo normalizado piorou mais que threshold (0.2 = 20%)"""
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        change = result["relative"] / base["relative"] - 1
+        result["change"] = round(change, 3)
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks do board.py com comparação à linha de base")
+    parser.add_argument("--size", type=int, default=400, help="Entradas por cenário")
+    parser.add_argument("--repeat", type=int, default=15, help="Repetições (vale a menor)")
+    parser.add_argument("--rounds", type=int, default=1,
+                        help="Rodadas completas; vale a melhor de cada cenário (use 3+ ao gravar a base)")
+    parser.add_argument("--only", default=None, help="Roda só os cenários que contêm este texto")
+    parser.add_argument("--output", default="bench_results.json", help="Arquivo com os resultados")
+    parser.add_argument("--baseline", default=BASELINE,
+                        help="Linha de base a comparar (a do repositório, ou uma local gravada com --save-baseline)")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Piora tolerada antes de falhar (0.25 = 25%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="Grava os resultados como nova linha de base")
+    args = parser.parse_args()
+
+    current = run(args.size, args.repeat, args.only)
+    for _ in range(args.rounds - 1):
+        keep_best(current, run(args.size, args.repeat, args.only))
+    try:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = None
+    regressions = compare(current, baseline, args.threshold) if baseline else []
+    if regressions:
+        # Confirma numa segunda rodada: ruído da máquina costuma afetar uma só
+        keep_best(current, run(args.size, args.repeat, names=set(regressions)))
+        regressions = compare(current, baseline, args.threshold)
+
+    print(f"{'cenário':<30}{'ns/op':>12}{'vs base':>10}")
+    for name, result in current["results"].items():
+        change = result.get("change")
+        mark = f"{change:+.0%}" if change is not None else "-"
+        flag = "  <- regressão" if name in regressions else ""
+        print(f"{name:<30}{result['ns_per_op']:>12.0f}{mark:>10}{flag}")
+    for name, before in SPEEDUPS.items():
+        if name in current["results"] and before in current["results"]:
+            # Tempos normalizados: cada cenário foi calibrado junto da sua medição
+            ratio = current["results"][before]["relative"] / current["results"][name]["relative"]
+            print(f"{name}: {ratio:.2f}x mais rápido que a cascata em listas")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(current, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+        print(f"Linha de base gravada em {args.baseline}")
+    elif baseline is None:
+        # Sem linha de base nada foi comparado: não pode passar como sucesso
+        print(f"Linha de base {args.baseline} não encontrada; grave uma com --save-baseline")
+        sys.exit(EXIT_NO_BASELINE)
+    elif regressions:
+        print(f"{len(regressions)} cenário(s) mais lentos que a linha de base além de {args.threshold:.0%}")
+        sys.exit(EXIT_REGRESSION)
+
+
+if __name__ == "__main__":
+    main()
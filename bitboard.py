@@ -0,0 +1,296 @@
+import random
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+
+
+class Layout:
+    """Geometria de um tabuleiro empacotado em bits.
+
+    Cada célula (i, j) ocupa o bit i * stride + j. A coluna extra do stride
+    fica sempre zerada e impede que sequências horizontais atravessem linhas.
+    """
+
+    def __init__(self, rows: int, cols: int):
+        self.rows = rows
+        self.cols = cols
+        self.stride = cols + 1
+        row_bits = (1 << cols) - 1
+        self.row_masks = [row_bits << (i * self.stride) for i in range(rows)]
+        first_col = int("1".rjust(self.stride, "0") * rows, 2) if rows else 0
+        self.col_masks = [first_col << j for j in range(cols)]
+        self.full = sum(self.row_masks)
+        self.row_bits = row_bits
+        self.first_col = self.col_masks[0] if cols else 0
+        # Deslocamentos que espalham um bit por toda a linha/coluna sem passar
+        # para a vizinha (soma total cols - 1 e rows - 1)
+        self.row_folds = self._folds(cols, 1)
+        self.col_folds = self._folds(rows, self.stride)
+
+    def bit(self, i: int, j: int) -> int:
+        return 1 << (i * self.stride + j)
+
+    def cell(self, p: int) -> Tuple[int, int]:
+        return divmod(p, self.stride)
+
+    @staticmethod
+    def _folds(length: int, unit: int) -> Tuple[int, ...]:
+        shifts = []
+        covered = 1
+        while covered < length:
+            shift = min(covered, length - covered)
+            shifts.append(shift * unit)
+            covered += shift
+        return tuple(shifts)
+
+    def touched_rows(self, cells: int) -> int:
+        """Máscara das linhas inteiras que contêm alguma das células"""
+        for shift in self.row_folds:
+            cells |= cells >> shift
+        return (cells & self.first_col) * self.row_bits
+
+    def cells_above(self, cells: int) -> int:
+        """Células acima das dadas, nas mesmas colunas (sem incluir as dadas)"""
+        spread = cells
+        for shift in self.col_folds:
+            spread |= spread >> shift
+        return spread & ~cells
+
+    def touched_cols(self, cells: int) -> int:
+        """Máscara das colunas inteiras que contêm alguma das células"""
+        for shift in self.col_folds:
+            cells |= cells >> shift
+        return (cells & self.row_masks[0]) * self.first_col
+
+
+@lru_cache(maxsize=None)
+def layout(rows: int = 6, cols: int = 6) -> Layout:
+    """Retorna a geometria (compartilhada) para as dimensões dadas"""
+    return Layout(rows, cols)
+
+
+def iter_bits(mask: int):
+    """Itera as posições dos bits ligados, da menor para a maior"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def board_text(board: Sequence[Sequence[str]]) -> str:
+    """As linhas unidas num texto, com um espaço no lugar da coluna de guarda"""
+    return ' '.join(map(''.join, board))
+
+
+@lru_cache(maxsize=None)
+def _mask_table(symbol: str) -> bytes:
+    """Tabela de translate que marca com '1' apenas o símbolo dado"""
+    table = bytearray(b'0' * 256)
+    table[ord(symbol)] = ord('1')
+    return bytes(table)
+
+
+@lru_cache(maxsize=None)
+def _symbol_table(symbol: str) -> bytes:
+    """Tabela de translate que troca os dígitos '1' pelo símbolo"""
+    return bytes.maketrans(b'01', b'\0' + symbol.encode('latin-1'))
+
+
+def text_masks(text: bytes, symbols) -> Dict[str, int]:
+    """Máscara de cada símbolo num texto em que o byte p é a célula do bit p.
+
+    Os outros bytes (vazios, coluna de guarda) não entram em máscara nenhuma;
+    símbolos ausentes não ganham entrada.
+    """
+    raw = text[::-1]
+    masks = {}
+    for symbol in symbols:
+        mask = int(raw.translate(_mask_table(symbol)), 2)
+        if mask:
+            masks[symbol] = mask
+    return masks
+
+
+def _run_sizes(m: int, shift: int, sizes: Dict[int, int]) -> int:
+    """Acumula em sizes as células de sequências 3+ de m na direção do shift.
+
+    Como em board.find_matches, cada célula recebe o comprimento da sequência
+    contado dela até o fim (direita/baixo), com mínimo de 3. Retorna a máscara
+    de todas as células em sequência.
+    """
+    starts = m & (m >> shift) & (m >> (2 * shift))
+    if not starts:
+        return 0
+    cover = starts | (starts << shift) | (starts << (2 * shift))
+    current = cover
+    length = 3
+    while current:
+        # Células a partir das quais há pelo menos length + 1 peças iguais
+        longer = starts & (m >> (length * shift))
+        exact = current & ~longer
+        if exact:
+            sizes[length] = sizes.get(length, 0) | exact
+        current = starts = longer
+        length += 1
+    return cover
+
+
+class BitBoard:
+    """Tabuleiro representado por uma máscara de bits por símbolo.
+
+    dirty guarda as células alteradas desde a última busca de combinações.
+    Como toda busca remove o que encontra, uma combinação nova sempre passa
+    por uma célula alterada: basta olhar as linhas e colunas delas.
+    """
+
+    __slots__ = ("masks", "layout", "dirty")
+
+    def __init__(self, masks: Dict[str, int], board_layout: Layout = None):
+        self.masks = masks
+        self.layout = board_layout or layout()
+        # Sem histórico conhecido: a primeira busca varre o tabuleiro inteiro
+        self.dirty = self.layout.full
+
+    @classmethod
+    def from_rows(cls, board: Sequence[Sequence[str]]) -> "BitBoard":
+        """Converte a representação em listas (usada no JSON) para bits.
+
+        As linhas são unidas num único texto (um espaço faz o papel da coluna
+        de guarda) e cada símbolo vira uma máscara com um translate em C.
+        """
+        return cls.from_text(board_text(board), len(board), len(board[0]) if board else 0)
+
+    @classmethod
+    def from_text(cls, text: str, rows: int, cols: int) -> "BitBoard":
+        """from_rows a partir de board_text já calculado"""
+        return cls(text_masks(text.encode('latin-1'), set(text) - {' '}), layout(rows, cols))
+
+    def to_rows(self) -> List[List[str]]:
+        """Converte de volta para List[List[str]], com ' ' nas células vazias"""
+        geo = self.layout
+        size = geo.rows * geo.stride
+        width = f'0{size}b'
+        packed = 0
+        for symbol, mask in self.masks.items():
+            digits = format(mask, width).encode('ascii')
+            packed |= int.from_bytes(digits.translate(_symbol_table(symbol)), 'big')
+        flat = list(packed.to_bytes(size, 'little').replace(b'\0', b' ').decode('latin-1'))
+        cols = geo.cols
+        return [flat[start:start + cols] for start in range(0, size, geo.stride)]
+
+    def copy(self) -> "BitBoard":
+        clone = BitBoard(dict(self.masks), self.layout)
+        clone.dirty = self.dirty
+        return clone
+
+    def occupied(self) -> int:
+        result = 0
+        for mask in self.masks.values():
+            result |= mask
+        return result
+
+    def symbol_at(self, p: int) -> str:
+        bit = 1 << p
+        for symbol, mask in self.masks.items():
+            if mask & bit:
+                return symbol
+        return ' '
+
+    def swap(self, p1: int, p2: int):
+        """Troca o conteúdo de duas células"""
+        if p1 == p2:
+            return
+        both = (1 << p1) | (1 << p2)
+        self.dirty |= both
+        for symbol, mask in self.masks.items():
+            bits = mask & both
+            # Apenas uma das células tem este símbolo: inverte as duas
+            if bits and bits != both:
+                self.masks[symbol] = mask ^ both
+
+    def match_sizes(self) -> Dict[int, int]:
+        """Encontra sequências 3+ e agrupa as células pelo tamanho.
+
+        Segue a mesma regra de board.find_matches: uma célula que está numa
+        sequência vertical recebe o tamanho da vertical; caso contrário o da
+        horizontal (ver _run_sizes). Só varre as linhas e colunas com células
+        alteradas (dirty) e depois limpa dirty.
+        """
+        geo = self.layout
+        stride = geo.stride
+        dirty = self.dirty
+        self.dirty = 0
+        if dirty == geo.full:
+            cols = rows = dirty
+        else:
+            cols = geo.touched_cols(dirty)
+            rows = geo.touched_rows(dirty)
+        sizes = {}
+        double = 2 * stride
+        for mask in self.masks.values():
+            # Símbolos sem célula alterada não podem formar combinação nova
+            if not mask & dirty:
+                continue
+            by_col = mask & cols
+            by_row = mask & rows
+            # Sem três seguidas em nenhuma direção (o caso comum) nada é montado
+            if not (by_col & (by_col >> stride) & (by_col >> double)
+                    or by_row & (by_row >> 1) & (by_row >> 2)):
+                continue
+            vertical = {}
+            v_cells = _run_sizes(by_col, stride, vertical)
+            horizontal = {}
+            if _run_sizes(by_row, 1, horizontal):
+                for size, cells in horizontal.items():
+                    cells &= ~v_cells
+                    if cells:
+                        sizes[size] = sizes.get(size, 0) | cells
+            for size, cells in vertical.items():
+                sizes[size] = sizes.get(size, 0) | cells
+        return sizes
+
+    def clear(self, cells: int):
+        """Remove as peças das células indicadas"""
+        keep = ~cells
+        for symbol in self.masks:
+            self.masks[symbol] &= keep
+
+    def apply_gravity(self):
+        """Faz as peças caírem sobre as células vazias.
+
+        Linha a linha, de cima para baixo: os buracos de uma mesma linha estão
+        em colunas diferentes, então todos descem o que está acima deles num
+        só deslocamento. O custo cresce com o número de linhas com buracos,
+        não com o de buracos.
+        """
+        geo = self.layout
+        holes = geo.full & ~self.occupied()
+        if not holes:
+            return
+        stride = geo.stride
+        masks = self.masks
+        for row_mask in geo.row_masks:
+            row_holes = holes & row_mask
+            if not row_holes:
+                continue
+            up = geo.cells_above(row_holes)
+            # Os buracos e tudo acima deles nas colunas mudam de conteúdo
+            self.dirty |= up | row_holes
+            if not up:
+                continue
+            keep = ~up
+            for symbol, mask in masks.items():
+                moving = mask & up
+                if moving:
+                    masks[symbol] = (mask & keep) | (moving << stride)
+
+    def fill(self, symbols: Sequence[str], rng: random.Random = None):
+        """Preenche as células vazias em ordem de linha, como fill_board"""
+        choice = (rng or random).choice
+        masks = self.masks
+        for symbol in symbols:
+            masks.setdefault(symbol, 0)
+        holes = self.layout.full & ~self.occupied()
+        self.dirty |= holes
+        for p in iter_bits(holes):
+            symbol = choice(symbols)
+            masks[symbol] |= 1 << p
@@ -1,40 +1,141 @@
 import random
-from typing import List, Tuple, Dict
+from collections import OrderedDict, deque
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+from bitboard import BitBoard, iter_bits, layout, text_masks
+from moves import MoveIndex, parse_move
 
-def generate_board() -> List[List[str]]:
-    """Gera um tabuleiro 6x6 sem combinações iniciais"""
-    symbols = ['R', 'G', 'Y', 'B']
-    while True:
-        board = [[random.choice(symbols) for _ in range(6)] for _ in range(6)]
-        if not find_matches(board):
-            return board
+# Cores disponíveis, na ordem em que entram quando a partida pede mais delas
+PALETTE = ['R', 'G', 'Y', 'B', 'P', 'O', 'C', 'W']
+SYMBOLS = PALETTE[:4]
+# Limites das dimensões configuráveis (64x64 é o modo maratona)
+MIN_SIZE, MAX_SIZE = 4, 64
+MIN_COLORS, MAX_COLORS = 3, len(PALETTE)
+
+def palette(colors: int = len(SYMBOLS)) -> List[str]:
+    """Os primeiros colors símbolos da paleta"""
+    return PALETTE[:colors]
+
+def generate_board(rng: random.Random = None, rows: int = 6, cols: int = 6,
+                   symbols: Sequence[str] = SYMBOLS) -> List[List[str]]:
+    """Gera um tabuleiro rows x cols sem combinações iniciais.
+
+    Monta o tabuleiro célula a célula, sorteando apenas entre os símbolos que
+    não completam uma linha de três com as duas peças à esquerda ou acima.
+    Com 3+ símbolos sempre há opção, então o tempo é linear no número de
+    células (sem sorteio e descarte de tabuleiros inteiros). Passe um
+    random.Random para reproduzir.
+    """
+    rng = rng or random
+    choice = rng.choice
+    symbols = list(symbols)
+    board = []
+    while len(board) < rows:
+        i = len(board)
+        above = board[i - 1] if i >= 2 else None
+        above2 = board[i - 2] if i >= 2 else None
+        row = []
+        for j in range(cols):
+            left = row[j - 1] if j >= 2 and row[j - 1] == row[j - 2] else None
+            up = above[j] if above is not None and above[j] == above2[j] else None
+            if left is None and up is None:
+                row.append(choice(symbols))
+                continue
+            allowed = [s for s in symbols if s != left and s != up]
+            if not allowed:
+                # Só acontece com paletas de 2 símbolos: refaz a linha
+                break
+            row.append(rng.choice(allowed))
+        else:
+            board.append(row)
+    return board
+
+def seeded_board(seed: int, rows: int = 6, cols: int = 6,
+                 symbols: Sequence[str] = SYMBOLS) -> List[List[str]]:
+    """Tabuleiro reproduzível: o mesmo seed gera sempre o mesmo tabuleiro"""
+    return generate_board(random.Random(seed), rows, cols, symbols)
+
+class BoardPool:
+    """Estoque de tabuleiros prontos para novos jogadores.
+
+    take nunca espera: usa um tabuleiro do estoque ou, se estiver vazio, gera
+    na hora. refill_one gera um tabuleiro por chamada, para o servidor
+    reabastecer aos poucos sem travar o loop. Cada tabuleiro vem com o seed
+    que o gerou (seeded_board), para a partida poder ser reproduzida.
+    """
+
+    def __init__(self, size: int, rng: random.Random = None):
+        self.size = size
+        self.rng = rng or random.Random()
+        self.boards = deque()
+
+    def _make(self) -> Tuple[int, List[List[str]]]:
+        seed = self.rng.getrandbits(64)
+        return seed, seeded_board(seed)
+
+    def take(self) -> Tuple[int, List[List[str]]]:
+        """Retorna (seed, tabuleiro)"""
+        if self.boards:
+            return self.boards.popleft()
+        return self._make()
+
+    def needs_refill(self) -> bool:
+        return len(self.boards) < self.size
+
+    def refill_one(self) -> bool:
+        """Gera um tabuleiro; retorna True se o estoque ainda não está cheio"""
+        if self.needs_refill():
+            self.boards.append(self._make())
+        return self.needs_refill()
+
+def shuffle_board(board: List[List[str]], rng: random.Random = None,
+                  symbols: Sequence[str] = SYMBOLS) -> List[List[str]]:
+    """Reembaralha as peças de um tabuleiro sem jogadas possíveis"""
+    rng = rng or random
+    pieces = [cell for row in board for cell in row]
+    cols = len(board[0])
+    for _ in range(100):
+        rng.shuffle(pieces)
+        shuffled = [pieces[i:i + cols] for i in range(0, len(pieces), cols)]
+        if not find_matches(shuffled) and MoveIndex(shuffled).has_moves():
+            return shuffled
+    return generate_board(rng, len(board), cols, symbols)
 
 def find_matches(board: List[List[str]]) -> Dict[Tuple[int, int], int]:
-    """Encontra apenas matches de 3+ peças consecutivas (horizontal/vertical)"""
+    """Encontra apenas matches de 3+ peças consecutivas (horizontal/vertical).
+
+    Varre as listas direto: para uma chamada avulsa, converter para BitBoard
+    e de volta custa mais que a busca. process_move usa o motor de bits.
+    """
     matches = {}
+    rows, cols = len(board), len(board[0])
 
     # Verifica linhas (apenas sequências consecutivas)
-    for i in range(6):
-        for j in range(4):
+    for i in range(rows):
+        for j in range(cols - 2):
             if board[i][j] != ' ' and board[i][j] == board[i][j+1] == board[i][j+2]:
                 k = j + 2
-                while k + 1 < 6 and board[i][j] == board[i][k+1]:
+                while k + 1 < cols and board[i][j] == board[i][k+1]:
                     k += 1
                 for x in range(j, k + 1):
                     matches[(i, x)] = k - j + 1
 
     # Verifica colunas (apenas sequências consecutivas)
-    for j in range(6):
-        for i in range(4):
+    for j in range(cols):
+        for i in range(rows - 2):
             if board[i][j] != ' ' and board[i][j] == board[i+1][j] == board[i+2][j]:
                 k = i + 2
-                while k + 1 < 6 and board[i][j] == board[k+1][j]:
+                while k + 1 < rows and board[i][j] == board[k+1][j]:
                     k += 1
                 for x in range(i, k + 1):
                     matches[(x, j)] = k - i + 1
 
     return matches
 
+def match_cells(bitboard: BitBoard, sizes: Dict[int, int]) -> Dict[Tuple[int, int], int]:
+    """Converte as máscaras por tamanho do motor de bits em {(linha, coluna): tamanho}"""
+    cell = bitboard.layout.cell
+    return {cell(p): size for size, mask in sizes.items() for p in iter_bits(mask)}
+
 def calculate_points(matches: Dict[Tuple[int, int], int]) -> int:
     """Calcula pontos baseado no tamanho das combinações"""
     if not matches:
@@ -42,30 +143,186 @@ def calculate_points(matches: Dict[Tuple[int, int], int]) -> int:
     # Soma pontos de todas as combinações encontradas
     return sum(100 + 50 * (size - 3) for size in matches.values())
 
+def size_points(sizes: Dict[int, int]) -> int:
+    """Mesmo cálculo de calculate_points, a partir das máscaras por tamanho"""
+    return sum((100 + 50 * (size - 3)) * mask.bit_count() for size, mask in sizes.items())
+
+def pack_board(board: List[List[str]]) -> str:
+    """Formato compacto (uma string, linha a linha) para enviar a outros processos"""
+    return ''.join(map(''.join, board))
+
+def unpack_board(text: str, cols: int = 6) -> List[List[str]]:
+    """Desfaz pack_board"""
+    return [list(text[i:i + cols]) for i in range(0, len(text), cols)]
+
 def apply_gravity(board: List[List[str]]):
     """Faz as peças caírem para preencher espaços vazios"""
-    for j in range(6):
+    rows = len(board)
+    for j in range(len(board[0])):
         # Coletar todas as peças da coluna (de baixo pra cima)
-        column = [board[i][j] for i in range(5, -1, -1) if board[i][j] != ' ']
+        column = [board[i][j] for i in range(rows - 1, -1, -1) if board[i][j] != ' ']
         # Preencher com espaços vazios no topo
-        column += [' '] * (6 - len(column))
+        column += [' '] * (rows - len(column))
         # Atualizar a coluna
-        for i in range(6):
-            board[i][j] = column[5 - i]
-
-def fill_board(board: List[List[str]]):
-    """Preenche espaços vazios com novas peças"""
-    symbols = ['R', 'G', 'Y', 'B']
-    for i in range(6):
-        for j in range(6):
-            if board[i][j] == ' ':
-                board[i][j] = random.choice(symbols)
-
-def process_move(board: List[List[str]], move: str) -> Dict:
-    """Processa movimentos com validação consistente"""
+        for i in range(rows):
+            board[i][j] = column[rows - 1 - i]
+
+def fill_board(board: List[List[str]], rng: random.Random = None,
+               symbols: Sequence[str] = SYMBOLS):
+    """Preenche espaços vazios com novas peças (rng opcional, para reproduzir).
+
+    Sorteia em ordem de linha, como BitBoard.fill: o mesmo rng repõe as
+    mesmas peças nos dois formatos.
+    """
+    choice = (rng or random).choice
+    for row in board:
+        for j, cell in enumerate(row):
+            if cell == ' ':
+                row[j] = choice(symbols)
+
+class Cascade(NamedTuple):
+    """Parte determinística de uma jogada: da troca até a gravidade da
+    primeira rodada, antes de sortear as peças novas
+    """
+    swapped: List[List[str]]   # tabuleiro logo após a troca
+    removed: List[List[str]]   # sem as peças combinadas
+    cleared: int               # máscara das células combinadas
+    points: int
+    cells: bytes               # texto de trabalho depois da gravidade
+
+class CascadeCache:
+    """Memória LRU das primeiras rodadas de process_move.
+
+    A chave é o tabuleiro (em texto) e a troca; o valor é um Cascade, ou
+    None para trocas que não formam combinação. O tamanho é limitado pela
+    soma das células dos tabuleiros guardados (max_cells), então tabuleiros
+    grandes ocupam mais espaço e a memória fica limitada em qualquer modo.
+    """
+
+    def __init__(self, max_cells: int = 100_000):
+        self.max_cells = max_cells
+        self.entries = OrderedDict()  # chave -> (Cascade ou None, células)
+        self.cells = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Retorna (encontrado, valor) e marca a entrada como recente"""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return True, entry[0]
+
+    def put(self, key, value: Optional[Cascade], cells: int):
+        if cells > self.max_cells:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.cells -= old[1]
+        self.entries[key] = (value, cells)
+        self.cells += cells
+        while self.cells > self.max_cells:
+            _, (_, size) = self.entries.popitem(last=False)
+            self.cells -= size
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.cells = 0
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "cells": self.cells,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+# Compartilhada pelo processo (cada worker de um MoveExecutor tem a sua).
+# Começa desligada: só vale a pena com tabuleiros e trocas repetidos; numa
+# partida comum toda consulta é uma falta e a jogada fica mais cara
+cascade_cache = CascadeCache(max_cells=0)
+
+def configure_cascade_cache(max_cells: int):
+    """Redimensiona o cache do processo (0 desliga: nada é guardado)"""
+    cascade_cache.max_cells = max_cells
+    cascade_cache.clear()
+
+def process_cache() -> Optional[CascadeCache]:
+    """O cache do processo para passar a process_move, ou None se está desligado"""
+    return cascade_cache if cascade_cache.max_cells else None
+
+def _rows(cells: bytearray) -> List[List[str]]:
+    """Listas do texto de trabalho de process_move (linhas separadas por '\\n')"""
+    return [list(line) for line in cells.decode('latin-1').split('\n')]
+
+def _find(cells: bytearray, geo, symbols, dirty: int) -> Dict[int, int]:
+    """match_sizes do texto de trabalho, varrendo só as linhas e colunas de dirty"""
+    bitboard = BitBoard(text_masks(cells, symbols), geo)
+    bitboard.dirty = dirty
+    return bitboard.match_sizes()
+
+def _clear_round(cells: bytearray, sizes: Dict[int, int], rows: int,
+                 stride: int) -> Tuple[List[List[str]], List[List[str]], int, int]:
+    """Remove as combinações e aplica a gravidade no texto de trabalho.
+
+    Retorna o tabuleiro antes da remoção, o tabuleiro com as células vazias,
+    a máscara removida e os pontos.
+    """
+    snapshot = _rows(cells)
+    cleared = 0
+    for mask in sizes.values():
+        cleared |= mask
+    columns = set()
+    for p in iter_bits(cleared):
+        cells[p] = 32  # ' '
+        columns.add(p % stride)
+    removed = _rows(cells)
+    # Gravidade só nas colunas com buracos: cada uma é uma fatia do texto
+    for j in columns:
+        column = cells[j::stride].replace(b' ', b'')
+        cells[j::stride] = b' ' * (rows - len(column)) + column
+    return snapshot, removed, cleared, size_points(sizes)
+
+def _fill(cells: bytearray, codes: bytes, choice):
+    """Repõe as células vazias em ordem de linha, como fill_board.
+
+    choice sorteia entre os bytes dos símbolos: mesmo índice, mesma
+    sequência do rng que choice(symbols).
+    """
+    p = cells.find(32)
+    while p != -1:
+        cells[p] = choice(codes)
+        p = cells.find(32, p + 1)
+
+def _copy_rows(rows: List[List[str]]) -> List[List[str]]:
+    return [row[:] for row in rows]
+
+def process_move(board: List[List[str]], move: Union[str, Tuple[int, int, int, int]],
+                 rng: random.Random = None, symbols: Sequence[str] = SYMBOLS,
+                 cache: Optional[CascadeCache] = None) -> Dict:
+    """Processa movimentos com validação consistente.
+
+    move é o texto do protocolo ("A1 B1") ou as coordenadas já lidas
+    (linha1, coluna1, linha2, coluna2), como o servidor as entrega.
+    rng (opcional) fornece o choice usado para repor as peças, sorteadas
+    entre symbols. As dimensões vêm do próprio tabuleiro. Com um cache
+    (opcional, ver process_cache), a primeira rodada (troca, combinações e
+    gravidade) é reaproveitada quando o mesmo tabuleiro e a mesma troca já
+    foram vistos.
+    """
     try:
         # Verificação robusta de formato
-        if len(move.split()) != 2:
+        try:
+            row1, col1, row2, col2 = parse_move(move) if isinstance(move, str) else move
+        except ValueError:
             return {
                 "valid": False, 
                 "board": board, 
@@ -76,15 +333,10 @@ def process_move(board: List[List[str]], move: str) -> Dict:
                     "message": "Formato de movimento inválido"
                 }]
             }
-        
-        coord1, coord2 = move.split()
-        row1 = ord(coord1[0].upper()) - ord('A')
-        col1 = int(coord1[1]) - 1
-        row2 = ord(coord2[0].upper()) - ord('A')
-        col2 = int(coord2[1]) - 1
 
         # Verificação de limites
-        if not all(0 <= x < 6 for x in [row1, col1, row2, col2]):
+        rows, cols = len(board), len(board[0])
+        if not (0 <= row1 < rows and 0 <= row2 < rows and 0 <= col1 < cols and 0 <= col2 < cols):
             return {
                 "valid": False, 
                 "board": board, 
@@ -96,23 +348,36 @@ def process_move(board: List[List[str]], move: str) -> Dict:
                 }]
             }
 
-        # Cria cópia segura do tabuleiro
-        new_board = [row.copy() for row in board]
-        new_board[row1][col1], new_board[row2][col2] = new_board[row2][col2], new_board[row1][col1]
-
-        def verify_matches(b):
-            matches = set()
-            # Verificação horizontal e vertical simultânea
-            for i in range(6):
-                for j in range(4):
-                    if b[i][j] == b[i][j+1] == b[i][j+2] != ' ':
-                        matches.update((i, x) for x in range(j, j+3))
-                    if b[j][i] == b[j+1][i] == b[j+2][i] != ' ':
-                        matches.update((x, i) for x in range(j, j+3))
-            return matches
-
-        matches = verify_matches(new_board)
-        if not matches:
+        # O tabuleiro vira um texto de trabalho: uma linha por '\n', que faz o
+        # papel da coluna de guarda das máscaras. As combinações são achadas
+        # nas máscaras de bits; a remoção, a gravidade e a reposição são
+        # fatias e buscas em C no texto, e cada etapa vira listas uma vez só.
+        # A primeira busca varre o tabuleiro inteiro, não só a troca: quem chama
+        # pode mandar um tabuleiro com combinações pendentes (replays, testes),
+        # e elas contam como no find_matches. As seguintes olham só as colunas
+        # que a gravidade e a reposição mexeram.
+        text = '\n'.join(map(''.join, board))
+        stride = cols + 1
+        geo = layout(rows, cols)
+        present = set(text).union(symbols) - {' ', '\n'}
+        p1, p2 = sorted((row1 * stride + col1, row2 * stride + col2))
+        key = (text, cols, p1, p2)
+        found, first = cache.get(key) if cache is not None else (False, None)
+        if not found:
+            cells = bytearray(text, 'latin-1')
+            cells[p1], cells[p2] = cells[p2], cells[p1]
+            sizes = _find(cells, geo, present, geo.full)
+            if sizes:
+                swapped, removed, cleared, points = _clear_round(cells, sizes, rows, stride)
+                first = Cascade(swapped, removed, cleared, points, bytes(cells))
+            if cache is not None:
+                cache.put(key, first and first._replace(swapped=_copy_rows(first.swapped),
+                                                        removed=_copy_rows(first.removed)),
+                          rows * cols)
+        elif first is not None:
+            cells = bytearray(first.cells)
+            first = first._replace(swapped=_copy_rows(first.swapped), removed=_copy_rows(first.removed))
+        if first is None:
             return {
                 "valid": False, 
                 "board": board, 
@@ -125,44 +390,38 @@ def process_move(board: List[List[str]], move: str) -> Dict:
             }
 
         # Processamento de matches em cadeia
-        steps = []
-        current_board = [row.copy() for row in board]
-        current_board[row1][col1], current_board[row2][col2] = current_board[row2][col2], current_board[row1][col1]
-        
-        total_points = 0
-        while True:
-            matches = find_matches(current_board)
-            if not matches:
-                break
-                
+        total_points = first.points
+        steps = [{
+            "board": first.swapped,
+            "points": 0,
+            "message": "Combinação encontrada!"
+        }, {
+            "board": first.removed,
+            "points": total_points,
+            "message": "Removendo peças..."
+        }]
+        choice = (rng or random).choice
+        codes = ''.join(symbols).encode('latin-1')
+        _fill(cells, codes, choice)
+        sizes = _find(cells, geo, present, geo.cells_above(first.cleared) | first.cleared)
+        while sizes:
+            points_before = total_points
+            snapshot, removed, cleared, points = _clear_round(cells, sizes, rows, stride)
+            total_points += points
             steps.append({
-                "board": [row.copy() for row in current_board],
-                "points": total_points,
+                "board": snapshot,
+                "points": points_before,
                 "message": "Combinação encontrada!"
             })
-            
-            # Remove as peças combinadas
-            for (i, j) in matches:
-                current_board[i][j] = ' '
-            
-            total_points += calculate_points(matches)
-            
             steps.append({
-                "board": [row.copy() for row in current_board],
+                "board": removed,
                 "points": total_points,
                 "message": "Removendo peças..."
             })
-            
-            apply_gravity(current_board)
-            fill_board(current_board)
-        
-        # Garante que sempre haja steps mesmo sem matches
-        if not steps:
-            steps.append({
-                "board": current_board,
-                "points": 0,
-                "message": "Movimento realizado"
-            })
+            _fill(cells, codes, choice)
+            sizes = _find(cells, geo, present, geo.cells_above(cleared) | cleared)
+
+        current_board = _rows(cells)
 
         return {
             "valid": True,
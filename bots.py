@@ -0,0 +1,213 @@
+import random
+import time
+from typing import Iterator, NamedTuple, Optional, Tuple
+
+from bitboard import BitBoard, iter_bits
+from board import size_points
+from moves import valid_swaps
+from workers import ExecutorBusy
+
+# Peso de cada jogada seguinte no valor de uma troca
+DISCOUNT = 0.5
+
+# Força -> (profundidade, candidatas aprofundadas)
+STRENGTHS = {
+    0: (0, 0),  # qualquer troca válida
+    1: (1, 0),  # gulosa: maior cascata garantida
+    2: (2, 4),  # soma a melhor jogada seguinte das 4 melhores
+}
+
+# Começo das mensagens que interessam ao bot (o "type" é a primeira chave)
+_PLAY = ('{"type": "game_start"', '{"type": "turn_complete"', '{"type": "move_error"')
+_GAME_OVER = '{"type": "game_over"'
+
+
+class BotSettings(NamedTuple):
+    """Configuração dos bots do processo"""
+    fill_after: float = 30.0  # segundos de fila antes de completar com bots (0 desliga)
+    strength: int = 2         # 0 a 2 (STRENGTHS)
+    budget: float = 0.005     # segundos de CPU por escolha de jogada
+    think: float = 1.0        # pausa média antes de cada jogada
+
+
+def settle(bitboard: BitBoard) -> int:
+    """Remove as combinações e aplica a gravidade até o tabuleiro estabilizar.
+
+    As células vazias não são repostas: contam só as cascatas que não
+    dependem das peças novas. Altera bitboard e retorna os pontos.
+    """
+    points = 0
+    sizes = bitboard.match_sizes()
+    while sizes:
+        cleared = 0
+        for mask in sizes.values():
+            cleared |= mask
+        bitboard.clear(cleared)
+        bitboard.apply_gravity()
+        points += size_points(sizes)
+        sizes = bitboard.match_sizes()
+    return points
+
+
+def swap_value(bitboard: BitBoard, p: int, q: int) -> Tuple[int, BitBoard]:
+    """Pontos garantidos da troca e o tabuleiro depois dela (vazios no topo).
+
+    Copia só o dicionário de máscaras: nada de listas nem de process_move.
+    """
+    after = BitBoard(dict(bitboard.masks), bitboard.layout)
+    after.dirty = 0
+    after.swap(p, q)
+    return settle(after), after
+
+
+def _iter_swaps(bitboard: BitBoard) -> Iterator[Tuple[int, int]]:
+    stride = bitboard.layout.stride
+    right, down = valid_swaps(bitboard)
+    for p in iter_bits(right):
+        yield p, p + 1
+    for p in iter_bits(down):
+        yield p, p + stride
+
+
+class MoveSearch:
+    """Escolhe a troca de um bot simulando direto sobre as máscaras de bits.
+
+    A força define a busca: 0 joga qualquer troca válida; 1 escolhe a de
+    maior cascata garantida; 2 soma às melhores candidatas a melhor jogada
+    seguinte, com peso DISCOUNT. As peças repostas não são sorteadas: a
+    busca só conta o que é certo. budget limita o tempo de cada escolha: a
+    busca para no prazo e devolve a melhor troca avaliada até ali.
+    """
+
+    def __init__(self, strength: int = 2, budget: float = 0.005, rng: random.Random = None):
+        self.strength = min(max(strength, 0), max(STRENGTHS))
+        self.depth, self.width = STRENGTHS[self.strength]
+        self.budget = budget
+        self.rng = rng or random.Random()
+
+    def choose(self, packed: str, cols: int) -> Optional[Tuple[int, int, int, int]]:
+        """(linha1, coluna1, linha2, coluna2) da troca escolhida, ou None sem jogadas.
+
+        packed é o tabuleiro em pack_board, como o Seat o guarda. O prazo
+        começa antes da conversão para bits: budget cobre a escolha inteira.
+        """
+        deadline = time.perf_counter() + self.budget
+        rows = len(packed) // cols
+        bitboard = BitBoard.from_text(
+            ' '.join(packed[start:start + cols] for start in range(0, len(packed), cols)), rows, cols)
+        swaps = list(_iter_swaps(bitboard))
+        if not swaps:
+            return None
+        # Em ordem aleatória: se o prazo acabar antes (tabuleiros grandes), as
+        # avaliadas são uma amostra de todo o tabuleiro, não só do topo
+        self.rng.shuffle(swaps)
+        best = swaps[0]
+        if self.depth:
+            scored = []
+            for p, q in swaps:
+                points, after = swap_value(bitboard, p, q)
+                scored.append((points, p, q, after))
+                if time.perf_counter() > deadline:
+                    break
+            scored.sort(key=lambda item: item[0], reverse=True)
+            best = scored[0][1:3]
+            best_value = -1.0
+            for points, p, q, after in scored[:self.width]:
+                if time.perf_counter() > deadline:
+                    break
+                value = points + DISCOUNT * self._best_next(after, deadline)
+                if value > best_value:
+                    best_value, best = value, (p, q)
+        cell = bitboard.layout.cell
+        return cell(best[0]) + cell(best[1])
+
+    def _best_next(self, bitboard: BitBoard, deadline: float) -> int:
+        best = 0
+        for p, q in _iter_swaps(bitboard):
+            if time.perf_counter() > deadline:
+                break
+            best = max(best, swap_value(bitboard, p, q)[0])
+        return best
+
+
+class BotConnection:
+    """Faz o papel do websocket de um bot para o Game"""
+
+    __slots__ = ("bot",)
+
+    def __init__(self, bot: "BotPlayer"):
+        self.bot = bot
+
+    async def send(self, payload):
+        if isinstance(payload, str):
+            self.bot.notify(payload)
+
+    async def close(self):
+        self.bot.leave()
+
+
+def is_bot(websocket) -> bool:
+    return isinstance(websocket, BotConnection)
+
+
+class BotPlayer:
+    """Jogador controlado pelo servidor.
+
+    Recebe as mensagens do jogo como um cliente, mas só olha o começo de
+    cada uma: game_start, turn_complete e move_error agendam a próxima
+    jogada no Scheduler compartilhado depois de uma pausa (com variação,
+    para os bots não jogarem todos no mesmo instante); game_over tira o bot
+    do jogo. Entre as jogadas o bot não ocupa nenhuma task. Com um
+    MoveExecutor no jogo, a busca roda no pool, fora do loop.
+    """
+
+    __slots__ = ("game", "connection", "search", "timers", "think", "timer", "left")
+
+    def __init__(self, game, search: MoveSearch, timers, think: float = 1.0):
+        self.game = game
+        self.connection = BotConnection(self)
+        self.search = search
+        self.timers = timers
+        self.think = think
+        self.timer = None
+        self.left = False
+
+    def notify(self, payload: str):
+        if payload.startswith(_GAME_OVER):
+            self.timers.schedule(0, self.leave)
+        elif payload.startswith(_PLAY) and self.timer is None and not self.left:
+            delay = self.think * (0.5 + self.search.rng.random())
+            self.timer = self.timers.schedule(delay, self.play_turn)
+
+    async def play_turn(self):
+        self.timer = None
+        game = self.game
+        seat = game.players.get(self.connection)
+        if self.left or seat is None or game.finished or seat.moves >= game.max_moves:
+            return
+        if game.executor:
+            try:
+                move = await game.executor.choose_move(self.search, seat.board, game.cols)
+            except ExecutorBusy:
+                # Fila cheia: tenta de novo depois de outra pausa
+                self.timer = self.timers.schedule(self.think, self.play_turn)
+                return
+            if self.left or game.finished:
+                return
+        else:
+            move = self.search.choose(seat.board, game.cols)
+        if move is not None:
+            await game.handle_move(self.connection, move)
+
+    def leave(self):
+        """Sai do jogo; fecha o jogo se não restar ninguém"""
+        if self.left:
+            return
+        self.left = True
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        game = self.game
+        game.handle_disconnect(self.connection)
+        if not game.players and not game.away and game.on_close is not None:
+            game.on_close(game)
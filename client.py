@@ -1,56 +1,145 @@
 import asyncio
+import json
 import websockets
-import pickle
 from colorama import Fore, init
+from moves import parse_move, row_label
+from protocol import DELTA_TYPES, apply_delta
+
+DELTA_NAMES = {short: name for name, short in DELTA_TYPES.items()}
 
 # corzinha
 init(autoreset=True)
 
-def is_valid_move(move: str) -> bool:
-    """validar a formatação do movimento"""
-    parts = move.split()
-    if len(parts) != 2:
+def is_valid_move(move: str, rows: int = 6, cols: int = 6) -> bool:
+    """validar a formatação do movimento e os limites do tabuleiro"""
+    try:
+        row1, col1, row2, col2 = parse_move(move)
+    except ValueError:
         return False
-    
-    for part in parts:
-        if len(part) != 2:
-            return False
-        if part[0].upper() not in 'ABCDEF':
-            return False
-        if not part[1].isdigit() or int(part[1]) not in range(1, 7):
-            return False
-    
-    return True
+    return 0 <= row1 < rows and 0 <= row2 < rows and 0 <= col1 < cols and 0 <= col2 < cols
+
+def decode_message(raw, board):
+    """Decodifica uma mensagem do servidor; no modo delta aplica as células em board"""
+    data = json.loads(raw)
+    if data.get("t") == DELTA_TYPES["board_steps"]:
+        # Etapas em lote: cada uma é aplicada sobre a anterior
+        steps = []
+        for step in data["steps"]:
+            apply_delta(board, step["d"])
+            steps.append({
+                "board": [row.copy() for row in board],
+                "score": step["s"],
+                "moves_left": step["l"],
+                "message": step["m"],
+                "at": step["at"]
+            })
+        data = {"type": "board_steps", "steps": steps, "interval": data["i"]}
+    elif "t" in data:
+        apply_delta(board, data["d"])
+        data = {
+            "type": DELTA_NAMES[data["t"]],
+            "board": board,
+            "score": data["s"],
+            "moves_left": data["l"],
+            "message": data["m"],
+            "hints": data.get("h")
+        }
+    elif "board" in data:
+        board[:] = data["board"]
+    elif "steps" in data:
+        board[:] = data["steps"][-1]["board"]
+    return data
 
 def print_board(board):
     """Peças coloridas"""
-    print("\n  1 2 3 4 5 6")
-    letters = ['A', 'B', 'C', 'D', 'E', 'F']
+    width = len(str(len(board[0])))
+    margin = len(row_label(len(board) - 1))
+    print("\n" + " " * margin + " " + " ".join(str(j + 1).rjust(width) for j in range(len(board[0]))))
     colors = {
-        'O': Fore.RED,
-        'X': Fore.GREEN,
+        'R': Fore.RED,
+        'G': Fore.GREEN,
         'Y': Fore.YELLOW,
-        'Z': Fore.BLUE
+        'B': Fore.BLUE,
+        'P': Fore.MAGENTA,
+        'C': Fore.CYAN
     }
     
     for i, row in enumerate(board):
-        colored_row = [colors.get(cell, Fore.WHITE) + cell for cell in row]
-        print(f"{letters[i]} {' '.join(colored_row)}")
+        colored_row = [colors.get(cell, Fore.WHITE) + cell.rjust(width) for cell in row]
+        print(f"{row_label(i).ljust(margin)} {' '.join(colored_row)}" + Fore.RESET)
+
+def show_update(data):
+    """Uma etapa da jogada"""
+    print(Fore.GREEN + f"\n{data.get('message', 'Movimento válido!')}" + Fore.RESET)
+    print(Fore.YELLOW + f"Pontuação: {data['score']}" + Fore.RESET)
+    print(f"Jogadas restantes: {data['moves_left']}")
+    print_board(data["board"])
+
+async def play_steps(data):
+    """Anima as etapas recebidas de uma vez, no intervalo indicado pelo servidor"""
+    loop = asyncio.get_event_loop()
+    start = loop.time()
+    for step in data["steps"]:
+        await asyncio.sleep(max(0.0, start + step["at"] / 1000 - loop.time()))
+        show_update(step)
+    await asyncio.sleep(data["interval"] / 1000)
+
+async def play_move(websocket, board, rows, cols):
+    """Lê, envia e acompanha uma jogada; devolve a resposta final (None ao sair)"""
+    while True:
+        move = input("\nDigite seu movimento (ex: A1 B2) ou 'sair': ").strip()
+        if move.lower() == 'sair':
+            await websocket.send(json.dumps({"type": "quit"}))
+            await websocket.close()
+            return None
+        
+        parts = move.split()
+        if len(parts) == 2:
+            formatted_move = f"{parts[0].upper()} {parts[1].upper()}"
+            if is_valid_move(formatted_move, rows, cols):
+                break
+        
+        print(Fore.RED + f"Formato inválido! Use ex: A1 B2 (linhas A-{row_label(rows - 1)}, "
+              f"colunas 1-{cols})" + Fore.RESET)
+
+    # Manda movimento
+    await websocket.send(json.dumps({
+        "type": "move",
+        "move": formatted_move
+    }))
+
+    # Processa resposta do sv; as etapas chegam antes do fim da jogada
+    data = decode_message(await websocket.recv(), board)
+    while data["type"] in ("board_steps", "board_update"):
+        if data["type"] == "board_steps":
+            await play_steps(data)
+        else:
+            show_update(data)
+        data = decode_message(await websocket.recv(), board)
+    return data
 
 async def play_game():
     async with websockets.connect("ws://localhost:8765") as websocket:
         print(Fore.CYAN + "Conectando ao servidor..." + Fore.RESET)
         
         # conexão inicial e fase de waiting
-        init_data = pickle.loads(await websocket.recv())
+        init_data = json.loads(await websocket.recv())
+        board = init_data["board"]
+        # Pede as etapas de uma vez (anima aqui, sem o servidor esperar) e,
+        # se houver, só as células alteradas em cada etapa
+        wire = {"type": "wire", "batch": True}
+        if "delta" in init_data.get("wire_modes", []):
+            wire["mode"] = "delta"
+        await websocket.send(json.dumps(wire))
         player_id = init_data["player_id"]
         max_moves = init_data["max_moves"]
+        rows, cols = init_data.get("rows", 6), init_data.get("cols", 6)
         moves_left = max_moves
         
         if init_data.get("waiting", True):
             print(Fore.YELLOW + "\nAguardando outro jogador conectar..." + Fore.RESET)
             while True:
-                data = pickle.loads(await websocket.recv())
+                data = decode_message(await websocket.recv(), board)
                 if data["type"] == "game_start":
                     break
                 elif data["type"] == "player_left":
@@ -66,47 +155,19 @@ async def play_game():
         # Main game loop
         while True:
             try:
-                # pula input de movimentos se o jogador não tem mais nenhum movimento
                 if moves_left <= 0:
-                    await asyncio.sleep(0.5)  # Small delay to prevent busy waiting
-                    continue
-                    
-                # Get input de movimento válido
-                while True:
-                    move = input("\nDigite seu movimento (ex: A1 B2) ou 'sair': ").strip()
-                    if move.lower() == 'sair':
-                        await websocket.send(pickle.dumps({"type": "quit"}))
-                        await websocket.close()
+                    # Sem jogadas: só espera o fim do jogo
+                    data = decode_message(await websocket.recv(), board)
+                else:
+                    data = await play_move(websocket, board, rows, cols)
+                    if data is None:
                         return
-                    
-                    parts = move.split()
-                    if len(parts) == 2:
-                        formatted_move = f"{parts[0].upper()} {parts[1].upper()}"
-                        if is_valid_move(formatted_move):
-                            break
-                    
-                    print(Fore.RED + "Formato inválido! Use ex: A1 B2 (letras A-F, números 1-6)" + Fore.RESET)
-
-                # Manda movimento
-                await websocket.send(pickle.dumps({
-                    "type": "move",
-                    "move": formatted_move
-                }))
-
-                # Processa resposta do sv
-                data = pickle.loads(await websocket.recv())
                 
-                if data["type"] == "board_update":
+                if data["type"] == "turn_complete":
                     moves_left = data["moves_left"]
-                    print(Fore.GREEN + f"\n{data.get('message', 'Movimento válido!')}" + Fore.RESET)
-                    print(Fore.YELLOW + f"Pontuação: {data['score']}" + Fore.RESET)
-                    print(f"Jogadas restantes: {moves_left}")
-                    print_board(data["board"])
-                
-                elif data["type"] == "turn_complete":
-                    moves_left = 0
                     print(Fore.YELLOW + f"\n{data['message']}" + Fore.RESET)
-                    print(Fore.CYAN + f"Pontuação final: {data['score']}" + Fore.RESET)
+                    label = "Pontuação final" if moves_left <= 0 else "Pontuação"
+                    print(Fore.CYAN + f"{label}: {data['score']}" + Fore.RESET)
                     print_board(data["board"])
                 
                 elif data["type"] == "waiting":
@@ -0,0 +1,251 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import tempfile
+import traceback
+from typing import Dict
+
+import websockets
+
+from matchmaking import QueueKey
+
+
+def cancel_on_sigterm():
+    """SIGTERM (docker stop, systemd, loadgen --spawn) cancela a task atual,
+    como o Ctrl+C: os finally fecham o executor e gravam os logs pendentes"""
+    try:
+        asyncio.get_event_loop().add_signal_handler(signal.SIGTERM,
+                                                    asyncio.current_task().cancel)
+    except NotImplementedError:
+        # Windows: sem sinais no loop, só o Ctrl+C
+        pass
+
+
+class Broker:
+    """Decide qual processo é dono de cada jogo em formação.
+
+    Roda no processo principal e fala com os workers por um socket Unix, uma
+    linha JSON por mensagem. O jogo em formação de uma modalidade pertence ao
+    worker do primeiro jogador; os próximos jogadores dessa modalidade são
+    encaminhados a ele até o jogo lotar.
+
+    Também ordena os fins de partida: cada resultado vai a todos os workers
+    inscritos, inclusive o de origem, na mesma ordem, e as classificações
+    (Elo depende da ordem) ficam iguais em todos.
+    """
+
+    def __init__(self):
+        self.forming = {}  # modalidade -> [worker dono, lugares ocupados]
+        self.subscribers = set()
+
+    def route(self, key: QueueKey, worker: int) -> int:
+        slot = self.forming.get(key)
+        if slot is None or slot[1] >= key.players:
+            slot = self.forming[key] = [worker, 0]
+        slot[1] += 1
+        return slot[0]
+
+    def leave(self, key: QueueKey, owner: int):
+        """Um jogador saiu antes do jogo lotar: libera o lugar"""
+        slot = self.forming.get(key)
+        if slot is not None and slot[0] == owner and 0 < slot[1] < key.players:
+            slot[1] -= 1
+
+    def publish(self, line: bytes):
+        """Repassa uma linha de resultado a todos os inscritos"""
+        for subscriber in self.subscribers:
+            subscriber.write(line)
+
+    async def handle(self, reader, writer):
+        try:
+            async for line in reader:
+                request = json.loads(line)
+                op = request["op"]
+                if op == "result":
+                    self.publish(json.dumps(request["result"]).encode() + b"\n")
+                elif op == "subscribe":
+                    self.subscribers.add(writer)
+                elif op == "route":
+                    owner = self.route(QueueKey(*request["key"]), request["worker"])
+                    writer.write(json.dumps({"owner": owner}).encode() + b"\n")
+                elif op == "leave":
+                    self.leave(QueueKey(*request["key"]), request["worker"])
+        except (ConnectionResetError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.subscribers.discard(writer)
+            writer.close()
+
+
+class BrokerClient:
+    """Conexão de um worker com o Broker"""
+
+    def __init__(self, path: str, worker: int, worker_paths):
+        self.path = path
+        self.worker = worker
+        self.worker_paths = worker_paths
+        self.reader = None
+        self.writer = None
+        # Respostas chegam na ordem dos pedidos; o lock mantém os pares juntos
+        self.lock = asyncio.Lock()
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_unix_connection(self.path)
+
+    async def route(self, key: QueueKey) -> int:
+        """Worker dono do jogo em que este jogador vai entrar"""
+        async with self.lock:
+            self.writer.write(json.dumps({"op": "route", "key": list(key),
+                                          "worker": self.worker}).encode() + b"\n")
+            return json.loads(await self.reader.readline())["owner"]
+
+    def leave(self, key: QueueKey):
+        self.writer.write(json.dumps({"op": "leave", "key": list(key),
+                                      "worker": self.worker}).encode() + b"\n")
+
+    def record(self, result: Dict):
+        """Fim de partida deste worker (Game.finish chama como se fosse a
+        Leaderboard): vai ao broker, que o devolve a todos pelo subscribe"""
+        self.writer.write(json.dumps({"op": "result", "result": result}).encode() + b"\n")
+
+    async def subscribe(self, leaderboard):
+        """Abre a conexão de resultados e aplica cada um na classificação local"""
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        writer.write(json.dumps({"op": "subscribe"}).encode() + b"\n")
+
+        async def apply():
+            try:
+                async for line in reader:
+                    leaderboard.record(json.loads(line))
+            except (ConnectionResetError, asyncio.IncompleteReadError):
+                pass
+            finally:
+                writer.close()
+
+        return asyncio.ensure_future(apply())
+
+    async def relay(self, websocket, path: str, owner: int):
+        """Repassa as mensagens entre o cliente e o worker dono do jogo"""
+        async with websockets.unix_connect(self.worker_paths[owner], "ws://localhost" + path) as upstream:
+            async def pump(source, target):
+                try:
+                    async for message in source:
+                        await target.send(message)
+                except websockets.exceptions.ConnectionClosed:
+                    pass
+
+            tasks = [asyncio.ensure_future(pump(websocket, upstream)),
+                     asyncio.ensure_future(pump(upstream, websocket))]
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in tasks:
+                task.cancel()
+
+
+async def _worker(index: int, args, broker_path: str, worker_paths):
+    # Importado aqui porque server importa este módulo
+    from server import make_manager, start_metrics
+
+    cancel_on_sigterm()
+    game_manager, executor = make_manager(args, index)
+    game_manager.router = BrokerClient(broker_path, index, worker_paths)
+    await game_manager.router.connect()
+    # Fins de partida passam pelo broker, que dá a mesma ordem a todos os workers
+    game_manager.results = game_manager.router
+    game_manager.restore()
+    game_manager.load_leaderboard()
+    results = await game_manager.router.subscribe(game_manager.leaderboard)
+    game_manager.schedule_refill()
+    metrics_server = await start_metrics(args, game_manager, index)
+
+    public = await websockets.serve(game_manager.handle_connection, args.host, args.port,
+                                    reuse_port=True)
+    # Conexões encaminhadas por outros workers já foram roteadas
+    internal = await websockets.unix_serve(
+        lambda websocket: game_manager.handle_connection(websocket, routed=True),
+        worker_paths[index])
+    print(f"Worker {index} (pid {os.getpid()}) pronto")
+    try:
+        await asyncio.get_event_loop().create_future()
+    except asyncio.CancelledError:
+        print(f"Worker {index} encerrado")
+    finally:
+        results.cancel()
+        if game_manager.snapshot_log:
+            game_manager.snapshot_log.close()
+        if game_manager.move_log:
+            game_manager.move_log.close()
+        if game_manager.event_log:
+            game_manager.event_log.close()
+        if executor:
+            executor.shutdown()
+        if metrics_server:
+            metrics_server.close()
+        public.close()
+        internal.close()
+        await public.wait_closed()
+        await internal.wait_closed()
+
+
+def _run_worker(index: int, args, broker_path: str, worker_paths):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        asyncio.run(_worker(index, args, broker_path, worker_paths))
+    except Exception:
+        print(f"Erro no worker {index}: {traceback.format_exc()}")
+
+
+def run_cluster(args):
+    """Sobe o broker e args.processes workers escutando na mesma porta (SO_REUSEPORT)"""
+    if not hasattr(os, "fork") or not hasattr(socket, "SO_REUSEPORT"):
+        raise RuntimeError("O modo multiprocesso precisa de SO_REUSEPORT (Linux)")
+
+    directory = tempfile.mkdtemp(prefix="blockshuffle-")
+    broker_path = os.path.join(directory, "broker.sock")
+    worker_paths = [os.path.join(directory, f"worker{i}.sock") for i in range(args.processes)]
+
+    # O socket do broker já escuta antes do fork: os workers podem conectar
+    # enquanto o processo principal ainda sobe o loop
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(broker_path)
+    listener.listen(args.processes)
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_run_worker, args=(i, args, broker_path, worker_paths),
+                                 daemon=True)
+                 for i in range(args.processes)]
+    for process in processes:
+        process.start()
+
+    def stop_workers():
+        # Repassa o SIGTERM: cada worker fecha o executor, grava seus logs e
+        # só então solta a conexão com o broker
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(10)
+
+    async def main():
+        cancel_on_sigterm()
+        server = await asyncio.start_unix_server(Broker().handle, sock=listener)
+        print(f"Servidor rodando na porta {args.port} com {args.processes} processos")
+        try:
+            await asyncio.get_event_loop().create_future()
+        except asyncio.CancelledError:
+            print("\nServidor encerrado normalmente")
+        finally:
+            # Em thread: o broker segue atendendo os workers até eles saírem
+            await asyncio.to_thread(stop_workers)
+            server.close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\nServidor encerrado normalmente")
+    finally:
+        stop_workers()
+        for path in [broker_path] + worker_paths:
+            if os.path.exists(path):
+                os.unlink(path)
+        os.rmdir(directory)
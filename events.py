@@ -0,0 +1,91 @@
+import asyncio
+import heapq
+import json
+import os
+from typing import Dict, Iterable, Iterator
+
+# Começo das linhas de fim de partida (json.dumps mantém "e" como primeira chave)
+_END = '{"e":"end"'
+
+
+class EventLog:
+    """Fluxo de eventos das partidas num arquivo só de acréscimos, uma linha JSON por evento.
+
+        {"e": "start", "g": <game_id>, "t": ..., "p": ["player1", ...], "n": {"player1": "ana"}}
+        {"e": "move", "g": ..., "p": "player1", "m": "A1 A2", "pts": 350, "d": 2}
+        {"e": "end", "g": ..., "t": ..., "w": "player1", "s": {"player1": 350, ...},
+         "n": {"player1": "ana"}}
+
+    "d" é a profundidade da cascata (rodadas de combinação) e "n" só traz os
+    jogadores que entraram com nome. append só serializa e guarda a linha;
+    o lote é gravado numa thread a cada interval segundos, ou antes se
+    passar de max_pending linhas. Enquanto um lote é gravado os novos
+    eventos esperam o próximo, sem duas gravações ao mesmo tempo.
+    """
+
+    def __init__(self, path: str, interval: float = 1.0, max_pending: int = 10_000):
+        self.path = path
+        self.interval = interval
+        self.max_pending = max_pending
+        self.pending = []
+        self.writing = False
+        self.timer = None
+
+    def append(self, event: Dict, scheduler):
+        self.pending.append(json.dumps(event, separators=(",", ":")) + "\n")
+        if len(self.pending) >= self.max_pending and not self.writing:
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = scheduler.schedule(0, self.flush, scheduler)
+        elif self.timer is None:
+            self.timer = scheduler.schedule(self.interval, self.flush, scheduler)
+
+    async def flush(self, scheduler=None):
+        self.timer = None
+        if self.writing:
+            if scheduler is not None:
+                self.timer = scheduler.schedule(self.interval, self.flush, scheduler)
+            return
+        lines, self.pending = self.pending, []
+        if not lines:
+            return
+        self.writing = True
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._append, "".join(lines))
+        except OSError as e:
+            print(f"Erro ao gravar o log de eventos: {e}")
+        finally:
+            self.writing = False
+
+    def close(self):
+        """Grava o que falta de forma síncrona (encerramento do servidor)"""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.pending:
+            self._append("".join(self.pending))
+            self.pending = []
+
+    def _append(self, text: str):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(text)
+
+
+def read_results(path: str) -> Iterator[Dict]:
+    """Eventos de fim de partida do log, em ordem; as outras linhas nem são decodificadas"""
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.startswith(_END):
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Última linha cortada por uma queda no meio da gravação
+                continue
+
+
+def merge_results(paths: Iterable[str]) -> Iterator[Dict]:
+    """Fins de partida de vários logs (um por worker) numa só sequência, pelo horário"""
+    return heapq.merge(*(read_results(path) for path in paths), key=lambda result: result["t"])
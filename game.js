@@ -7,10 +7,20 @@ class BlockShuffleGame {
         this.scores = {};
         this.maxMoves = 0;
         this.movesLeft = 0;
+        // Último tabuleiro recebido (base dos deltas) e fim da animação atual
+        this.latestBoard = null;
+        this.animationEnd = 0;
+        // Token para voltar à partida se a conexão cair
+        this.resumeToken = null;
+        this.reconnectAttempts = 0;
+        this.gameEnded = false;
+        // Jogadas em frames binários quando o servidor aceita
+        this.binaryMoves = false;
         
         this.initElements();
         this.initEventListeners();
-        this.connectToServer();
+        // Modalidade e tabuleiro vêm da página, ex.: index.html?size=16&colors=5
+        this.connectToServer(window.location.search);
     }
     
     initElements() {
@@ -33,9 +43,9 @@ class BlockShuffleGame {
         });
     }
     
-    async connectToServer() {
+    async connectToServer(query = '') {
         try {
-            this.socket = new WebSocket('ws://localhost:8765');
+            this.socket = new WebSocket('ws://localhost:8765/' + query);
             
             this.socket.onopen = () => {
                 this.updateStatus('Conectando ao servidor...', 'waiting');
@@ -43,14 +53,21 @@ class BlockShuffleGame {
             
             this.socket.onmessage = (event) => {
                 try {
-                    const data = JSON.parse(event.data);
-                    this.handleMessage(data);
+                    const data = this.decodeMessage(JSON.parse(event.data));
+                    this.dispatch(data);
                 } catch (e) {
                     console.error('Erro ao processar mensagem:', e);
                 }
             };
             
             this.socket.onclose = () => {
+                if (this.resumeToken && !this.gameEnded && this.reconnectAttempts < 5) {
+                    // Tenta retomar a partida antes do fim do prazo do servidor
+                    this.reconnectAttempts++;
+                    this.updateStatus('Conexão perdida, reconectando...', 'waiting');
+                    setTimeout(() => this.connectToServer('?resume=' + encodeURIComponent(this.resumeToken)), 1000);
+                    return;
+                }
                 this.updateStatus('Conexão com o servidor perdida.', 'game-over');
             };
             
@@ -65,6 +82,71 @@ class BlockShuffleGame {
         }
     }
     
+    applyDelta(delta) {
+        // Aplica as células alteradas sobre o último tabuleiro recebido
+        const cols = this.latestBoard[0].length;
+        const board = this.latestBoard.map(row => row.slice());
+        for (const [symbol, cells] of Object.entries(delta)) {
+            for (const cell of cells) {
+                board[Math.floor(cell / cols)][cell % cols] = symbol;
+            }
+        }
+        this.latestBoard = board;
+        return board;
+    }
+
+    decodeMessage(data) {
+        // Expande o modo delta (chaves curtas) para o formato completo
+        if (data.t === 's') {
+            return {
+                type: 'board_steps',
+                interval: data.i,
+                steps: data.steps.map(step => ({
+                    board: this.applyDelta(step.d),
+                    score: step.s,
+                    moves_left: step.l,
+                    message: step.m,
+                    at: step.at
+                }))
+            };
+        }
+        if (data.t) {
+            const types = { u: 'board_update', c: 'turn_complete' };
+            return {
+                type: types[data.t],
+                board: this.applyDelta(data.d),
+                score: data.s,
+                moves_left: data.l,
+                message: data.m,
+                hints: data.h
+            };
+        }
+        if (data.board) {
+            this.latestBoard = data.board;
+        } else if (data.steps) {
+            this.latestBoard = data.steps[data.steps.length - 1].board;
+        }
+        return data;
+    }
+
+    dispatch(data) {
+        // Mensagens que chegam durante uma animação esperam ela terminar
+        const wait = this.animationEnd - Date.now();
+        if (wait > 0) {
+            setTimeout(() => this.handleMessage(data), wait);
+        } else {
+            this.handleMessage(data);
+        }
+    }
+
+    playSteps(data) {
+        for (const step of data.steps) {
+            setTimeout(() => this.handleBoardUpdate(step), step.at);
+        }
+        const last = data.steps[data.steps.length - 1];
+        this.animationEnd = Date.now() + last.at + data.interval;
+    }
+
     handleMessage(data) {
         switch (data.type) {
             case 'init':
@@ -81,6 +163,9 @@ class BlockShuffleGame {
             case 'board_update':
                 this.handleBoardUpdate(data);
                 break;
+            case 'board_steps':
+                this.playSteps(data);
+                break;
             case 'turn_complete':
                 this.handleTurnComplete(data);
                 break;
@@ -96,6 +181,16 @@ class BlockShuffleGame {
             case 'player_left':
                 this.handlePlayerLeft(data);
                 break;
+            case 'player_away':
+                this.updateStatus(`${data.player} caiu, aguardando até ${data.grace}s...`, 'waiting');
+                break;
+            case 'player_back':
+                this.updateStatus(`${data.player} voltou!`, 'playing');
+                break;
+            case 'resume_error':
+                this.resumeToken = null;
+                this.updateStatus(data.message, 'game-over');
+                break;
         }
     }
 
@@ -112,10 +207,22 @@ class BlockShuffleGame {
     }
     
     handleInit(data) {
+        if (data.wire_modes && data.wire_modes.includes('delta')) {
+            this.socket.send(JSON.stringify({ type: "wire", mode: "delta", batch: true }));
+        }
         this.playerId = data.player_id;
         this.board = data.board;
         this.maxMoves = data.max_moves;
-        this.movesLeft = data.max_moves;
+        this.movesLeft = data.resumed ? data.moves_left : data.max_moves;
+        this.resumeToken = data.resume_token;
+        this.reconnectAttempts = 0;
+        this.binaryMoves = (data.move_formats || []).includes('binary');
+        if (data.resumed) {
+            this.scores = data.scores;
+            this.scoreElement.textContent = data.score;
+            this.updateScores();
+            this.updateStatus('Partida retomada!', 'playing');
+        }
         
         this.playerIdElement.textContent = this.playerId;
         this.maxMovesElement.textContent = this.maxMoves;
@@ -181,12 +288,24 @@ class BlockShuffleGame {
 
     renderBoard() {
         this.boardElement.innerHTML = '';
+        const rows = this.board.length;
+        const cols = this.board[0].length;
+        // Células menores em tabuleiros grandes (até 64x64)
+        const size = Math.max(8, Math.min(60, Math.floor(420 / Math.max(rows, cols))));
+        this.boardElement.style.gridTemplateColumns = `repeat(${cols}, ${size}px)`;
+        this.boardElement.style.gridTemplateRows = `repeat(${rows}, ${size}px)`;
+        this.boardElement.style.gap = size < 30 ? '1px' : '';
         
-        for (let i = 0; i < 6; i++) {
-            for (let j = 0; j < 6; j++) {
+        for (let i = 0; i < rows; i++) {
+            for (let j = 0; j < cols; j++) {
                 const cell = document.createElement('div');
                 cell.className = `cell ${this.board[i][j]}`;
-                cell.textContent = this.board[i][j];
+                cell.textContent = size < 30 ? '' : this.board[i][j];
+                if (size !== 60) {
+                    cell.style.width = cell.style.height = `${size}px`;
+                    cell.style.fontSize = `${Math.floor(size * 0.4)}px`;
+                    cell.style.borderRadius = `${Math.ceil(size / 8)}px`;
+                }
                 cell.dataset.row = i;
                 cell.dataset.col = j;
                 cell.addEventListener('click', () => this.handleCellClick(cell));
@@ -196,6 +315,7 @@ class BlockShuffleGame {
     }
     
     handleGameOver(data) {
+        this.gameEnded = true;
         setTimeout(() => {
             this.scores = data.scores;
             this.updateScores(data.winner);
@@ -258,12 +378,24 @@ class BlockShuffleGame {
     
     renderBoard() {
         this.boardElement.innerHTML = '';
+        const rows = this.board.length;
+        const cols = this.board[0].length;
+        // Células menores em tabuleiros grandes (até 64x64)
+        const size = Math.max(8, Math.min(60, Math.floor(420 / Math.max(rows, cols))));
+        this.boardElement.style.gridTemplateColumns = `repeat(${cols}, ${size}px)`;
+        this.boardElement.style.gridTemplateRows = `repeat(${rows}, ${size}px)`;
+        this.boardElement.style.gap = size < 30 ? '1px' : '';
         
-        for (let i = 0; i < 6; i++) {
-            for (let j = 0; j < 6; j++) {
+        for (let i = 0; i < rows; i++) {
+            for (let j = 0; j < cols; j++) {
                 const cell = document.createElement('div');
                 cell.className = `cell ${this.board[i][j]}`;
-                cell.textContent = this.board[i][j];
+                cell.textContent = size < 30 ? '' : this.board[i][j];
+                if (size !== 60) {
+                    cell.style.width = cell.style.height = `${size}px`;
+                    cell.style.fontSize = `${Math.floor(size * 0.4)}px`;
+                    cell.style.borderRadius = `${Math.ceil(size / 8)}px`;
+                }
                 cell.dataset.row = i;
                 cell.dataset.col = j;
                 
@@ -282,18 +414,21 @@ class BlockShuffleGame {
                 this.lastSelection = {
                     cell1: this.selectedCell,
                     cell2: cell,
-                    move: `${String.fromCharCode(65 + parseInt(this.selectedCell.dataset.row))}${parseInt(this.selectedCell.dataset.col) + 1} ${
-                           String.fromCharCode(65 + parseInt(cell.dataset.row))}${parseInt(cell.dataset.col) + 1}`
+                    move: `${this.cellName(this.selectedCell)} ${this.cellName(cell)}`
                 };
 
                 this.selectedCell.classList.add('processing');
                 cell.classList.add('processing');
                 
                 setTimeout(() => {
-                    this.socket.send(JSON.stringify({ 
-                        type: "move", 
-                        move: this.lastSelection.move 
-                    }));
+                    if (this.binaryMoves) {
+                        this.socket.send(this.encodeMove(this.lastSelection.cell1, this.lastSelection.cell2));
+                    } else {
+                        this.socket.send(JSON.stringify({ 
+                            type: "move", 
+                            move: this.lastSelection.move 
+                        }));
+                    }
                 }, 300);
             }
 
@@ -305,6 +440,30 @@ class BlockShuffleGame {
         }
     }
 
+    // Jogada binária (protocol.MOVE_FRAME): opcode 1 e os índices lineares
+    // das duas células em 16 bits big-endian
+    encodeMove(cell1, cell2) {
+        const cols = this.board[0].length;
+        const index = (cell) => parseInt(cell.dataset.row) * cols + parseInt(cell.dataset.col);
+        const view = new DataView(new ArrayBuffer(5));
+        view.setUint8(0, 1);
+        view.setUint16(1, index(cell1));
+        view.setUint16(3, index(cell2));
+        return view.buffer;
+    }
+
+    // Coordenada no formato do protocolo: linhas A..Z, AA, AB... e colunas a partir de 1
+    cellName(cell) {
+        let row = parseInt(cell.dataset.row) + 1;
+        let label = '';
+        while (row > 0) {
+            const rest = (row - 1) % 26;
+            label = String.fromCharCode(65 + rest) + label;
+            row = Math.floor((row - 1) / 26);
+        }
+        return `${label}${parseInt(cell.dataset.col) + 1}`;
+    }
+
     swapCellsOnScreen(cell1, cell2) {
         const tempText = cell1.textContent;
         const tempClass = cell1.className.replace(/selected|processing/g, '').trim();
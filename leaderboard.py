@@ -0,0 +1,347 @@
+import gc
+import random
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+from urllib.parse import parse_qs, urlsplit
+
+# Elo: rating de quem entra pela primeira vez e peso de cada partida
+INITIAL_RATING = 1500.0
+K_FACTOR = 32.0
+MAX_NAME = 24
+MAX_TOP = 100
+
+
+class _Node:
+    __slots__ = ("key", "priority", "size", "left", "right")
+
+    def __init__(self, key, priority: float):
+        self.key = key
+        self.priority = priority
+        self.size = 1
+        self.left = None
+        self.right = None
+
+
+def _size(node: Optional[_Node]) -> int:
+    return node.size if node is not None else 0
+
+
+class RankTree:
+    """Árvore de estatística de ordem: treap com o tamanho de cada subárvore.
+
+    Inserir e remover descem uma vez e acertam a prioridade com rotações,
+    sem recursão. Inserir, remover, a posição de uma chave (rank) e a chave de uma
+    posição (nth) custam O(log n) esperado; as n primeiras saem em
+    O(log n + n). remove só aceita chaves presentes.
+    """
+
+    __slots__ = ("root", "rng")
+
+    def __init__(self, rng: random.Random = None):
+        self.root = None
+        self.rng = rng or random.Random()
+
+    @classmethod
+    def build(cls, keys: List, rng: random.Random = None) -> "RankTree":
+        """Monta a árvore de uma vez a partir das chaves já ordenadas.
+
+        A árvore sai perfeitamente balanceada; as prioridades sorteadas são
+        distribuídas por nível (as maiores perto da raiz), então inserções e
+        remoções seguintes continuam valendo como num treap comum.
+        """
+        tree = cls(rng)
+        priorities = sorted((tree.rng.random() for _ in keys), reverse=True)
+        levels = []
+
+        def place(lo, hi, depth):
+            if lo >= hi:
+                return None
+            mid = (lo + hi) // 2
+            node = _Node(keys[mid], 0.0)
+            if len(levels) <= depth:
+                levels.append([])
+            levels[depth].append(node)
+            node.left = place(lo, mid, depth + 1)
+            node.right = place(mid + 1, hi, depth + 1)
+            node.size = hi - lo
+            return node
+
+        tree.root = place(0, len(keys), 0)
+        ranked = iter(priorities)
+        for level in levels:
+            for node in level:
+                node.priority = next(ranked)
+        return tree
+
+    def __len__(self):
+        return _size(self.root)
+
+    def insert(self, key):
+        node = _Node(key, self.rng.random())
+        path = []
+        current = self.root
+        while current is not None:
+            current.size += 1
+            path.append(current)
+            current = current.left if key < current.key else current.right
+        if not path:
+            self.root = node
+            return
+        if key < path[-1].key:
+            path[-1].left = node
+        else:
+            path[-1].right = node
+        # Sobe por rotações enquanto a prioridade for maior que a do pai
+        while path and path[-1].priority < node.priority:
+            parent = path.pop()
+            if parent.left is node:
+                parent.left, node.right = node.right, parent
+            else:
+                parent.right, node.left = node.left, parent
+            parent.size = 1 + _size(parent.left) + _size(parent.right)
+            node.size = 1 + _size(node.left) + _size(node.right)
+            self._relink(path[-1] if path else None, parent, node)
+
+    def remove(self, key):
+        parent, node = None, self.root
+        while node.key != key:
+            node.size -= 1
+            parent = node
+            node = node.left if key < node.key else node.right
+        # Desce por rotações até ficar com no máximo um filho
+        while node.left is not None and node.right is not None:
+            if node.left.priority > node.right.priority:
+                child = node.left
+                node.left, child.right = child.right, node
+            else:
+                child = node.right
+                node.right, child.left = child.left, node
+            child.size = node.size - 1
+            node.size = 1 + _size(node.left) + _size(node.right)
+            self._relink(parent, node, child)
+            parent = child
+        self._relink(parent, node, node.left if node.left is not None else node.right)
+
+    def _relink(self, parent: Optional[_Node], old: _Node, new: Optional[_Node]):
+        """Põe new no lugar de old como filho de parent (ou raiz)"""
+        if parent is None:
+            self.root = new
+        elif parent.left is old:
+            parent.left = new
+        else:
+            parent.right = new
+
+    def rank(self, key) -> int:
+        """Quantas chaves são menores que key"""
+        node, count = self.root, 0
+        while node is not None:
+            if node.key < key:
+                count += _size(node.left) + 1
+                node = node.right
+            else:
+                node = node.left
+        return count
+
+    def nth(self, k: int):
+        """Chave na posição k (a partir de 0)"""
+        node = self.root
+        while node is not None:
+            left = _size(node.left)
+            if k < left:
+                node = node.left
+            elif k == left:
+                return node.key
+            else:
+                k -= left + 1
+                node = node.right
+        raise IndexError(k)
+
+    def first(self, n: int) -> Iterator:
+        """As n menores chaves, em ordem"""
+        stack, node = [], self.root
+        while n > 0 and (stack or node is not None):
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.key
+            n -= 1
+            node = node.right
+
+
+class Standing:
+    """Histórico agregado de um jogador com nome"""
+
+    __slots__ = ("name", "rating", "best", "games", "wins")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rating = INITIAL_RATING
+        self.best = 0
+        self.games = 0
+        self.wins = 0
+
+    def value(self, by: str) -> float:
+        return self.rating if by == "rating" else self.best
+
+    def info(self) -> Dict:
+        return {"name": self.name, "rating": round(self.rating), "best": self.best,
+                "games": self.games, "wins": self.wins}
+
+
+class Leaderboard:
+    """Ratings (Elo) e recordes dos jogadores que entram com ?name=.
+
+    Cada classificação ("rating" e "score") é uma RankTree com chaves
+    (-valor, nome): o melhor fica na posição 0, o top N sai em
+    O(log n + N) e a posição de um jogador em O(log n). Empates dividem a
+    posição (1, 2, 2, 4). Só partidas com pelo menos dois jogadores com
+    nome mexem nos ratings; bots e anônimos não entram na classificação,
+    mas o recorde vale em qualquer partida.
+    """
+
+    BOARDS = ("rating", "score")
+
+    def __init__(self):
+        self.players: Dict[str, Standing] = {}
+        self.trees = {by: RankTree() for by in self.BOARDS}
+        self.indexed = True
+
+    def rebuild(self, results: Iterable[Dict]) -> int:
+        """Refaz tudo a partir dos eventos de fim de partida (events.read_results).
+
+        Os ratings são recalculados em ordem só nos dicionários; as árvores
+        são montadas uma vez no final. Retorna o número de partidas lidas.
+        """
+        self.players = {}
+        self.indexed = False
+        count = 0
+        # Milhares de objetos novos e duradouros: sem o coletor de ciclos
+        # varrendo-os a cada lote, a carga leva metade do tempo
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            for result in results:
+                self.record(result)
+                count += 1
+            for by in self.BOARDS:
+                keys = sorted((-standing.value(by), name) for name, standing in self.players.items())
+                self.trees[by] = RankTree.build(keys)
+        finally:
+            if collecting:
+                gc.enable()
+        self.indexed = True
+        return count
+
+    def record(self, result: Dict):
+        """Aplica o fim de uma partida (evento "end" do EventLog)"""
+        names = result.get("n")
+        if not names:
+            return
+        scores = result["s"]
+        winner = result.get("w")
+        # O mesmo nome em dois lugares conta como um jogador só, no melhor lugar
+        seats = {}
+        for player_id, name in names.items():
+            other = seats.get(name)
+            if other is None or other != winner and scores.get(player_id, 0) > scores.get(other, 0):
+                seats[name] = player_id
+        players = self.players
+        for name in seats:
+            if name not in players:
+                standing = players[name] = Standing(name)
+                if self.indexed:
+                    for by in self.BOARDS:
+                        self.trees[by].insert((-standing.value(by), name))
+        changes = {}
+        if len(seats) > 1:
+            # Elo contra cada adversário, com os ratings de antes da partida
+            before = [(name, players[name].rating, scores.get(player_id, 0))
+                      for name, player_id in seats.items()]
+            weight = K_FACTOR / (len(before) - 1)
+            for name, rating, score in before:
+                total = 0.0
+                for other, other_rating, other_score in before:
+                    if other == name:
+                        continue
+                    actual = 1.0 if score > other_score else 0.5 if score == other_score else 0.0
+                    total += actual - 1 / (1 + 10 ** ((other_rating - rating) / 400))
+                changes[name] = weight * total
+        for name, player_id in seats.items():
+            standing = players[name]
+            self._update(standing, standing.rating + changes.get(name, 0.0),
+                         max(standing.best, scores.get(player_id, 0)))
+            standing.games += 1
+            if player_id == winner:
+                standing.wins += 1
+
+    def _update(self, standing: Standing, rating: float, best: int):
+        if self.indexed:
+            for by, value in (("rating", rating), ("score", best)):
+                if value != standing.value(by):
+                    tree = self.trees[by]
+                    tree.remove((-standing.value(by), standing.name))
+                    tree.insert((-value, standing.name))
+        standing.rating = rating
+        standing.best = best
+
+    def rank(self, name: str, by: str = "rating") -> Optional[int]:
+        """Posição do jogador (1 = melhor), ou None se ele não tem partidas"""
+        standing = self.players.get(name)
+        if standing is None:
+            return None
+        return self.trees[by].rank((-standing.value(by), "")) + 1
+
+    def top(self, n: int, by: str = "rating") -> List[Dict]:
+        """Os n melhores com a posição de cada um"""
+        tree = self.trees[by]
+        entries = []
+        for value, name in tree.first(n):
+            entry = self.players[name].info()
+            entry["rank"] = tree.rank((value, "")) + 1
+            entries.append(entry)
+        return entries
+
+    def query(self, request: "LeaderboardQuery") -> Dict:
+        """Resposta da consulta ws://host:8765/leaderboard"""
+        reply = {"type": "leaderboard", "by": request.by, "players": len(self.players),
+                 "top": self.top(request.top, request.by)}
+        if request.player is not None:
+            standing = self.players.get(request.player)
+            reply["player"] = None if standing is None else {
+                **standing.info(), "rank": self.rank(request.player, request.by)}
+        return reply
+
+
+class LeaderboardQuery(NamedTuple):
+    top: int = 10
+    player: Optional[str] = None
+    by: str = "rating"
+
+
+def clean_name(name: Optional[str]) -> Optional[str]:
+    """Nome de jogador aceito na classificação, ou None"""
+    if name is None:
+        return None
+    name = "".join(ch for ch in name if ch.isprintable()).strip()[:MAX_NAME]
+    return name or None
+
+
+def player_name_from_path(path: str) -> Optional[str]:
+    """Nome do jogador na URL (ws://host:8765/?name=ana), ou None se anônimo"""
+    return clean_name(parse_qs(urlsplit(path or "").query).get("name", [None])[0])
+
+
+def parse_leaderboard_path(path: str) -> Optional[LeaderboardQuery]:
+    """Reconhece ws://host:8765/leaderboard?top=10&player=ana&by=score; None se não for consulta"""
+    parts = urlsplit(path or "")
+    if parts.path.rstrip("/") != "/leaderboard":
+        return None
+    query = parse_qs(parts.query)
+    default = LeaderboardQuery()
+    try:
+        top = min(max(int(query.get("top", [default.top])[0]), 0), MAX_TOP)
+    except ValueError:
+        top = default.top
+    by = query.get("by", [default.by])[0]
+    return LeaderboardQuery(top, clean_name(query.get("player", [None])[0]),
+                            by if by in Leaderboard.BOARDS else default.by)
@@ -0,0 +1,251 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import websockets
+
+from moves import MoveIndex, format_move, parse_move
+from protocol import DELTA_TYPES, apply_delta, encode_move
+
+DELTA_NAMES = {short: name for name, short in DELTA_TYPES.items()}
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p90/p99/máx em milissegundos"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return {"n": len(ordered), "p50": pick(0.5), "p90": pick(0.9), "p99": pick(0.99),
+            "max": ordered[-1] * 1000}
+
+
+def process_cpu(pid: int) -> float:
+    """Segundos de CPU (usuário + sistema) de um processo, via /proc (Linux)"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    # Campos 14 e 15 do stat (utime, stime), contados a partir do estado
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+class Stats:
+    """Latências por evento e contagem de mensagens de todos os bots"""
+
+    def __init__(self):
+        self.latency = defaultdict(list)
+        self.messages = 0
+        self.games = 0
+        self.errors = defaultdict(int)
+
+
+class Bot:
+    """Cliente sem interface: entra na fila e joga trocas válidas até o fim da partida.
+
+    Mede o tempo até o init, a espera pelo game_start, cada etapa de
+    tabuleiro (desde o envio da jogada), o turn_complete e o game_over
+    (desde a última jogada).
+    """
+
+    def __init__(self, url: str, stats: Stats, wire: str = "full", batch: bool = False,
+                 think: float = 0.0, rng: random.Random = None, binary: bool = False,
+                 pace: float = None):
+        self.url = url
+        self.binary = binary
+        self.stats = stats
+        self.wire = wire
+        self.batch = batch
+        self.pace = pace
+        self.think = think
+        self.rng = rng or random.Random()
+        self.board = None
+        self.sent_at = None
+
+    def decode(self, raw) -> List[Dict]:
+        """Mensagem do servidor -> lista de eventos no formato completo"""
+        data = json.loads(raw)
+        if "t" in data:
+            if data["t"] == DELTA_TYPES["board_steps"]:
+                events = []
+                for step in data["steps"]:
+                    apply_delta(self.board, step["d"])
+                    events.append({"type": "board_update", "moves_left": step["l"]})
+                return events
+            apply_delta(self.board, data["d"])
+            return [{"type": DELTA_NAMES[data["t"]], "moves_left": data["l"], "hints": data.get("h")}]
+        if data.get("type") == "board_steps":
+            self.board = [row[:] for row in data["steps"][-1]["board"]]
+            return [{"type": "board_update", "moves_left": step["moves_left"]} for step in data["steps"]]
+        if "board" in data:
+            self.board = [row[:] for row in data["board"]]
+        return [data]
+
+    def choose_move(self, hints) -> str:
+        """Uma troca válida: das dicas do servidor ou calculada do tabuleiro"""
+        if not hints:
+            index = MoveIndex(self.board)
+            hints = [format_move(a, b) for a, b in index.moves()]
+        return self.rng.choice(hints)
+
+    async def send_move(self, ws, hints):
+        if self.think:
+            await asyncio.sleep(self.think)
+        move = self.choose_move(hints)
+        self.sent_at = time.perf_counter()
+        if self.binary:
+            await ws.send(encode_move(*parse_move(move), len(self.board[0])))
+        else:
+            await ws.send(json.dumps({"type": "move", "move": move}))
+
+    async def run(self):
+        stats = self.stats
+        start = time.perf_counter()
+        async with websockets.connect(self.url, max_queue=None) as ws:
+            init = json.loads(await ws.recv())
+            joined = time.perf_counter()
+            stats.latency["init"].append(joined - start)
+            stats.messages += 1
+            self.board = init["board"]
+            hints = init.get("hints")
+            self.binary = self.binary and "binary" in init.get("move_formats", [])
+            wire = {"type": "wire", "batch": self.batch}
+            if self.wire != "full" and self.wire in init.get("wire_modes", []):
+                wire["mode"] = self.wire
+            if self.pace is not None:
+                wire["pace"] = self.pace
+            if len(wire) > 2 or self.batch:
+                await ws.send(json.dumps(wire))
+            async for raw in ws:
+                stats.messages += 1
+                now = time.perf_counter()
+                for event in self.decode(raw):
+                    kind = event.get("type")
+                    if kind == "game_start":
+                        stats.latency["game_start"].append(now - joined)
+                        await self.send_move(ws, hints)
+                    elif kind == "board_update" and self.sent_at is not None:
+                        stats.latency["board_update"].append(now - self.sent_at)
+                    elif kind == "turn_complete":
+                        stats.latency["turn_complete"].append(now - self.sent_at)
+                        if event["moves_left"] > 0:
+                            await self.send_move(ws, event.get("hints"))
+                    elif kind == "move_error":
+                        stats.errors[event.get("message", "")] += 1
+                        await self.send_move(ws, None)
+                    elif kind == "game_over":
+                        if self.sent_at is not None:
+                            stats.latency["game_over"].append(now - self.sent_at)
+                        stats.games += 1
+                        return
+
+
+async def run_load(args) -> Dict:
+    stats = Stats()
+    rng = random.Random(args.seed)
+    server = None
+    pid = args.server_pid
+    if args.spawn:
+        server = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py"),
+                                   "--port", str(args.port)] + args.server_args.split(),
+                                  stdout=subprocess.DEVNULL)
+        pid = server.pid
+        await asyncio.sleep(1.5)
+    url = args.url or f"ws://localhost:{args.port}/?players={args.players}&moves={args.moves}"
+    cpu_before = process_cpu(pid) if pid else None
+
+    if args.clients % args.players:
+        # Com sobra, os últimos bots esperariam para sempre por adversários
+        args.clients += args.players - args.clients % args.players
+        print(f"Arredondando para {args.clients} clientes (múltiplo de {args.players})")
+    bots = []
+    start = time.perf_counter()
+    try:
+        for _ in range(args.clients):
+            bot = Bot(url, stats, args.wire, args.batch, args.think, random.Random(rng.random()),
+                      args.move_format == "binary", args.pace)
+            bots.append(asyncio.ensure_future(bot.run()))
+            if args.rate:
+                # Ritmo de novas conexões por segundo
+                await asyncio.sleep(1 / args.rate)
+        done, pending = await asyncio.wait(bots, timeout=args.timeout)
+        for bot in pending:
+            bot.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        results = [bot.exception() if not bot.cancelled() else asyncio.TimeoutError()
+                   for bot in bots]
+    finally:
+        elapsed = time.perf_counter() - start
+        cpu = process_cpu(pid) - cpu_before if pid else None
+        if server:
+            server.terminate()
+            server.wait()
+
+    for result in results:
+        if result is not None:
+            stats.errors[type(result).__name__] += 1
+    games = stats.games / args.players if args.players else stats.games
+    return {
+        "clients": args.clients,
+        "games": games,
+        "elapsed": elapsed,
+        "messages_per_second": stats.messages / elapsed if elapsed else 0.0,
+        "latency_ms": {name: percentiles(samples) for name, samples in stats.latency.items()},
+        "server_cpu": cpu,
+        "server_cpu_per_game_ms": cpu / games * 1000 if cpu is not None and games else None,
+        "errors": dict(stats.errors),
+    }
+
+
+def print_report(report: Dict):
+    print(f"{report['clients']} clientes, {report['games']:.0f} partidas em {report['elapsed']:.2f}s")
+    print(f"Mensagens/s: {report['messages_per_second']:.0f}")
+    print(f"{'evento':<14}{'n':>8}{'p50':>10}{'p90':>10}{'p99':>10}{'máx':>10}  (ms)")
+    for name in ("init", "game_start", "board_update", "turn_complete", "game_over"):
+        p = report["latency_ms"].get(name)
+        if p:
+            print(f"{name:<14}{p['n']:>8}{p['p50']:>10.1f}{p['p90']:>10.1f}{p['p99']:>10.1f}{p['max']:>10.1f}")
+    if report["server_cpu"] is not None:
+        print(f"CPU do servidor: {report['server_cpu']:.2f}s "
+              f"({report['server_cpu_per_game_ms'] or 0:.1f} ms por partida)")
+    if report["errors"]:
+        print(f"Erros: {report['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gerador de carga: bots jogando contra o servidor")
+    parser.add_argument("--clients", type=int, default=100, help="Conexões simultâneas")
+    parser.add_argument("--players", type=int, default=2, help="Jogadores por partida")
+    parser.add_argument("--moves", type=int, default=3, help="Jogadas por jogador")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", default=None, help="URL completa (ignora --port/--players/--moves)")
+    parser.add_argument("--rate", type=float, default=0.0, help="Novas conexões por segundo (0 = todas de uma vez)")
+    parser.add_argument("--think", type=float, default=0.0, help="Pausa do bot antes de cada jogada (s)")
+    parser.add_argument("--wire", choices=["full", "delta"], default="full")
+    parser.add_argument("--batch", action="store_true", help="Pede as etapas em board_steps")
+    parser.add_argument("--pace", type=float, default=None,
+                        help="Segundos entre as etapas enviadas uma a uma (sem --batch; padrão: o do servidor)")
+    parser.add_argument("--move-format", choices=["text", "binary"], default="text",
+                        help="Jogadas em JSON ou em frames binários de 5 bytes")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Tempo máximo do teste (s)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed das escolhas dos bots")
+    parser.add_argument("--spawn", action="store_true", help="Sobe um server.py só para o teste")
+    parser.add_argument("--server-args", default="", help="Argumentos extras para o server.py do --spawn")
+    parser.add_argument("--server-pid", type=int, default=None, help="PID do servidor para medir CPU")
+    parser.add_argument("--json", action="store_true", help="Relatório em JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
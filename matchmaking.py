@@ -0,0 +1,133 @@
+import asyncio
+from typing import Callable, Dict, NamedTuple
+from urllib.parse import parse_qs, urlsplit
+from board import MAX_COLORS, MAX_SIZE, MIN_COLORS, MIN_SIZE, SYMBOLS
+
+
+class QueueKey(NamedTuple):
+    """Modalidade de partida: jogadores por jogo, jogadas por jogador,
+    dimensões do tabuleiro, número de cores (board.palette) e se os lugares
+    vagos são completados com bots na hora (partida solo)
+    """
+    players: int = 2
+    moves: int = 3
+    rows: int = 6
+    cols: int = 6
+    colors: int = len(SYMBOLS)
+    bots: bool = False
+
+
+def queue_key_from_path(path: str) -> QueueKey:
+    """Lê a modalidade da URL de conexão, ex.: ws://host:8765/?players=3&moves=5
+
+    O tabuleiro vem de rows/cols (ou size para os dois) e colors, ex.:
+    ?size=64&colors=6 para o modo maratona; ?bots=1 joga contra bots sem
+    esperar outros jogadores.
+    """
+    query = parse_qs(urlsplit(path or "").query)
+    key = QueueKey()
+    try:
+        players = int(query.get("players", [key.players])[0])
+        moves = int(query.get("moves", [key.moves])[0])
+        size = query.get("size", [None])[0]
+        rows = int(query.get("rows", [size or key.rows])[0])
+        cols = int(query.get("cols", [size or key.cols])[0])
+        colors = int(query.get("colors", [key.colors])[0])
+        bots = int(query.get("bots", [0])[0]) > 0
+    except ValueError:
+        return key
+    return QueueKey(min(max(players, 2), 8), min(max(moves, 1), 50),
+                    min(max(rows, MIN_SIZE), MAX_SIZE), min(max(cols, MIN_SIZE), MAX_SIZE),
+                    min(max(colors, MIN_COLORS), MAX_COLORS), bots)
+
+
+def resume_token_from_path(path: str):
+    """Token de retomada da URL (ws://host:8765/?resume=<token>), ou None"""
+    return parse_qs(urlsplit(path or "").query).get("resume", [None])[0]
+
+
+class MatchQueue:
+    """Fila de uma modalidade: o próximo jogo em formação e quem espera nele"""
+
+    def __init__(self, key: QueueKey):
+        self.key = key
+        self.forming = None
+        self.joined = {}  # conexão -> instante em que entrou na fila
+
+
+class Matchmaker:
+    """Agrupa conexões em jogos assim que a modalidade tem jogadores suficientes.
+
+    Nada é consultado periodicamente: quem espera aguarda game.full, um
+    asyncio.Future que o último jogador a entrar resolve. A modalidade vem
+    da URL, então a fila sai de queues assim que fica vazia; o tempo até
+    formar o jogo é somado no Matchmaker, para todas as filas.
+    """
+
+    def __init__(self, game_factory: Callable):
+        self.game_factory = game_factory
+        self.queues: Dict[QueueKey, MatchQueue] = {}
+        self.matched = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def join(self, key: QueueKey, websocket):
+        """Devolve o jogo em formação da modalidade, criando um se preciso"""
+        queue = self.queues.get(key)
+        if queue is None:
+            queue = self.queues[key] = MatchQueue(key)
+        if queue.forming is None:
+            queue.forming = self.game_factory(key)
+        queue.joined[websocket] = asyncio.get_event_loop().time()
+        return queue.forming
+
+    def seated(self, key: QueueKey, game):
+        """Chamado depois que o jogador foi adicionado: fecha o jogo se lotou"""
+        queue = self.queues[key]
+        if game is not queue.forming or len(game.players) < game.capacity:
+            return
+        now = asyncio.get_event_loop().time()
+        for websocket in game.players:
+            waited = now - queue.joined.pop(websocket, now)
+            self.matched += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+        queue.forming = None
+        self.discard(queue)
+        game.full.set_result(True)
+
+    def leave(self, key: QueueKey, game, websocket):
+        """Remove da fila uma conexão que caiu antes do jogo lotar"""
+        queue = self.queues.get(key)
+        if queue is None or game is not queue.forming:
+            return
+        queue.joined.pop(websocket, None)
+        if not game.players:
+            queue.forming = None
+            self.discard(queue)
+
+    def discard(self, queue: MatchQueue):
+        """Tira de queues a fila sem jogo em formação e sem ninguém esperando"""
+        if queue.forming is None and not queue.joined:
+            del self.queues[queue.key]
+
+    def waiting(self) -> int:
+        """Jogadores esperando em todas as filas"""
+        return sum(len(queue.joined) for queue in self.queues.values())
+
+    def average_wait(self) -> float:
+        return self.total_wait / self.matched if self.matched else 0.0
+
+    def stats(self) -> Dict:
+        """Tamanho de cada fila e tempo até formar o jogo"""
+        return {
+            "queues": {
+                f"{key.players}p-{key.moves}m-{key.rows}x{key.cols}-{key.colors}c{'-bots' if key.bots else ''}":
+                    len(queue.joined)
+                for key, queue in self.queues.items()
+            },
+            "waiting": self.waiting(),
+            "matched": self.matched,
+            "avg_wait": self.average_wait(),
+            "max_wait": self.max_wait,
+        }
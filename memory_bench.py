@@ -0,0 +1,98 @@
+import argparse
+import asyncio
+import gc
+import json
+import tracemalloc
+from typing import Dict
+
+from board import configure_cascade_cache
+from matchmaking import QueueKey
+from moves import parse_move
+from server import GameManager
+
+
+class IdleSocket:
+    """Conexão falsa: aceita os envios e os descarta"""
+
+    __slots__ = ("__weakref__",)
+
+    async def send(self, payload):
+        pass
+
+    async def close(self):
+        pass
+
+
+async def fill_games(manager: GameManager, key: QueueKey, sessions: int, moves: int):
+    """Senta sessions jogadores em jogos da modalidade key e inicia cada jogo
+    que lota; com moves > 0, cada jogador faz essa quantidade de jogadas válidas.
+    """
+    games = []
+    for _ in range(sessions):
+        websocket = IdleSocket()
+        game, _ = await manager.seat_player(websocket, key)
+        # Como os bots: as etapas vão num board_steps, sem o ritmo do servidor
+        game.players[websocket].batched = True
+        if game.full.done():
+            await game.start()
+            games.append(game)
+    for _ in range(moves):
+        for game in games:
+            for websocket, seat in list(game.players.items()):
+                move = parse_move(seat.index.hints(1)[0])
+                await game.handle_move(websocket, move)
+    return games
+
+
+async def measure(sessions: int, moves: int, key: QueueKey) -> Dict:
+    """Bytes alocados (tracemalloc) por jogo e por sessão, incluindo GameManager,
+    filas e agendador; o cache de cascatas, que é do processo e limitado, fica de fora.
+    """
+    configure_cascade_cache(0)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        manager = GameManager()
+        games = await fill_games(manager, key, sessions, moves)
+        gc.collect()
+        used = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    return {
+        "sessions": sessions,
+        "games": len(games),
+        "moves": moves,
+        "bytes": used,
+        "bytes_per_game": used / len(games) if games else 0.0,
+        "bytes_per_session": used / sessions if sessions else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memória por jogo ocioso e ativo com muitas sessões")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[10_000, 100_000],
+                        help="Quantidades de sessões (jogadores) medidas")
+    parser.add_argument("--players", type=int, default=2, help="Jogadores por partida")
+    parser.add_argument("--moves", type=int, default=1, help="Jogadas de cada jogador num jogo ativo")
+    parser.add_argument("--size", type=int, default=6, help="Lado do tabuleiro")
+    parser.add_argument("--json", action="store_true", help="Resultados em JSON")
+    args = parser.parse_args()
+
+    key = QueueKey(args.players, max(args.moves, 1) + 1, args.size, args.size)
+    results = []
+    for sessions in args.sessions:
+        for label, moves in (("ocioso", 0), ("ativo", args.moves)):
+            result = asyncio.run(measure(sessions, moves, key))
+            result["state"] = label
+            results.append(result)
+            if not args.json:
+                print(f"{sessions:>8} sessões {label:<7}{result['bytes_per_game']:>10.0f} B/jogo"
+                      f"{result['bytes_per_session']:>10.0f} B/sessão"
+                      f"{result['bytes'] / 2 ** 20:>10.1f} MiB")
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
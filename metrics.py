@@ -0,0 +1,231 @@
+import asyncio
+from bisect import bisect_left
+from typing import Callable, Dict, Sequence, Tuple
+
+# Limites (em segundos) para tempos de jogada e de envio
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# Rodadas de combinação numa jogada
+CASCADE_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10)
+
+
+class Counter:
+    """Contador que só cresce"""
+
+    __slots__ = ("value",)
+    kind = "counter"
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+    def samples(self, name: str, labels: str):
+        yield name, labels, self.value
+
+
+class Gauge:
+    """Valor que sobe e desce; com func, é lido só na coleta"""
+
+    __slots__ = ("value", "func")
+    kind = "gauge"
+
+    def __init__(self, func: Callable[[], float] = None):
+        self.value = 0
+        self.func = func
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def samples(self, name: str, labels: str):
+        yield name, labels, self.func() if self.func is not None else self.value
+
+
+class Histogram:
+    """Distribuição em faixas fixas: observe só incrementa uma posição da lista"""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+    kind = "histogram"
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        # Uma posição a mais para os valores acima do último limite (+Inf)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name: str, labels: str):
+        cumulative = 0
+        sep = labels + "," if labels else ""
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            yield f"{name}_bucket", f'{sep}le="{bound}"', cumulative
+        yield f"{name}_bucket", f'{sep}le="+Inf"', self.count
+        yield f"{name}_sum", labels, self.sum
+        yield f"{name}_count", labels, self.count
+
+
+class Metrics:
+    """Registro das métricas do processo, exportado no formato texto do Prometheus.
+
+    Os instrumentos são criados uma vez (na inicialização) e guardados por
+    quem os usa; registrar um evento é só uma soma, sem alocação. Quem não
+    quer métricas passa metrics=None e o caminho das jogadas só testa isso.
+    """
+
+    def __init__(self, **labels):
+        # Rótulos comuns a todas as séries (ex.: worker no modo multiprocesso)
+        self.labels = labels
+        self.families: Dict[str, Tuple[str, str, list]] = {}
+
+    def _register(self, name: str, help_text: str, metric, labels: Dict):
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = (metric.kind, help_text, [])
+        elif family[0] != metric.kind:
+            raise ValueError(f"Métrica {name} já registrada como {family[0]}")
+        merged = {**self.labels, **labels}
+        family[2].append((",".join(f'{k}="{v}"' for k, v in merged.items()), metric))
+        return metric
+
+    def counter(self, name: str, help_text: str, **labels) -> Counter:
+        return self._register(name, help_text, Counter(), labels)
+
+    def gauge(self, name: str, help_text: str, func: Callable[[], float] = None, **labels) -> Gauge:
+        return self._register(name, help_text, Gauge(func), labels)
+
+    def histogram(self, name: str, help_text: str, bounds: Sequence[float] = LATENCY_BUCKETS,
+                  **labels) -> Histogram:
+        return self._register(name, help_text, Histogram(bounds), labels)
+
+    def render(self) -> str:
+        lines = []
+        for name, (kind, help_text, series) in self.families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in series:
+                for sample, sample_labels, value in metric.samples(name, labels):
+                    label_text = "{" + sample_labels + "}" if sample_labels else ""
+                    lines.append(f"{sample}{label_text} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class GameMetrics:
+    """Instrumentos usados por Game e GameManager, criados uma vez no registro"""
+
+    ERRORS = ("not_started", "format", "bounds", "no_match", "busy", "error")
+
+    def __init__(self, metrics: Metrics):
+        self.registry = metrics
+        self.moves = metrics.counter("blockshuffle_moves_total", "Jogadas válidas processadas")
+        self.move_errors = {reason: metrics.counter("blockshuffle_move_errors_total",
+                                                    "Jogadas recusadas, por motivo", reason=reason)
+                            for reason in self.ERRORS}
+        self.move_seconds = metrics.histogram("blockshuffle_move_seconds",
+                                              "Tempo de uma jogada válida, do recebimento ao turn_complete")
+        self.compute_seconds = metrics.histogram("blockshuffle_move_compute_seconds",
+                                                 "Tempo de process_move (inline ou no executor)")
+        self.cascade_depth = metrics.histogram("blockshuffle_cascade_depth",
+                                               "Rodadas de combinação por jogada", CASCADE_BUCKETS)
+        self.send_seconds = metrics.histogram("blockshuffle_send_seconds",
+                                              "Tempo de envio de uma mensagem a um jogador")
+        self.slow_skips = metrics.counter("blockshuffle_slow_client_skips_total",
+                                          "Mensagens puladas: buffer de escrita do cliente cheio")
+        self.slow_closes = metrics.counter("blockshuffle_slow_client_closes_total",
+                                           "Conexões fechadas por lentidão")
+        self.games_started = metrics.counter("blockshuffle_games_started_total", "Partidas iniciadas")
+        self.games_finished = metrics.counter("blockshuffle_games_finished_total", "Partidas encerradas")
+        self.players = metrics.gauge("blockshuffle_players_connected", "Jogadores conectados")
+
+    def watch(self, name: str, help_text: str, func: Callable[[], float]):
+        """Gauge lido na coleta (tamanho de filas, jogos ativos...)"""
+        self.registry.gauge(name, help_text, func)
+
+
+class LoopLagMonitor:
+    """Mede o atraso do loop do asyncio: um callback agendado a cada interval
+    segundos anota quanto disparou depois do previsto.
+    """
+
+    def __init__(self, metrics: Metrics, interval: float = 0.25):
+        self.interval = interval
+        self.lag = metrics.histogram("blockshuffle_event_loop_lag_seconds",
+                                     "Atraso dos callbacks do loop em relação ao agendado")
+        self.max_lag = metrics.gauge("blockshuffle_event_loop_lag_max_seconds",
+                                     "Maior atraso do loop desde a última coleta")
+        self.handle = None
+
+    def start(self):
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + self.interval
+        self.handle = loop.call_at(deadline, self._tick, deadline)
+
+    def stop(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+
+    def _tick(self, expected: float):
+        loop = asyncio.get_event_loop()
+        now = loop.time()
+        lag = max(now - expected, 0.0)
+        self.lag.observe(lag)
+        if lag > self.max_lag.value:
+            self.max_lag.set(lag)
+        deadline = now + self.interval
+        self.handle = loop.call_at(deadline, self._tick, deadline)
+
+    def collected(self):
+        """O máximo vale por janela de coleta"""
+        self.max_lag.set(0.0)
+
+
+class MetricsServer:
+    """Endpoint HTTP mínimo: GET /metrics devolve Metrics.render()"""
+
+    def __init__(self, metrics: Metrics, monitor: LoopLagMonitor = None):
+        self.metrics = metrics
+        self.monitor = monitor
+        self.server = None
+
+    async def start(self, host: str, port: int):
+        self.server = await asyncio.start_server(self.handle, host, port)
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+
+    async def handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readline(), 5.0)
+            # Descarta os cabeçalhos
+            while (await asyncio.wait_for(reader.readline(), 5.0)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] in ("/", "/metrics"):
+                body = self.metrics.render().encode()
+                if self.monitor is not None:
+                    self.monitor.collected()
+                status = "200 OK"
+            else:
+                body = b"not found\n"
+                status = "404 Not Found"
+            writer.write(f"HTTP/1.0 {status}\r\n"
+                         f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                         f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,145 @@
+import re
+from typing import List, Sequence, Tuple
+from bitboard import BitBoard, iter_bits
+
+
+def _line_targets(mask: int, shift: int):
+    """Células onde uma peça de mask completaria uma sequência de 3 na direção do shift.
+
+    Retorna (antes, meio, depois): a peça entraria antes de duas iguais, entre
+    duas iguais ou depois de duas iguais. A coluna de guarda do layout impede
+    que as sequências horizontais passem de uma linha para a outra.
+    """
+    ahead = mask >> shift
+    behind = mask << shift
+    return (ahead & (mask >> (2 * shift)),
+            ahead & behind,
+            behind & (mask << (2 * shift)))
+
+
+def valid_swaps(bitboard: BitBoard) -> Tuple[int, int]:
+    """Todas as trocas válidas do tabuleiro com operações sobre as máscaras.
+
+    Retorna (right, down) no formato de MoveIndex. Ao trocar p com q, a peça
+    que sai de p não pode contar para a sequência que se forma em q; por isso,
+    na direção da troca, só entram as sequências do lado oposto a p.
+    """
+    geo = bitboard.layout
+    stride = geo.stride
+    right = down = 0
+    for mask in bitboard.masks.values():
+        if not mask:
+            continue
+        h_before, h_middle, h_after = _line_targets(mask, 1)
+        v_before, v_middle, v_after = _line_targets(mask, stride)
+        horizontal = h_before | h_middle | h_after
+        vertical = v_before | v_middle | v_after
+        # A peça em p vai para p + 1 / a peça em p + 1 vai para p
+        right |= ((h_before | vertical) >> 1) & mask & ~(mask >> 1)
+        right |= (h_after | vertical) & (mask >> 1) & ~mask
+        # O mesmo na vertical, com p + stride
+        down |= ((v_before | horizontal) >> stride) & mask & ~(mask >> stride)
+        down |= (v_after | horizontal) & (mask >> stride) & ~mask
+    # Trocas só entre duas células ocupadas (e dentro do tabuleiro)
+    filled = bitboard.occupied() & geo.full
+    return right & filled & (filled >> 1), down & filled & (filled >> stride)
+
+
+class MoveIndex:
+    """Índice das trocas entre vizinhos que formam pelo menos uma combinação.
+
+    right guarda o bit p quando trocar p com a célula à direita é válido;
+    down, quando trocar p com a célula de baixo é válido. Só esses dois
+    inteiros e o layout (compartilhado) ficam guardados: há um índice por
+    jogador conectado. Não há atualização parcial: cada update refaz o
+    índice inteiro a partir do tabuleiro.
+    """
+
+    __slots__ = ("layout", "right", "down")
+
+    def __init__(self, board: Sequence[Sequence[str]]):
+        self.update(board)
+
+    def update(self, board: Sequence[Sequence[str]]):
+        """Refaz right e down do zero para o novo tabuleiro.
+
+        Converte o tabuleiro para BitBoard e roda valid_swaps sobre ele: poucas
+        dezenas de operações com inteiros do tamanho do tabuleiro por símbolo, sem
+        olhar o índice anterior. É chamado depois de cada jogada e de cada
+        reembaralhamento (Game.set_board).
+        """
+        bitboard = BitBoard.from_rows(board)
+        self.layout = bitboard.layout
+        self.right, self.down = valid_swaps(bitboard)
+
+    def is_valid(self, row1: int, col1: int, row2: int, col2: int) -> bool:
+        """Consulta O(1): a troca entre duas células vizinhas forma combinação?"""
+        stride = self.layout.stride
+        p, q = sorted((row1 * stride + col1, row2 * stride + col2))
+        if row1 == row2 and q - p == 1:
+            return bool(self.right >> p & 1)
+        if col1 == col2 and q - p == stride:
+            return bool(self.down >> p & 1)
+        return False
+
+    def has_moves(self) -> bool:
+        return bool(self.right or self.down)
+
+    def moves(self) -> List[Tuple[Tuple[int, int], Tuple[int, int]]]:
+        """Lista as trocas válidas como pares de (linha, coluna)"""
+        cell = self.layout.cell
+        stride = self.layout.stride
+        result = [(cell(p), cell(p + 1)) for p in iter_bits(self.right)]
+        result += [(cell(p), cell(p + stride)) for p in iter_bits(self.down)]
+        return result
+
+    def hints(self, limit: int = None) -> List[str]:
+        """Trocas válidas no formato de movimento do protocolo ("A1 A2"); no
+        máximo limit delas (tabuleiros grandes têm milhares)
+        """
+        moves = self.moves()
+        if limit is not None:
+            moves = moves[:limit]
+        return [format_move(a, b) for a, b in moves]
+
+
+def row_label(row: int) -> str:
+    """Letra(s) da linha: A..Z, depois AA, AB... como nas planilhas"""
+    label = ""
+    row += 1
+    while row:
+        row, rest = divmod(row - 1, 26)
+        label = chr(ord('A') + rest) + label
+    return label
+
+
+def format_cell(row: int, col: int) -> str:
+    return f"{row_label(row)}{col + 1}"
+
+
+def format_move(a: Tuple[int, int], b: Tuple[int, int]) -> str:
+    """Formata duas coordenadas (linha, coluna) como "A1 B1" """
+    return f"{format_cell(*a)} {format_cell(*b)}"
+
+
+_CELL = re.compile(r"([A-Za-z]+)(\d+)")
+
+
+def parse_cell(text: str) -> Tuple[int, int]:
+    """Desfaz format_cell: "B10" -> (1, 9); levanta ValueError se mal formado"""
+    match = _CELL.fullmatch(text)
+    if match is None:
+        raise ValueError(f"Coordenada inválida: {text!r}")
+    letters, digits = match.groups()
+    row = 0
+    for letter in letters.upper():
+        row = row * 26 + ord(letter) - ord('A') + 1
+    return row - 1, int(digits) - 1
+
+
+def parse_move(move: str) -> Tuple[int, int, int, int]:
+    """ "A1 B1" -> (linha1, coluna1, linha2, coluna2), sem checar limites"""
+    parts = move.split()
+    if len(parts) != 2:
+        raise ValueError("Formato inválido")
+    return parse_cell(parts[0]) + parse_cell(parts[1])
@@ -0,0 +1,113 @@
+import json
+import struct
+from typing import Dict, List, Tuple
+
+# Modos de envio aceitos no handshake ({"type": "wire", "mode": ...})
+WIRE_MODES = ["full", "delta"]
+
+# Formatos de jogada aceitos do cliente, anunciados no init ("move_formats").
+# "binary": frame binário de 5 bytes, opcode e os índices lineares
+# (linha * colunas + coluna) das duas células, big-endian:
+#     B opcode (BINARY_MOVE) | H célula 1 | H célula 2
+MOVE_FORMATS = ["text", "binary"]
+BINARY_MOVE = 0x01
+MOVE_FRAME = struct.Struct("!BHH")
+
+# Tipos curtos usados no modo delta
+DELTA_TYPES = {
+    "board_update": "u",
+    "turn_complete": "c",
+    "board_steps": "s",
+}
+
+
+def board_delta(old: List[List[str]], new: List[List[str]]) -> Dict[str, List[int]]:
+    """Células que mudaram, agrupadas pelo novo símbolo.
+
+    As células são índices lineares (linha * colunas + coluna); células
+    esvaziadas aparecem sob ' '.
+    """
+    delta = {}
+    cols = len(new[0])
+    for i, (old_row, new_row) in enumerate(zip(old, new)):
+        if old_row == new_row:
+            continue
+        base = i * cols
+        for j, symbol in enumerate(new_row):
+            if old_row[j] != symbol:
+                delta.setdefault(symbol, []).append(base + j)
+    return delta
+
+
+def apply_delta(board: List[List[str]], delta: Dict[str, List[int]]):
+    """Aplica no lugar um delta gerado por board_delta"""
+    cols = len(board[0])
+    for symbol, cells in delta.items():
+        for cell in cells:
+            board[cell // cols][cell % cols] = symbol
+
+
+def encode_delta(message_type: str, old: List[List[str]], new: List[List[str]],
+                 score: int, moves_left: int, message: str, hints: List[str] = None) -> str:
+    """Serializa uma atualização de tabuleiro no modo delta (chaves curtas)"""
+    payload = {
+        "t": DELTA_TYPES[message_type],
+        "d": board_delta(old, new),
+        "s": score,
+        "l": moves_left,
+        "m": message,
+    }
+    if hints is not None:
+        payload["h"] = hints
+    return json.dumps(payload, separators=(",", ":"))
+
+
+def encode_steps(previous: List[List[str]], steps: List[Dict], moves_left: int,
+                 interval: float, delta: bool) -> str:
+    """Serializa todas as etapas de uma jogada numa única mensagem.
+
+    Cada etapa leva "at" (ms desde a primeira) para o cliente animar sozinho.
+    steps: dicts com "board", "score" e "message".
+    """
+    interval_ms = int(interval * 1000)
+    items = []
+    for k, step in enumerate(steps):
+        if delta:
+            items.append({
+                "d": board_delta(previous, step["board"]),
+                "s": step["score"],
+                "l": moves_left,
+                "m": step["message"],
+                "at": k * interval_ms,
+            })
+            previous = step["board"]
+        else:
+            items.append({
+                "board": step["board"],
+                "score": step["score"],
+                "moves_left": moves_left,
+                "message": step["message"],
+                "at": k * interval_ms,
+            })
+    if delta:
+        return json.dumps({"t": DELTA_TYPES["board_steps"], "steps": items, "i": interval_ms},
+                          separators=(",", ":"))
+    return json.dumps({"type": "board_steps", "steps": items, "interval": interval_ms})
+
+
+def encode_move(row1: int, col1: int, row2: int, col2: int, cols: int) -> bytes:
+    """Jogada no formato binário (lado do cliente)"""
+    return MOVE_FRAME.pack(BINARY_MOVE, row1 * cols + col1, row2 * cols + col2)
+
+
+def decode_move(frame: bytes, cols: int) -> Tuple[int, int, int, int]:
+    """Frame binário -> (linha1, coluna1, linha2, coluna2), sem checar limites.
+
+    Levanta ValueError se o frame não for uma jogada.
+    """
+    if len(frame) != MOVE_FRAME.size or frame[0] != BINARY_MOVE:
+        raise ValueError("Frame binário inválido")
+    _, first, second = MOVE_FRAME.unpack(frame)
+    row1, col1 = divmod(first, cols)
+    row2, col2 = divmod(second, cols)
+    return row1, col1, row2, col2
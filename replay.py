@@ -0,0 +1,169 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Sequence
+
+from board import SYMBOLS, process_move, seeded_board, shuffle_board
+from moves import MoveIndex
+
+
+def move_seed(seed: int, player_id: str, n: int) -> str:
+    """Seed das reposições da jogada n (a partir de 0) do jogador"""
+    return f"{seed}:{player_id}:{n}"
+
+
+def shuffle_seed(seed: int, player_id: str, n: int) -> str:
+    """Seed do reembaralhamento depois de n jogadas (0 = tabuleiro inicial)"""
+    return f"{seed}:{player_id}:{n}:shuffle"
+
+
+def settle_board(board: List[List[str]], index: MoveIndex, seed: int, player_id: str,
+                 n: int, symbols: Sequence[str] = SYMBOLS) -> List[List[str]]:
+    """Reembaralha como Game.set_board enquanto o tabuleiro não tiver jogadas.
+
+    index já deve refletir board; continua atualizado para o tabuleiro retornado.
+    """
+    rng = None
+    while not index.has_moves():
+        rng = rng or random.Random(shuffle_seed(seed, player_id, n))
+        board = shuffle_board(board, rng, symbols)
+        index.update(board)
+    return board
+
+
+def replay_game(record: Dict) -> Dict:
+    """Re-simula uma partida do log.
+
+    Retorna o placar recalculado, os tabuleiros finais e os índices das
+    jogadas cujo resultado diverge do registrado (inválidas ou com outra
+    pontuação).
+    """
+    seed = record["seed"]
+    # Logs anteriores às dimensões configuráveis são 6x6 com 4 cores
+    rows, cols = record.get("r", 6), record.get("w", 6)
+    symbols = list(record.get("y", SYMBOLS))
+    boards = {}
+    indexes = {}
+    for player_id, board_seed in record["boards"].items():
+        board = seeded_board(board_seed, rows, cols, symbols)
+        indexes[player_id] = MoveIndex(board)
+        boards[player_id] = settle_board(board, indexes[player_id], seed, player_id, 0, symbols)
+    counts = defaultdict(int)
+    scores = defaultdict(int)
+    mismatches = []
+    for k, (player_id, move, points) in enumerate(record["moves"]):
+        rng = random.Random(move_seed(seed, player_id, counts[player_id]))
+        result = process_move(boards[player_id], move, rng, symbols)
+        if not result["valid"] or result["points"] != points:
+            mismatches.append(k)
+        scores[player_id] += result["points"]
+        counts[player_id] += 1
+        index = indexes[player_id]
+        index.update(result["board"])
+        boards[player_id] = settle_board(result["board"], index, seed, player_id, counts[player_id],
+                                         symbols)
+    return {
+        "id": record["id"],
+        "scores": dict(scores),
+        "boards": boards,
+        "mismatches": mismatches,
+    }
+
+
+def verify_game(record: Dict) -> Dict:
+    """replay_game comparando também o placar final registrado"""
+    result = replay_game(record)
+    result["ok"] = not result["mismatches"] and all(
+        result["scores"].get(player_id, 0) == score for player_id, score in record["scores"].items())
+    del result["boards"]
+    return result
+
+
+class MoveLog:
+    """Log de partidas terminadas, uma linha JSON por partida, gravado em lote numa thread.
+
+        {"id": ..., "seed": ..., "p": 2, "m": 3, "r": 6, "w": 6, "y": "RGYB",
+         "boards": {"player1": <seed do tabuleiro>, ...},
+         "moves": [["player1", "A1 A2", 350], ...],
+         "scores": {"player1": 350, ...}}
+
+    Os tabuleiros iniciais vêm de board.seeded_board e as reposições de cada
+    jogada de um random.Random semeado com move_seed: o seed da partida e a
+    lista de jogadas bastam para replay_game reproduzir tudo.
+    """
+
+    def __init__(self, path: str, interval: float = 1.0):
+        self.path = path
+        self.interval = interval
+        self.pending = []
+        self.writing = False
+        self.timer = None
+
+    def record(self, game, scheduler):
+        self.pending.append(json.dumps(game.move_record(), separators=(",", ":")) + "\n")
+        if self.timer is None:
+            self.timer = scheduler.schedule(self.interval, self.flush, scheduler)
+
+    async def flush(self, scheduler=None):
+        self.timer = None
+        if self.writing:
+            # Um lote ainda está sendo gravado; este fica para a próxima rodada
+            if scheduler is not None:
+                self.timer = scheduler.schedule(self.interval, self.flush, scheduler)
+            return
+        lines, self.pending = self.pending, []
+        if not lines:
+            return
+        self.writing = True
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._append, "".join(lines))
+        except OSError as e:
+            print(f"Erro ao gravar o log de jogadas: {e}")
+        finally:
+            self.writing = False
+
+    def close(self):
+        """Grava o que falta de forma síncrona (encerramento do servidor)"""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.pending:
+            self._append("".join(self.pending))
+            self.pending = []
+
+    def _append(self, text: str):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-simula e verifica partidas do log de jogadas")
+    parser.add_argument("log", help="Arquivo gerado com server.py --move-log")
+    parser.add_argument("--jobs", type=int, default=1, help="Processos para re-simular em paralelo")
+    args = parser.parse_args()
+
+    with open(args.log, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    start = time.perf_counter()
+    if args.jobs > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = list(pool.map(verify_game, records, chunksize=64))
+    else:
+        results = [verify_game(record) for record in records]
+    elapsed = time.perf_counter() - start
+
+    moves = sum(len(record["moves"]) for record in records)
+    failed = [result for result in results if not result["ok"]]
+    for result in failed:
+        print(f"Jogo {result['id']}: divergência nas jogadas {result['mismatches']}, placar {result['scores']}")
+    print(f"{len(records)} partidas, {moves} jogadas em {elapsed:.2f}s "
+          f"({moves / elapsed if elapsed else 0:.0f} jogadas/s); {len(failed)} divergentes")
+
+
+if __name__ == "__main__":
+    main()
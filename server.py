@@ -1,174 +1,774 @@
+import argparse
 import asyncio
 import websockets
 #import pickle
 import sys
 import json
+import random
+import secrets
+import time
 import traceback
-from collections import defaultdict
-from board import generate_board, process_move
+from collections import deque
+from board import (SYMBOLS, BoardPool, cascade_cache, configure_cascade_cache, pack_board,
+                   palette, process_cache, process_move, seeded_board, shuffle_board,
+                   unpack_board)
+from bots import BotPlayer, BotSettings, MoveSearch, is_bot
+from cluster import cancel_on_sigterm, run_cluster
+from events import EventLog, merge_results
+from leaderboard import Leaderboard, parse_leaderboard_path, player_name_from_path
+from metrics import GameMetrics, LoopLagMonitor, Metrics, MetricsServer
+from matchmaking import Matchmaker, QueueKey, queue_key_from_path, resume_token_from_path
+from moves import MoveIndex, format_move, parse_move
+from protocol import MOVE_FORMATS, WIRE_MODES, decode_move, encode_delta, encode_steps
+from replay import MoveLog, move_seed, shuffle_seed
+from snapshots import SnapshotLog
+from spectators import SpectatorChannel, parse_watch_path
+from timers import Scheduler
+from workers import ExecutorBusy, MoveExecutor
+
+# Dicas enviadas por mensagem: tabuleiros grandes têm milhares de trocas válidas
+HINT_LIMIT = 64
+# Maior pausa entre etapas que um cliente pode pedir ({"type": "wire", "pace": s})
+MAX_PACE = 5.0
+
+class Seat:
+    """Estado de um jogador na partida.
+
+    Um objeto com __slots__ por jogador, em vez de uma entrada em cada
+    dicionário do jogo. O tabuleiro fica empacotado (pack_board) e só vira
+    listas para ser processado ou enviado.
+    """
+
+    __slots__ = ("id", "websocket", "token", "board_seed", "board", "index", "sent",
+                 "score", "moves", "ready", "delta", "batched", "pace", "outbox", "strikes",
+                 "timer", "name")
+
+    def __init__(self, player_id, websocket=None, token=None, board_seed=None, name=None):
+        self.id = player_id
+        # None enquanto o jogador está ausente (ou depois que saiu)
+        self.websocket = websocket
+        self.token = token
+        # Nome na classificação (?name=); None para anônimos e bots
+        self.name = name
+        self.board_seed = board_seed
+        self.board = None
+        self.index = None
+        # Último tabuleiro enviado, só no modo delta (base das diferenças)
+        self.sent = None
+        self.score = 0
+        self.moves = 0
+        self.ready = False
+        # Modo de envio pedido pelo cliente; batched: anima sozinho "board_steps"
+        self.delta = False
+        self.batched = False
+        # Pausa entre as etapas enviadas uma a uma (None: a do jogo) e a fila
+        # de mensagens que esperam as etapas ainda em ritmo (None quando vazia)
+        self.pace = None
+        self.outbox = None
+        # Envios seguidos descartados por lentidão
+        self.strikes = 0
+        # Prazo de retomada enquanto ausente (None nos restaurados de snapshot)
+        self.timer = None
+
+    def info(self):
+        """Dados do jogador emendados nas mensagens de broadcast"""
+        return {"id": self.id, "score": self.score, "ready": self.ready}
+
 
 class Game:
-    def __init__(self):
+    __slots__ = ("players", "seats", "away", "step_delay", "animation_interval", "max_moves",
+                 "rows", "cols", "symbols", "capacity", "full", "game_id", "seed", "history",
+                 "move_log", "started_at", "game_started", "executor", "timers", "deadline",
+                 "finished", "spectators", "grace_period", "snapshot_log", "on_close", "metrics",
+                 "event_log", "leaderboard")
+
+    # Limites iguais para todos os jogos
+    inactivity_timeout = 6000  # 6000 segundos de inatividade
+    move_timeout = 300
+    # Envios a um cliente com mais de max_send_buffer bytes parados no buffer
+    # de escrita são pulados; depois de max_slow_strikes seguidos, ou de um
+    # envio que passa de send_timeout, a conexão é fechada
+    send_timeout = 2.0
+    max_send_buffer = 256 * 1024
+    max_slow_strikes = 3
+
+    def __init__(self, executor=None, step_delay=1.0, animation_interval=1.0,
+                 capacity=2, max_moves=3, scheduler=None, grace_period=30.0,
+                 snapshot_log=None, on_close=None, move_log=None, metrics=None,
+                 rows=6, cols=6, symbols=SYMBOLS, event_log=None, leaderboard=None):
+        # Conexão -> Seat dos jogadores conectados; seats guarda por player_id
+        # todos os que sentaram (inclusive ausentes e quem saiu com o jogo em curso)
         self.players = {}
-        self.boards = {}
-        self.scores = defaultdict(int)
-        self.moves_count = defaultdict(int)
-        self.max_moves = 3  # Número reduzido de movimentos para teste
-        self.game_id = id(self)
+        self.seats = {}
+        # Quem pede batch anima sozinho no intervalo de animação; os outros
+        # recebem uma etapa a cada step_delay segundos (o jogador pode pedir
+        # outro ritmo). 0 manda as etapas de uma vez
+        self.step_delay = step_delay
+        self.animation_interval = animation_interval
+        self.max_moves = max_moves
+        # Dimensões e cores do tabuleiro da partida (iguais para todos)
+        self.rows = rows
+        self.cols = cols
+        self.symbols = list(symbols)
+        # Jogadores por partida; full é resolvido quando o último entra (um
+        # Future custa bem menos que um asyncio.Event e sua fila de espera)
+        self.capacity = capacity
+        self.full = asyncio.get_event_loop().create_future()
+        # Único entre reinícios (jogos restaurados mantêm o id do snapshot)
+        self.game_id = secrets.randbits(52)
+        # Semente das reposições: cada jogada usa um random.Random derivado
+        # de (seed, jogador, nº da jogada), então o snapshot só precisa dela
+        self.seed = secrets.randbits(64)
+        # Jogadas válidas (jogador, jogada, pontos): com self.seed e o seed do
+        # tabuleiro de cada Seat reproduzem a partida
+        self.history = []
+        self.move_log = move_log
+        self.started_at = None
         self.game_started = False
-        self.last_move_time = {}
-        self.inactivity_timeout = 6000  # 6000 segundos de inatividade
-        self.move_timeout = 300
-        self.health_check_task = asyncio.create_task(self.run_health_checks())
-
-    async def check_inactivity(self, websocket):
-        """Desconecta jogador inativo se exceder o tempo limite"""
-        while True:
-            await asyncio.sleep(600)  # Verifica a cada 10 minutos
-            if websocket in self.players:
-                elapsed = asyncio.get_event_loop().time() - self.last_move_time[websocket]
-                if elapsed > self.inactivity_timeout:
-                    player_id = self.players[websocket]["id"]
-                    print(f"Jogador {player_id} desconectado por inatividade")
-                    
-                    # Marca como completado se desconectar sem jogar
-                    if player_id not in self.moves_count:
-                        self.moves_count[player_id] = 0
-                    
-                    await websocket.close()
-                    break
-    
-    async def run_health_checks(self):
-        """Verifica periodicamente se o jogo está travado"""
-        while True:
-            await asyncio.sleep(10)
-            if self.game_started:
-                all_idle = all(
-                    self.moves_count.get(p["id"], 0) >= self.max_moves
-                    for p in self.players.values()
-                )
-                if all_idle:
-                    await self.check_game_completion()
+        # Executor opcional para rodar process_move fora do loop
+        self.executor = executor
+        # Prazos (inatividade e fim de jogo) ficam no agendador compartilhado
+        self.timers = scheduler if scheduler is not None else Scheduler()
+        self.deadline = None
+        self.finished = False
+        # Observadores (espectadores, placar ao vivo) só leem o estado mais
+        # recente; o canal só é criado quando o primeiro aparece
+        self.spectators = None
+        # Retomada: quem caiu e ainda pode voltar (player_id -> Seat) dentro
+        # de grace_period segundos
+        self.away = {}
+        self.grace_period = grace_period
+        self.snapshot_log = snapshot_log
+        # Chamado quando não resta ninguém (conectado ou ausente) no jogo
+        self.on_close = on_close
+        # GameMetrics compartilhado do processo, ou None (métricas desligadas)
+        self.metrics = metrics
+        # Fluxo de eventos (events.EventLog) e classificação do processo; o
+        # resultado final vai para os dois
+        self.event_log = event_log
+        self.leaderboard = leaderboard
+
+    def scores(self):
+        """Placar de todos os jogadores que sentaram"""
+        return {player_id: seat.score for player_id, seat in self.seats.items()}
+
+    def moves_count(self):
+        return {player_id: seat.moves for player_id, seat in self.seats.items()}
+
+    def names(self):
+        """Nomes na classificação dos jogadores que entraram com ?name="""
+        return {player_id: seat.name for player_id, seat in self.seats.items() if seat.name}
+
+    def board(self, seat):
+        """Tabuleiro atual do jogador em listas"""
+        return unpack_board(seat.board, self.cols)
+
+    def spectator_channel(self):
+        """Canal dos observadores, criado na primeira inscrição"""
+        if self.spectators is None:
+            self.spectators = SpectatorChannel()
+            if self.finished:
+                self.spectators.close()
+        return self.spectators
+
+    async def close_inactive(self, websocket):
+        """Desconecta jogador que ficou inativo além do tempo limite"""
+        seat = self.players.get(websocket)
+        if seat is not None:
+            print(f"Jogador {seat.id} desconectado por inatividade")
+            await websocket.close()
+
+    async def start(self):
+        """Inicia a partida e arma o prazo para todos completarem as jogadas"""
+        for seat in self.players.values():
+            seat.ready = True
+        self.game_started = True
+        self.started_at = time.time()
+        if self.metrics is not None:
+            self.metrics.games_started.inc()
+        self.deadline = self.timers.schedule(self.move_timeout, self.check_move_timeout)
+        self.save()
+        if self.event_log is not None:
+            self.event_log.append({"e": "start", "g": self.game_id, "t": self.started_at,
+                                   "p": list(self.seats), "n": self.names()}, self.timers)
+        await self.broadcast("game_start")
     
     async def check_move_timeout(self):
         """Encerra o jogo se algum jogador não completar no tempo"""
-        await asyncio.sleep(self.move_timeout)
-        if not await self.check_game_completion():
+        if not await self.check_game_completion() and not self.finished and self.seats:
             # Força término do jogo com o jogador com maior pontuação
-            if self.scores:
-                winner = max(self.scores.items(), key=lambda x: x[1])
-                await self.broadcast("game_over", {
-                    "winner": winner[0],
-                    "scores": dict(self.scores),
-                    "message": "Tempo esgotado!"
-                })
+            scores = self.scores()
+            winner = max(scores.items(), key=lambda x: x[1])
+            self.finish(winner[0])
+            await self.broadcast("game_over", {
+                "winner": winner[0],
+                "scores": scores,
+                "message": "Tempo esgotado!"
+            })
+
+    def finish(self, winner=None):
+        """Marca o fim da partida, cancela os prazos pendentes e registra o resultado"""
+        self.finished = True
+        if self.metrics is not None:
+            self.metrics.games_finished.inc()
+        if self.deadline:
+            self.deadline.cancel()
+        for seat in self.away.values():
+            if seat.timer is not None:
+                seat.timer.cancel()
+                seat.timer = None
+        self.away.clear()
+        if self.snapshot_log is not None:
+            self.snapshot_log.remove(self.game_id, self.timers)
+        if self.move_log is not None and self.game_started:
+            self.move_log.record(self, self.timers)
+        if self.game_started and (self.event_log is not None or self.leaderboard is not None):
+            result = {"e": "end", "g": self.game_id, "t": time.time(), "w": winner,
+                      "s": self.scores(), "n": self.names()}
+            if self.event_log is not None:
+                self.event_log.append(result, self.timers)
+            if self.leaderboard is not None:
+                self.leaderboard.record(result)
+
+    def move_record(self):
+        """Linha do log de jogadas (formato em replay.MoveLog)"""
+        return {
+            "id": self.game_id,
+            "seed": self.seed,
+            "p": self.capacity,
+            "m": self.max_moves,
+            "r": self.rows,
+            "w": self.cols,
+            "y": "".join(self.symbols),
+            "boards": {player_id: seat.board_seed for player_id, seat in self.seats.items()},
+            "moves": self.history,
+            "scores": self.scores(),
+        }
+
+    def save(self):
+        """Agenda um snapshot do jogo (gravado em lote pelo SnapshotLog)"""
+        if self.snapshot_log is not None and self.game_started and not self.finished:
+            self.snapshot_log.mark(self, self.timers)
+
+    def snapshot(self):
+        """Estado compacto para o log: tabuleiros, placar, jogadas, tokens e semente"""
+        seats = self.seats
+        return {
+            "id": self.game_id,
+            "p": self.capacity,
+            "m": self.max_moves,
+            "seed": self.seed,
+            "t": self.started_at,
+            "r": self.rows,
+            "w": self.cols,
+            "y": "".join(self.symbols),
+            "b": {player_id: seat.board for player_id, seat in seats.items()},
+            "s": self.scores(),
+            "c": self.moves_count(),
+            "k": {player_id: seat.token for player_id, seat in seats.items()},
+            "bs": {player_id: seat.board_seed for player_id, seat in seats.items()},
+            "h": self.history,
+            "n": self.names(),
+        }
+
+    def restore(self, record):
+        """Recria o jogo a partir de um snapshot; todos voltam como ausentes.
+
+        Os ausentes restaurados não têm prazo próprio (timer None): o
+        GameManager expira todos de uma vez com expire_restored. O índice de
+        jogadas de cada um só é montado quando ele volta.
+        """
+        self.game_id = record["id"]
+        self.seed = record["seed"]
+        self.started_at = record["t"]
+        self.cols = record["w"]
+        self.rows = record.get("r", 6)
+        self.symbols = list(record.get("y", SYMBOLS))
+        scores, counts, board_seeds = record["s"], record["c"], record.get("bs", {})
+        names = record.get("n", {})
+        for player_id, token in record["k"].items():
+            seat = Seat(player_id, token=token, board_seed=board_seeds.get(player_id),
+                        name=names.get(player_id))
+            # Snapshots guardam o tabuleiro já empacotado
+            seat.board = record["b"][player_id]
+            seat.score = scores.get(player_id, 0)
+            seat.moves = counts.get(player_id, 0)
+            seat.ready = True
+            self.seats[player_id] = seat
+            self.away[player_id] = seat
+        self.history = record.get("h", [])
+        self.game_started = True
+        self.full.set_result(True)
+        remaining = self.move_timeout - (time.time() - self.started_at)
+        self.deadline = self.timers.schedule(max(remaining, 0), self.check_move_timeout)
+
+    def expire_restored(self):
+        """Fim do prazo de retomada após um reinício"""
+        for player_id, seat in list(self.away.items()):
+            if seat.timer is None:
+                self.abandon(player_id)
+
+    def move_rng(self, seat):
+        """Semente das reposições da próxima jogada do jogador"""
+        return move_seed(self.seed, seat.id, seat.moves)
+
+
+    def next_player_id(self):
+        """Primeiro identificador livre (quem saiu antes do início libera o seu)"""
+        taken = {seat.id for seat in self.players.values()}
+        n = 1
+        while f"player{n}" in taken:
+            n += 1
+        # Os mesmos poucos ids em todos os jogos: uma única string para cada
+        return sys.intern(f"player{n}")
+
+    def add_player(self, websocket, token, board_seed, board, name=None):
+        """Senta uma nova conexão com o primeiro identificador livre"""
+        seat = Seat(self.next_player_id(), websocket, token, board_seed, name)
+        self.players[websocket] = seat
+        self.seats[seat.id] = seat
+        self.set_board(seat, board)
+        return seat
+
+    def set_board(self, seat, board):
+        """Guarda o tabuleiro do jogador e atualiza o índice de jogadas.
 
+        Retorna True se o tabuleiro ficou sem jogadas e foi reembaralhado.
+        """
+        index = seat.index
+        if index is None:
+            index = seat.index = MoveIndex(board)
+        else:
+            index.update(board)
+        reshuffled = False
+        rng = None
+        while not index.has_moves():
+            # Mesmo sorteio de replay.settle_board
+            rng = rng or random.Random(shuffle_seed(self.seed, seat.id, seat.moves))
+            board = shuffle_board(board, rng, self.symbols)
+            index.update(board)
+            reshuffled = True
+        seat.board = pack_board(board)
+        return reshuffled
+
+    async def send_board(self, seat, message_type, board, score, moves_left, message,
+                         hints=None, pause=0.0):
+        """Envia um tabuleiro ao jogador, completo ou só as células alteradas"""
+        if seat.websocket is None:
+            # Caiu no meio da jogada: a jogada vale, o envio não
+            return
+        if seat.delta:
+            payload = encode_delta(message_type, unpack_board(seat.sent, self.cols), board,
+                                   score, moves_left, message, hints)
+            seat.sent = pack_board(board)
+            self.publish_board(seat.id, message_type, board, score, moves_left, message)
+        else:
+            data = {
+                "type": message_type,
+                "board": board,
+                "score": score,
+                "moves_left": moves_left,
+                "message": message
+            }
+            if hints is not None:
+                data["hints"] = hints
+            payload = json.dumps(data)
+            # As dicas são só do jogador: com elas, os observadores recebem um JSON próprio
+            self.publish_board(seat.id, message_type, board, score, moves_left, message,
+                               payload if hints is None else None)
+        await self.deliver(seat, payload, pause)
+
+    async def deliver(self, seat, payload, pause=0.0):
+        """Envia ao jogador sem passar na frente das etapas ainda em ritmo.
+
+        Com pausa (ou com a fila do jogador ainda cheia) a mensagem entra em
+        seat.outbox, que o agendador compartilhado esvazia: handle_move segue
+        sem esperar a animação de quem não anima sozinho.
+        """
+        if seat.outbox is None and not pause:
+            await self.send_timed(seat.websocket, payload)
+            return
+        if seat.outbox is None:
+            seat.outbox = deque()
+            self.timers.schedule(0, self.drain, seat, seat.outbox)
+        seat.outbox.append((payload, pause))
+
+    async def drain(self, seat, outbox):
+        """Envia a fila do jogador até a próxima pausa e agenda o resto"""
+        while outbox and seat.outbox is outbox:
+            payload, pause = outbox.popleft()
+            await self.send_to(seat, payload)
+            if pause and seat.outbox is outbox:
+                self.timers.schedule(pause, self.drain, seat, outbox)
+                return
+        if seat.outbox is outbox:
+            seat.outbox = None
+
+    def publish_board(self, player_id, message_type, board, score, moves_left, message,
+                      payload=None):
+        """Repassa o tabuleiro aos observadores, reaproveitando o JSON do jogador"""
+        if self.spectators is None or not self.spectators.subscribers:
+            return
+        if payload is None:
+            payload = json.dumps({
+                "type": message_type,
+                "board": board,
+                "score": score,
+                "moves_left": moves_left,
+                "message": message
+            })
+        self.spectators.publish(("board", player_id),
+                                payload[:-1] + ', "player_id": ' + json.dumps(player_id) + "}")
+
+    def publish_scores(self):
+        """Placar ao vivo para os observadores"""
+        if self.spectators is None or not self.spectators.subscribers:
+            return
+        self.spectators.publish("scores", json.dumps({
+            "type": "scoreboard",
+            "game_id": self.game_id,
+            "scores": self.scores(),
+            "moves": self.moves_count()
+        }))
+
+    def spectator_snapshot(self):
+        """Estado completo enviado a quem começa a observar o jogo"""
+        return json.dumps({
+            "type": "spectate",
+            "game_id": self.game_id,
+            "players": [seat.id for seat in self.players.values()],
+            "boards": {player_id: self.board(seat) for player_id, seat in self.seats.items()},
+            "scores": self.scores(),
+            "moves": self.moves_count(),
+            "max_moves": self.max_moves,
+            "started": self.game_started,
+            "finished": self.finished
+        })
+
+    async def send_steps(self, seat, steps, base_score, moves_left):
+        """Envia as etapas da jogada: todas de uma vez ou uma a uma.
+
+        Clientes sem batch mostram cada etapa assim que ela chega: o ritmo
+        delas fica na fila do jogador (deliver), fora de handle_move.
+        """
+        if seat.websocket is None:
+            return
+        if seat.batched:
+            items = [{
+                "board": step["board"],
+                "score": base_score + step["points"],
+                "message": step["message"]
+            } for step in steps]
+            previous = unpack_board(seat.sent, self.cols) if seat.delta else None
+            payload = encode_steps(previous, items, moves_left, self.animation_interval, seat.delta)
+            if seat.delta:
+                seat.sent = pack_board(steps[-1]["board"])
+            last = items[-1]
+            self.publish_board(seat.id, "board_update", last["board"], last["score"],
+                               moves_left, last["message"])
+            await self.send_timed(seat.websocket, payload)
+            return
+        pause = self.step_delay if seat.pace is None else seat.pace
+        for step in steps:
+            await self.send_board(seat, "board_update", step["board"],
+                                  base_score + step["points"], moves_left, step["message"],
+                                  pause=pause)
+
+    async def send_timed(self, websocket, payload):
+        """websocket.send, medindo o tempo de envio quando há métricas"""
+        if self.metrics is None:
+            await websocket.send(payload)
+            return
+        start = time.perf_counter()
+        await websocket.send(payload)
+        self.metrics.send_seconds.observe(time.perf_counter() - start)
+
+    def set_wire_mode(self, websocket, options):
+        """Modo de envio pedido pelo cliente depois do init"""
+        seat = self.players.get(websocket)
+        if seat is None:
+            return
+        if options.get("mode") in WIRE_MODES:
+            # Entre jogadas, o último tabuleiro enviado é o atual
+            seat.delta = options["mode"] == "delta"
+            seat.sent = seat.board if seat.delta else None
+        if options.get("batch"):
+            seat.batched = True
+        pace = options.get("pace")
+        if isinstance(pace, (int, float)) and not isinstance(pace, bool):
+            # Ritmo próprio para as etapas enviadas uma a uma (0: sem pausa)
+            seat.pace = min(max(float(pace), 0.0), MAX_PACE)
 
     async def broadcast(self, message_type, data=None, exclude=None):
+        """Envia a mensagem a todos os jogadores ao mesmo tempo.
+
+        A parte comum é serializada uma vez; os dados de cada jogador são
+        emendados no fim do JSON. Chaves repetidas valem pela última ocorrência
+        (JSON.parse e json.loads), igual ao dict mesclado de antes.
+        """
         data = data or {}
-        for ws, player_info in list(self.players.items()):
+        shared = json.dumps({"type": message_type, "game_id": self.game_id, **data})
+        if self.spectators is not None:
+            self.spectators.publish(("event", message_type), shared)
+            if self.finished:
+                self.spectators.close()
+        prefix = shared[:-1] + ", "
+        sends = []
+        for ws, seat in list(self.players.items()):
             if exclude and ws == exclude:
                 continue
-            try:
-                message = {
-                    "type": message_type,
-                    "game_id": self.game_id,
-                    **data,
-                    **player_info
-                }
-                await ws.send(json.dumps(message))
-            except (websockets.exceptions.ConnectionClosed, ConnectionResetError) as e:
-                print(f"Erro ao enviar mensagem: {e}")
-                self.handle_disconnect(ws)
-            except Exception as e:
-                print(f"Erro inesperado: {traceback.format_exc()}")
+            payload = prefix + json.dumps(seat.info())[1:]
+            if seat.outbox is not None:
+                # Ainda há etapas em ritmo: a mensagem chega depois delas
+                seat.outbox.append((payload, 0.0))
+            else:
+                sends.append(self.send_to(seat, payload))
+        await asyncio.gather(*sends)
+
+    async def send_to(self, seat, payload):
+        """Envia sem deixar um cliente lento travar os outros.
+
+        Com o buffer de escrita da conexão acima de max_send_buffer a
+        mensagem é pulada antes de ser escrita. Um envio que passa de
+        send_timeout já está no buffer e não tem como ser desfeito: a conexão
+        é fechada.
+        """
+        ws = seat.websocket
+        transport = getattr(ws, "transport", None)
+        if transport is not None and transport.get_write_buffer_size() > self.max_send_buffer:
+            if self.metrics is not None:
+                self.metrics.slow_skips.inc()
+            seat.strikes += 1
+            print(f"Cliente lento ({seat.strikes}x), mensagem pulada")
+            if seat.strikes >= self.max_slow_strikes:
+                self.close_slow(ws)
+            return
+        try:
+            await asyncio.wait_for(self.send_timed(ws, payload), self.send_timeout)
+            seat.strikes = 0
+        except asyncio.TimeoutError:
+            print("Cliente lento: envio passou do prazo")
+            self.close_slow(ws)
+        except (websockets.exceptions.ConnectionClosed, ConnectionResetError) as e:
+            print(f"Erro ao enviar mensagem: {e}")
+            self.handle_disconnect(ws)
+        except Exception as e:
+            print(f"Erro inesperado: {traceback.format_exc()}")
+
+    def close_slow(self, websocket):
+        """Fecha a conexão de um cliente lento; a saída segue pelo handle_disconnect"""
+        if self.metrics is not None:
+            self.metrics.slow_closes.inc()
+        asyncio.ensure_future(websocket.close())
 
     def handle_disconnect(self, websocket):
         """Remove jogador desconectado"""
-        if websocket in self.players:
-            player_id = self.players[websocket]["id"]
-            print(f"{player_id} desconectou")
-            
-            # Marca como tendo "desistido" (0 movimentos)
-            if player_id not in self.moves_count:
-                self.moves_count[player_id] = 0
-            
-            del self.players[websocket]
-            del self.last_move_time[websocket]
-            
-            if len(self.players) == 1:
-                remaining_player = next(iter(self.players.values()))["id"]
-                asyncio.create_task(self.broadcast("game_over", {
-                    "winner": remaining_player,
-                    "scores": {remaining_player: self.scores.get(remaining_player, 0)}
-                }))
-            else:
-                asyncio.create_task(self.check_game_completion())
+        seat = self.players.pop(websocket, None)
+        if seat is None:
+            return
+        print(f"{seat.id} desconectou")
+        # O modo de envio vale por conexão: quem volta recomeça no completo
+        seat.websocket = None
+        seat.sent = None
+        seat.delta = seat.batched = False
+        seat.pace = seat.outbox = None
+        seat.strikes = 0
+        if self.executor:
+            self.executor.forget((self.game_id, seat.id))
+
+        if not self.game_started:
+            # Saiu da fila: o identificador fica livre para o próximo
+            if self.seats.get(seat.id) is seat:
+                del self.seats[seat.id]
+            return
+        # Queda durante a partida: guarda o lugar até o prazo de retomada
+        if not self.finished and self.grace_period:
+            seat.timer = self.timers.schedule(self.grace_period, self.abandon, seat.id)
+            self.away[seat.id] = seat
+            asyncio.create_task(self.broadcast("player_away", {
+                "player": seat.id,
+                "grace": self.grace_period
+            }))
+            return
+        self.player_gone()
+
+    def abandon(self, player_id):
+        """Prazo de retomada esgotado: o jogador sai de vez"""
+        seat = self.away.pop(player_id, None)
+        if seat is None:
+            return
+        seat.timer = None
+        print(f"{player_id} não voltou a tempo")
+        self.player_gone()
+        if not self.players and not self.away and self.on_close:
+            self.on_close(self)
+
+    def player_gone(self):
+        """Um jogador saiu de vez: encerra a partida se só restar um"""
+        if not self.game_started:
+            return
+        if len(self.players) == 1 and not self.away:
+            if self.finished:
+                return
+            remaining = next(iter(self.players.values()))
+            self.finish(remaining.id)
+            asyncio.create_task(self.broadcast("game_over", {
+                "winner": remaining.id,
+                "scores": {remaining.id: remaining.score}
+            }))
+        else:
+            asyncio.create_task(self.check_game_completion())
+
+    def resume(self, websocket, token):
+        """Reassocia uma conexão ao lugar do token; retorna o Seat ou None"""
+        if self.finished:
+            return None
+        seat = next((s for s in self.seats.values() if s.token == token), None)
+        if seat is None:
+            return None
+        # A conexão antiga pode ainda não ter sido dada como caída
+        old = seat.websocket
+        if old is not None:
+            self.handle_disconnect(old)
+            asyncio.ensure_future(old.close())
+        if self.away.pop(seat.id, None) is None:
+            return None
+        if seat.timer is not None:
+            seat.timer.cancel()
+            seat.timer = None
+        seat.websocket = websocket
+        self.players[websocket] = seat
+        if seat.index is None:
+            # Jogo restaurado de um snapshot
+            self.set_board(seat, self.board(seat))
+        print(f"{seat.id} retomou a partida")
+        asyncio.create_task(self.broadcast("player_back", {"player": seat.id}, exclude=websocket))
+        return seat
+
+    def read_move(self, move):
+        """Única leitura da jogada: frame binário ou texto "A1 B2" ->
+        (linha1, coluna1, linha2, coluna2), ou None se mal formada
+        """
+        try:
+            if isinstance(move, bytes):
+                return decode_move(move, self.cols)
+            if isinstance(move, str):
+                return parse_move(move)
+        except ValueError:
+            pass
+        return None
 
-    async def handle_move(self, websocket, move_data):
-        """Processa movimento válido"""
+    async def handle_move(self, websocket, move):
+        """Processa movimento válido; move vem de read_move"""
+        metrics = self.metrics
+        if metrics is not None:
+            received = time.perf_counter()
         if not self.game_started:
+            if metrics is not None:
+                metrics.move_errors["not_started"].inc()
             await websocket.send(json.dumps({
                 "type": "move_error",
                 "message": "O jogo ainda não começou"
             }))
             return False
-        player_id = self.players[websocket]["id"]
-        self.last_move_time[websocket] = asyncio.get_event_loop().time()
+        seat = self.players[websocket]
+
+        if move is None:
+            if metrics is not None:
+                metrics.move_errors["format"].inc()
+            await websocket.send(json.dumps({
+                "type": "move_error",
+                "message": "Formato de movimento inválido"
+            }))
+            return False
 
         # Validação básica do movimento
         try:
-            parts = move_data["move"].split()
-            if len(parts) != 2:
-                raise ValueError("Formato inválido")
-            
-            # Extrai coordenadas
-            coord1, coord2 = parts
-            row1 = ord(coord1[0].upper()) - ord('A')
-            col1 = int(coord1[1]) - 1
-            row2 = ord(coord2[0].upper()) - ord('A')
-            col2 = int(coord2[1]) - 1
+            row1, col1, row2, col2 = move
 
             # Verificação de limites
-            if not all(0 <= x < 6 for x in [row1, col1, row2, col2]):
+            rows, cols = self.rows, self.cols
+            if not (0 <= row1 < rows and 0 <= row2 < rows and 0 <= col1 < cols and 0 <= col2 < cols):
+                if metrics is not None:
+                    metrics.move_errors["bounds"].inc()
                 await websocket.send(json.dumps({
                     "type": "move_error",
                     "message": "Coordenadas fora dos limites do tabuleiro!"
                 }))
                 return False
-            result = process_move(self.boards[player_id], move_data["move"])
-        
-            if result["valid"]:
-                # Envia cada etapa para o cliente
-                for step in result["steps"]:
+
+            # Trocas entre vizinhos são respondidas pelo índice, sem simular
+            adjacent = abs(row1 - row2) + abs(col1 - col2) == 1
+            if adjacent and not seat.index.is_valid(row1, col1, row2, col2):
+                if metrics is not None:
+                    metrics.move_errors["no_match"].inc()
+                await websocket.send(json.dumps({
+                    "type": "move_error",
+                    "message": "Nenhuma combinação formada"
+                }))
+                return False
+            if metrics is not None:
+                computing = time.perf_counter()
+            board = self.board(seat)
+            if self.executor:
+                try:
+                    result = await self.executor.process_move(
+                        (self.game_id, seat.id), board, move, self.move_rng(seat), self.symbols)
+                except ExecutorBusy:
+                    if metrics is not None:
+                        metrics.move_errors["busy"].inc()
                     await websocket.send(json.dumps({
-                        "type": "board_update",
-                        "board": step["board"],
-                        "score": self.scores[player_id] + step["points"],
-                        "moves_left": self.max_moves - self.moves_count[player_id],
-                        "message": step["message"]
+                        "type": "move_error",
+                        "message": "Servidor ocupado, tente novamente"
                     }))
-                    await asyncio.sleep(1.0)
-                
+                    return False
+            else:
+                result = process_move(board, move, random.Random(self.move_rng(seat)), self.symbols,
+                                      process_cache())
+            if metrics is not None:
+                metrics.compute_seconds.observe(time.perf_counter() - computing)
+                if not result["valid"]:
+                    metrics.move_errors["no_match"].inc()
+        
+            if result["valid"]:
+                # Envia as etapas para o cliente
+                moves_left = self.max_moves - seat.moves
+                await self.send_steps(seat, result["steps"], seat.score, moves_left)
                 
-                self.boards[player_id] = result["board"]
-                self.scores[player_id] += result["points"]
-                self.moves_count[player_id] += 1
+                seat.score += result["points"]
+                seat.moves += 1
+                move_text = format_move((row1, col1), (row2, col2))
+                self.history.append((seat.id, move_text, result["points"]))
+                # Cada rodada de combinação gera duas etapas
+                depth = len(result["steps"]) // 2
+                if self.event_log is not None:
+                    self.event_log.append({"e": "move", "g": self.game_id, "p": seat.id,
+                                           "m": move_text, "pts": result["points"], "d": depth},
+                                          self.timers)
+                moves_left = self.max_moves - seat.moves
+                board = result["board"]
+                if self.set_board(seat, board):
+                    board = self.board(seat)
+                    await self.send_board(seat, "board_update", board, seat.score, moves_left,
+                                          "Sem jogadas possíveis! Embaralhando...")
                 
-                final_message = {
-                    "type": "turn_complete",
-                    "board": self.boards[player_id],
-                    "score": self.scores[player_id],
-                    "moves_left": self.max_moves - self.moves_count[player_id],
-                    "message": "Turno completo!" if self.moves_count[player_id] >= self.max_moves 
-                            else "Movimento concluído!"
-                }
-                await websocket.send(json.dumps(final_message))
+                await self.send_board(
+                    seat, "turn_complete", board, seat.score, moves_left,
+                    "Turno completo!" if moves_left <= 0 else "Movimento concluído!",
+                    seat.index.hints(HINT_LIMIT))
+                self.publish_scores()
+                self.save()
+                if metrics is not None:
+                    metrics.moves.inc()
+                    metrics.cascade_depth.observe(depth)
+                    metrics.move_seconds.observe(time.perf_counter() - received)
                 
                 await self.check_game_completion()
     
         except Exception as e:
             print(f"Erro ao processar movimento: {traceback.format_exc()}")
+            if metrics is not None:
+                metrics.move_errors["error"].inc()
             await websocket.send(json.dumps({
                 "type": "move_error",
                 "message": "Erro no processamento do movimento"
@@ -176,108 +776,514 @@ class Game:
     
     async def check_game_completion(self):
         """Verifica se o jogo deve terminar"""
-        if len(self.players) < 2:
+        if self.finished:
+            return True
+        # Quem caiu e ainda pode voltar continua contando
+        seated = list(self.players.values()) + list(self.away.values())
+        if len(seated) < 2:
             return False
             
         # Verifica se todos os jogadores completaram seus movimentos
-        all_completed = all(self.moves_count.get(p["id"], 0) >= self.max_moves 
-                        for p in self.players.values())
-        
-        if all_completed:
-            try:
-                if not self.scores:  # Caso não haja pontuações registradas
-                    self.scores = {p["id"]: 0 for p in self.players.values()}
-                
-                winner = max(self.scores.items(), key=lambda x: x[1])
-                await self.broadcast("game_over", {
-                    "winner": winner[0],
-                    "scores": dict(self.scores)
-                })
-                return True
-            except ValueError:
-                print("Erro ao determinar vencedor - scores vazios")
-                return False
+        if all(seat.moves >= self.max_moves for seat in seated):
+            scores = self.scores()
+            winner = max(scores.items(), key=lambda x: x[1])
+            self.finish(winner[0])
+            await self.broadcast("game_over", {
+                "winner": winner[0],
+                "scores": scores
+            })
+            return True
         return False
 
 class GameManager:
-    def __init__(self):
-        self.waiting_game = None
+    def __init__(self, pool_size=0, executor=None, step_delay=1.0, grace_period=30.0,
+                 snapshot_path=None, move_log_path=None, metrics=None, bot_settings=None,
+                 events_path=None):
+        self.matchmaker = Matchmaker(self.create_game)
+        self.timers = Scheduler()
+        self.step_delay = step_delay
+        # Estoque opcional de tabuleiros pré-gerados (0 desliga)
+        self.board_pool = BoardPool(pool_size) if pool_size else None
+        self.refilling = False
+        self.executor = executor
+        # Jogos em andamento por game_id, para os observadores
+        self.games = {}
+        # BrokerClient no modo multiprocesso: decide qual worker é dono do jogo
+        self.router = None
+        # Retomada de sessão: token -> jogo (ou snapshot ainda não recriado)
+        self.sessions = {}
+        self.grace_period = grace_period
+        self.snapshot_log = SnapshotLog(snapshot_path) if snapshot_path else None
+        self.move_log = MoveLog(move_log_path) if move_log_path else None
+        # Eventos das partidas (só com arquivo) e a classificação, refeita a
+        # partir deles no início (load_leaderboard). No modo multiprocesso
+        # history_paths traz os logs de todos os workers e os fins de partida
+        # (results) passam pelo broker antes de chegar à classificação
+        self.event_log = EventLog(events_path) if events_path else None
+        self.history_paths = [events_path] if events_path else []
+        self.leaderboard = Leaderboard()
+        self.results = self.leaderboard
+        # Bots que completam jogos (ver bots.py); a busca é compartilhada por todos
+        self.bot_settings = bot_settings or BotSettings()
+        self.bot_search = MoveSearch(self.bot_settings.strength, self.bot_settings.budget)
+        self.metrics = GameMetrics(metrics) if metrics is not None else None
+        if self.metrics is not None:
+            self.watch_metrics()
+
+    def watch_metrics(self):
+        """Gauges calculados só quando as métricas são coletadas"""
+        watch = self.metrics.watch
+        watch("blockshuffle_games_active", "Jogos em andamento neste processo", lambda: len(self.games))
+        watch("blockshuffle_players_away", "Jogadores aguardando retomada",
+              lambda: sum(len(game.away) for game in self.games.values()))
+        watch("blockshuffle_spectators", "Observadores conectados",
+              lambda: sum(game.spectators.subscribers for game in self.games.values()
+                          if game.spectators is not None))
+        watch("blockshuffle_leaderboard_players", "Jogadores com nome na classificação",
+              lambda: len(self.leaderboard.players))
+        watch("blockshuffle_bots", "Bots sentados em jogos",
+              lambda: sum(is_bot(ws) for game in self.games.values() for ws in game.players))
+        watch("blockshuffle_cascade_cache_hits", "Primeiras rodadas servidas pelo cache (inline)",
+              lambda: cascade_cache.hits)
+        watch("blockshuffle_cascade_cache_misses", "Primeiras rodadas calculadas (inline)",
+              lambda: cascade_cache.misses)
+        watch("blockshuffle_cascade_cache_evictions", "Entradas descartadas do cache de cascatas",
+              lambda: cascade_cache.evictions)
+        watch("blockshuffle_cascade_cache_cells", "Células guardadas no cache de cascatas",
+              lambda: cascade_cache.cells)
+        watch("blockshuffle_timers", "Entradas no heap do agendador (inclui canceladas)", lambda: len(self.timers))
+        matchmaker = self.matchmaker
+        watch("blockshuffle_matchmaking_queues", "Modalidades com jogo em formação",
+              lambda: len(matchmaker.queues))
+        watch("blockshuffle_matchmaking_waiting", "Jogadores esperando o jogo lotar",
+              matchmaker.waiting)
+        watch("blockshuffle_matchmaking_matched", "Jogadores sentados em jogos que lotaram",
+              lambda: matchmaker.matched)
+        watch("blockshuffle_matchmaking_wait_avg_seconds", "Tempo médio até o jogo lotar",
+              matchmaker.average_wait)
+        watch("blockshuffle_matchmaking_wait_max_seconds", "Maior tempo até o jogo lotar",
+              lambda: matchmaker.max_wait)
+        if self.executor is not None:
+            watch("blockshuffle_executor_pending", "Tarefas pendentes no executor",
+                  lambda: self.executor.pending)
+            watch("blockshuffle_executor_wait_max_seconds", "Maior espera na fila do executor",
+                  lambda: self.executor.max_wait)
+
+    async def new_board(self, key=QueueKey()):
+        """Entrega (seed, tabuleiro) sem esperar pela geração quando há estoque.
+
+        O estoque só tem tabuleiros do formato padrão (6x6, 4 cores).
+        """
+        standard = (key.rows, key.cols, key.colors) == (6, 6, len(SYMBOLS))
+        if standard and self.board_pool is not None and self.board_pool.boards:
+            seed, board = self.board_pool.take()
+        else:
+            seed = secrets.randbits(64)
+            symbols = palette(key.colors)
+            if self.executor:
+                board = await self.executor.generate_board(seed, key.rows, key.cols, symbols)
+            else:
+                board = seeded_board(seed, key.rows, key.cols, symbols)
+        self.schedule_refill()
+        return seed, board
+
+    def schedule_refill(self):
+        """Reabastece o estoque um tabuleiro por vez, entre outros eventos do loop"""
+        if self.board_pool is None or self.refilling or not self.board_pool.needs_refill():
+            return
+        self.refilling = True
+        asyncio.get_event_loop().call_soon(self._refill_step)
+
+    def _refill_step(self):
+        if self.board_pool.refill_one():
+            asyncio.get_event_loop().call_soon(self._refill_step)
+        else:
+            self.refilling = False
     
-    async def handle_connection(self, websocket):
+    def create_game(self, key):
+        game = Game(self.executor, self.step_delay, capacity=key.players, max_moves=key.moves,
+                    scheduler=self.timers, grace_period=self.grace_period,
+                    snapshot_log=self.snapshot_log, on_close=self.drop_game,
+                    move_log=self.move_log, metrics=self.metrics,
+                    rows=key.rows, cols=key.cols, symbols=palette(key.colors),
+                    event_log=self.event_log, leaderboard=self.results)
+        self.games[game.game_id] = game
+        return game
+
+    def drop_game(self, game):
+        """Esquece um jogo sem ninguém conectado nem ausente"""
+        if self.games.pop(game.game_id, None) is None:
+            return
+        for seat in game.seats.values():
+            self.sessions.pop(seat.token, None)
+        if game.spectators is not None:
+            game.spectators.close()
+        if game.snapshot_log is not None and not game.finished:
+            game.snapshot_log.remove(game.game_id, self.timers)
+
+    def restore(self):
+        """Recarrega os jogos do log de snapshots (início do servidor).
+
+        Só indexa os tokens: o Game é recriado quando o primeiro jogador
+        volta, e um único prazo descarta o que ninguém retomou.
+        """
+        if self.snapshot_log is None:
+            return 0
+        snapshots = self.snapshot_log.load()
+        for record in snapshots.values():
+            for token in record["k"].values():
+                self.sessions[token] = record
+        if snapshots:
+            self.timers.schedule(self.grace_period, self.expire_restored, list(snapshots.values()))
+            print(f"{len(snapshots)} jogos restaurados, aguardando reconexão")
+        return len(snapshots)
+
+    def load_leaderboard(self):
+        """Refaz a classificação com os fins de partida do log de eventos (início do servidor)"""
+        if not self.history_paths:
+            return 0
+        start = time.perf_counter()
+        count = self.leaderboard.rebuild(merge_results(self.history_paths))
+        if count:
+            print(f"Classificação refeita com {count} partidas e {len(self.leaderboard.players)} "
+                  f"jogadores em {time.perf_counter() - start:.2f}s")
+        return count
+
+    def revive(self, record):
+        """Recria o Game de um snapshot na primeira retomada"""
+        game = self.create_game(QueueKey(record["p"], record["m"], record.get("r", 6), record["w"],
+                                         len(record.get("y", SYMBOLS))))
+        del self.games[game.game_id]
+        game.restore(record)
+        self.games[game.game_id] = game
+        for seat in game.seats.values():
+            self.sessions[seat.token] = game
+        return game
+
+    def expire_restored(self, records):
+        for record in records:
+            game = self.games.get(record["id"])
+            if game is not None:
+                game.expire_restored()
+                continue
+            # Ninguém voltou: o jogo sai do log
+            for token in record["k"].values():
+                if self.sessions.get(token) is record:
+                    del self.sessions[token]
+            self.snapshot_log.remove(record["id"], self.timers)
+
+    def new_token(self, game):
+        """Token de retomada; no modo multiprocesso começa pelo worker dono"""
+        token = secrets.token_urlsafe(16)
+        if self.router is not None:
+            token = f"{self.router.worker}-{token}"
+        self.sessions[token] = game
+        return token
+
+    async def handle_spectator(self, websocket, game_id):
+        """Observador somente leitura: ws://host:8765/watch?game=<game_id>"""
+        game = self.games.get(game_id)
+        if game is None:
+            # Sem jogo (ou id desconhecido): devolve a lista dos jogos em andamento
+            await websocket.send(json.dumps({
+                "type": "games",
+                "games": [g.game_id for g in self.games.values() if g.game_started and not g.finished]
+            }))
+            return
+        await game.spectator_channel().follow(websocket, [game.spectator_snapshot()], game.send_timeout)
+
+    async def handle_connection(self, websocket, routed=False):
         """Gerencia novas conexões de jogadores"""
-        if self.waiting_game and len(self.waiting_game.players) < 2:
-            game = self.waiting_game
+        request = getattr(websocket, "request", None)
+        path = request.path if request else getattr(websocket, "path", "")
+        watching, game_id = parse_watch_path(path)
+        if watching:
+            await self.handle_spectator(websocket, game_id)
+            return
+        query = parse_leaderboard_path(path)
+        if query is not None:
+            # Consulta avulsa: responde e encerra
+            await websocket.send(json.dumps(self.leaderboard.query(query)))
+            return
+        token = resume_token_from_path(path)
+        key = queue_key_from_path(path)
+        if self.router is not None and not routed:
+            if token is not None:
+                # O prefixo vem do cliente: fora da faixa de workers, o token
+                # é tratado aqui e cai no resume_error
+                prefix = token.split("-", 1)[0]
+                owner = int(prefix) if prefix.isdigit() else self.router.worker
+                if not 0 <= owner < len(self.router.worker_paths):
+                    owner = self.router.worker
+            else:
+                owner = await self.router.route(key)
+            if owner != self.router.worker:
+                # O jogo está em outro processo: só repassa as mensagens
+                try:
+                    await self.router.relay(websocket, path, owner)
+                except (OSError, websockets.exceptions.WebSocketException) as e:
+                    print(f"Erro ao encaminhar para o worker {owner}: {e}")
+                return
+        if token is not None:
+            await self.resume_player(websocket, token, key)
+            return
+
+        name = player_name_from_path(path)
+        if key.bots:
+            # Partida solo: os tabuleiros dos bots saem antes e o jogador e os
+            # bots sentam sem pausa entre eles, então outro humano que chegue
+            # junto não cai neste jogo
+            boards = [await self.new_board(key) for _ in range(key.players - 1)]
+            game, seat = await self.seat_player(websocket, key, name)
+            for board_seed, board in boards:
+                self.add_bot(key, game, board_seed, board)
         else:
-            game = Game()
-            self.waiting_game = game
-        
-        player_id = f"player{len(game.players) + 1}"
-        game.players[websocket] = {
-            "id": player_id,
-            "score": 0,
-            "ready": False
-        }
-        game.boards[player_id] = generate_board()
-        game.last_move_time[websocket] = asyncio.get_event_loop().time()
-        
-        print(f"Jogador {player_id} conectado")
+            game, seat = await self.seat_player(websocket, key, name)
+        print(f"Jogador {seat.id} conectado")
+        if key.bots and self.router is not None:
+            # Mantém a contagem do broker igual à do jogo
+            for _ in boards:
+                await self.router.route(key)
+        elif not game.full.done() and self.bot_settings.fill_after:
+            self.timers.schedule(self.bot_settings.fill_after, self.fill_with_bots, key, game)
+        await self.play(websocket, game, seat, key, {})
+
+    async def seat_player(self, websocket, key, name=None):
+        """Senta a conexão no jogo em formação da modalidade; retorna (jogo, Seat)"""
+        board_seed, board = await self.new_board(key)
+        game = self.matchmaker.join(key, websocket)
+        seat = game.add_player(websocket, self.new_token(game), board_seed, board, name)
+        self.matchmaker.seated(key, game)
+        return game, seat
+
+    async def fill_with_bots(self, key, game):
+        """Completa com bots o jogo em formação se ainda houver humanos esperando"""
+        while not game.full.done() and has_humans(game):
+            board_seed, board = await self.new_board(key)
+            if game.full.done() or not has_humans(game):
+                return
+            self.add_bot(key, game, board_seed, board)
+            if self.router is not None:
+                # Mantém a contagem do broker igual à do jogo
+                await self.router.route(key)
+
+    def add_bot(self, key, game, board_seed, board):
+        """Senta um bot no jogo em formação, sem pausas (o tabuleiro já foi gerado)"""
+        bot = BotPlayer(game, self.bot_search, self.timers, self.bot_settings.think)
+        self.matchmaker.join(key, bot.connection)
+        seat = game.add_player(bot.connection, self.new_token(game), board_seed, board)
+        # Uma mensagem por jogada: o bot só lê o turn_complete
+        seat.batched = True
+        print(f"Bot {seat.id} entrou no jogo")
+        self.matchmaker.seated(key, game)
+
+    def release_bots(self, key, game):
+        """Tira os bots de um jogo em formação que ficou sem humanos"""
+        for websocket, seat in list(game.players.items()):
+            self.sessions.pop(seat.token, None)
+            websocket.bot.leave()
+            self.matchmaker.leave(key, game, websocket)
+            if self.router is not None:
+                self.router.leave(key)
+
+    async def resume_player(self, websocket, token, key):
+        """Reconexão com ?resume=<token> dentro do prazo de retomada"""
+        game = self.sessions.get(token)
+        if isinstance(game, dict):
+            game = self.revive(game)
+        seat = game.resume(websocket, token) if game else None
+        if seat is None:
+            await websocket.send(json.dumps({
+                "type": "resume_error",
+                "message": "Sessão expirada ou partida encerrada"
+            }))
+            return
+        await self.play(websocket, game, seat, key, {
+            "resumed": True,
+            "score": seat.score,
+            "moves_left": game.max_moves - seat.moves,
+            "scores": game.scores()
+        })
 
-        # Inicia verificação de inatividade
-        inactivity_task = asyncio.create_task(game.check_inactivity(websocket))
+    async def play(self, websocket, game, seat, key, extra):
+        """Envia o init e processa as mensagens do jogador até ele sair"""
+        # Prazo de inatividade, adiado a cada mensagem recebida
+        inactivity = self.timers.schedule(game.inactivity_timeout, game.close_inactive, websocket)
+        if self.metrics is not None:
+            self.metrics.players.inc()
 
         try:
             # Envia dados iniciais
             await websocket.send(json.dumps({
                 "type": "init",
-                "player_id": player_id,
-                "board": game.boards[player_id],
+                "player_id": seat.id,
+                "board": game.board(seat),
                 "max_moves": game.max_moves,
-                "waiting": len(game.players) < 2
+                "waiting": not game.full.done(),
+                "hints": seat.index.hints(HINT_LIMIT),
+                "rows": game.rows,
+                "cols": game.cols,
+                "symbols": game.symbols,
+                "wire_modes": WIRE_MODES,
+                "move_formats": MOVE_FORMATS,
+                "resume_token": seat.token,
+                **extra
             }))
 
-            # Espera ambos jogadores conectarem
-            while len(game.players) < 2:
-                await asyncio.sleep(0.1)
-
-            game.players[websocket]["ready"] = True
-            
-            while not all(p["ready"] for p in game.players.values()):
-                await asyncio.sleep(0.1)
+            # Espera o jogo lotar (ou a conexão cair) sem consultar periodicamente
+            if not game.full.done():
+                # asyncio.wait não cancela o Future compartilhado do jogo
+                closed = asyncio.ensure_future(websocket.wait_closed())
+                await asyncio.wait({game.full, closed}, return_when=asyncio.FIRST_COMPLETED)
+                closed.cancel()
+                if not game.full.done():
+                    return
 
-            game.game_started = True
-            await game.broadcast("game_start")
-            print("Jogo iniciado com ambos jogadores conectados!")
+            if not game.game_started:
+                await game.start()
+                print("Jogo iniciado com todos os jogadores conectados!")
 
             # Processa mensagens do jogador
             async for message in websocket:
-                game.last_move_time[websocket] = asyncio.get_event_loop().time()
-                data = json.loads(message)
+                if inactivity.fired:
+                    # close_inactive já fechou a conexão: o resto é descartado
+                    break
+                inactivity.reschedule(game.inactivity_timeout)
+                # Frames binários só carregam jogadas: dispensam o json.loads
+                if isinstance(message, bytes):
+                    kind, move = "move", message
+                else:
+                    data = json.loads(message)
+                    kind, move = data["type"], data.get("move")
                 
+                if kind == "wire":
+                    game.set_wire_mode(websocket, data)
                 # Bloqueia movimentos antes do jogo começar
-                if data["type"] == "move" and game.game_started:
-                    await game.handle_move(websocket, data)
-                elif data["type"] == "move":
+                elif kind == "move" and game.game_started:
+                    await game.handle_move(websocket, game.read_move(move))
+                elif kind == "move":
                     await websocket.send(json.dumps({
                         "type": "move_error",
                         "message": "Aguardando outro jogador conectar"
                     }))
 
         except (websockets.exceptions.ConnectionClosed, ConnectionResetError):
-            print(f"{player_id} desconectou abruptamente")
+            print(f"{seat.id} desconectou abruptamente")
         finally:
-            inactivity_task.cancel()
+            if self.metrics is not None:
+                self.metrics.players.dec()
+            inactivity.cancel()
             game.handle_disconnect(websocket)
-            if len(game.players) == 0:
-                self.waiting_game = None
+            self.matchmaker.leave(key, game, websocket)
+            if self.router is not None and not game.full.done():
+                self.router.leave(key)
+            if not game.game_started:
+                # Saiu da fila: o token não serve para nada
+                self.sessions.pop(seat.token, None)
+                if not has_humans(game):
+                    self.release_bots(key, game)
+            if not game.players and not game.away:
+                self.drop_game(game)
+
+def has_humans(game):
+    """Se algum jogador conectado ao jogo não é bot"""
+    return any(not is_bot(ws) for ws in game.players)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor do Block Shuffle")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Processos servindo a mesma porta (SO_REUSEPORT, só Linux)")
+    parser.add_argument("--executor", choices=["none", "thread", "process"], default="none",
+                        help="Onde rodar o processamento dos tabuleiros")
+    parser.add_argument("--workers", type=int, default=None, help="Tamanho do pool do executor")
+    parser.add_argument("--max-queue", type=int, default=256,
+                        help="Jogadas pendentes no executor antes de recusar novas")
+    parser.add_argument("--step-delay", type=float, default=1.0,
+                        help="Segundos entre as etapas enviadas a quem não pede batch "
+                             "(padrão de cada jogo; o cliente pode pedir outro ritmo, 0 = de uma vez)")
+    parser.add_argument("--grace", type=float, default=30.0,
+                        help="Segundos para um jogador que caiu voltar com o token (0 desliga)")
+    parser.add_argument("--snapshots", default=None,
+                        help="Arquivo do log de snapshots; os jogos sobrevivem a reinícios")
+    parser.add_argument("--move-log", default=None,
+                        help="Arquivo onde cada partida terminada é registrada (ver replay.py)")
+    parser.add_argument("--events", default=None,
+                        help="Log de eventos das partidas; a classificação é refeita dele no início")
+    parser.add_argument("--cascade-cache", type=int, default=0,
+                        help="Células guardadas no cache de cascatas, por processo (0, o padrão, desliga)")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="Porta HTTP das métricas no formato do Prometheus (0 desliga)")
+    parser.add_argument("--metrics-host", default="127.0.0.1")
+    parser.add_argument("--bot-fill", type=float, default=30.0,
+                        help="Segundos na fila antes de completar o jogo com bots (0 desliga)")
+    parser.add_argument("--bot-strength", type=int, choices=[0, 1, 2], default=2,
+                        help="Força dos bots: 0 aleatório, 1 guloso, 2 olha uma jogada adiante")
+    parser.add_argument("--bot-budget", type=float, default=5.0,
+                        help="Milissegundos de CPU por jogada de bot")
+    parser.add_argument("--bot-think", type=float, default=1.0,
+                        help="Pausa média, em segundos, antes de cada jogada de bot")
+    return parser.parse_args(argv)
+
+def make_manager(args, worker=None):
+    """GameManager (e executor opcional) configurados pelos argumentos"""
+    configure_cascade_cache(args.cascade_cache)
+    executor = None
+    if args.executor != "none":
+        executor = MoveExecutor(args.executor, args.workers, args.max_queue, args.cascade_cache)
+    snapshot_path, move_log_path, events_path = args.snapshots, args.move_log, args.events
+    if worker is not None:
+        # Cada worker tem os seus logs: o jogo pertence a um único processo
+        snapshot_path = snapshot_path and f"{snapshot_path}.{worker}"
+        move_log_path = move_log_path and f"{move_log_path}.{worker}"
+        events_path = events_path and f"{events_path}.{worker}"
+    metrics = None
+    if args.metrics_port:
+        metrics = Metrics(**({"worker": worker} if worker is not None else {}))
+    bot_settings = BotSettings(args.bot_fill, args.bot_strength, args.bot_budget / 1000,
+                               args.bot_think)
+    game_manager = GameManager(pool_size=32, executor=executor, step_delay=args.step_delay,
+                               grace_period=args.grace, snapshot_path=snapshot_path,
+                               move_log_path=move_log_path, metrics=metrics,
+                               bot_settings=bot_settings, events_path=events_path)
+    if worker is not None and args.events:
+        # A classificação de cada worker sai dos fins de partida de todos
+        game_manager.history_paths = [f"{args.events}.{i}" for i in range(args.processes)]
+    return game_manager, executor
+
+async def start_metrics(args, game_manager, worker=None):
+    """Sobe o endpoint /metrics e o monitor do loop; no modo multiprocesso
+    cada worker usa a porta args.metrics_port + índice.
+    """
+    if game_manager.metrics is None:
+        return None
+    registry = game_manager.metrics.registry
+    monitor = LoopLagMonitor(registry)
+    monitor.start()
+    server = MetricsServer(registry, monitor)
+    port = args.metrics_port + (worker or 0)
+    await server.start(args.metrics_host, port)
+    print(f"Métricas em http://{args.metrics_host}:{port}/metrics")
+    return server
 
-async def main():
+async def main(args):
+    game_manager = None
+    executor = None
+    server = None
+    metrics_server = None
     try:
         if sys.platform == "win32":
             asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
         
-        game_manager = GameManager()
-        server = await websockets.serve(game_manager.handle_connection, "0.0.0.0", 8765)
-        print("Servidor rodando na porta 8765 - Aguardando jogadores...")
+        cancel_on_sigterm()
+        game_manager, executor = make_manager(args)
+        game_manager.restore()
+        game_manager.load_leaderboard()
+        game_manager.schedule_refill()
+        metrics_server = await start_metrics(args, game_manager)
+        server = await websockets.serve(game_manager.handle_connection, args.host, args.port)
+        print(f"Servidor rodando na porta {args.port} - Aguardando jogadores...")
         
         await asyncio.get_event_loop().create_future()
         
@@ -286,8 +1292,23 @@ async def main():
     except Exception as e:
         print(f"Erro no servidor: {traceback.format_exc()}")
     finally:
-        server.close()
-        await server.wait_closed()
+        if game_manager and game_manager.snapshot_log:
+            game_manager.snapshot_log.close()
+        if game_manager and game_manager.move_log:
+            game_manager.move_log.close()
+        if game_manager and game_manager.event_log:
+            game_manager.event_log.close()
+        if executor:
+            executor.shutdown()
+        if metrics_server:
+            metrics_server.close()
+        if server:
+            server.close()
+            await server.wait_closed()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = parse_args()
+    if args.processes > 1:
+        run_cluster(args)
+    else:
+        asyncio.run(main(args))
@@ -0,0 +1,194 @@
+from typing import Dict, List, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # NumPy só é necessário para a simulação em lote
+    np = None
+
+from board import SYMBOLS
+
+EMPTY = -1
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("simulate.py precisa do NumPy: pip3 install numpy")
+
+
+class StreamRNG:
+    """Adaptador que entrega a process_move os mesmos sorteios do lote.
+
+    Cada chamada a choice consome o próximo índice da sequência.
+    """
+
+    def __init__(self, stream: Sequence[int]):
+        self.stream = stream
+        self.cursor = 0
+
+    def choice(self, seq):
+        value = seq[int(self.stream[self.cursor])]
+        self.cursor += 1
+        return value
+
+
+def encode_boards(boards: Sequence[Sequence[Sequence[str]]], symbols: Sequence[str] = SYMBOLS):
+    """Converte tabuleiros List[List[str]] para um array (N, linhas, colunas)"""
+    _require_numpy()
+    codes = {symbol: code for code, symbol in enumerate(symbols)}
+    codes[' '] = EMPTY
+    return np.array([[[codes[cell] for cell in row] for row in board] for board in boards], dtype=np.int8)
+
+
+def decode_boards(boards, symbols: Sequence[str] = SYMBOLS) -> List[List[List[str]]]:
+    """Converte o array de volta para List[List[str]] (formato do JSON)"""
+    lookup = list(symbols) + [' ']
+    return [[[lookup[code] for code in row] for row in board] for board in boards.tolist()]
+
+
+def _run_sizes(boards, axis: int):
+    """Tamanho da combinação de cada célula numa direção (0 fora de combinação).
+
+    Segue a regra de board.find_matches: a célula vale o comprimento da
+    sequência contado dela até o fim, com mínimo de 3.
+    """
+    length = boards.shape[axis]
+    same = np.zeros(boards.shape, dtype=bool)
+    # same[..., k] indica que a célula k é igual à seguinte na direção
+    head = [slice(None)] * 3
+    tail = [slice(None)] * 3
+    head[axis] = slice(0, length - 1)
+    tail[axis] = slice(1, length)
+    same[tuple(head)] = (boards[tuple(head)] == boards[tuple(tail)]) & (boards[tuple(head)] != EMPTY)
+
+    forward = np.ones(boards.shape, dtype=np.int16)
+    backward = np.ones(boards.shape, dtype=np.int16)
+    index = [slice(None)] * 3
+    following = [slice(None)] * 3
+    for k in range(length - 2, -1, -1):
+        index[axis], following[axis] = k, k + 1
+        forward[tuple(index)] += np.where(same[tuple(index)], forward[tuple(following)], 0)
+    for k in range(1, length):
+        index[axis], following[axis] = k, k - 1
+        backward[tuple(index)] += np.where(same[tuple(following)], backward[tuple(following)], 0)
+
+    in_run = forward + backward - 1 >= 3
+    return np.where(in_run, np.maximum(forward, 3), 0)
+
+
+def match_sizes(boards):
+    """Tamanho por célula: a vertical tem prioridade sobre a horizontal"""
+    vertical = _run_sizes(boards, 1)
+    horizontal = _run_sizes(boards, 2)
+    return np.where(vertical > 0, vertical, horizontal)
+
+
+def _apply_gravity(boards):
+    """Compacta as peças de cada coluna para baixo, mantendo a ordem"""
+    occupied = boards != EMPTY
+    # Ordenação estável: vazios (False) sobem, peças mantêm a ordem relativa
+    order = np.argsort(occupied, axis=1, kind="stable")
+    return np.take_along_axis(boards, order, axis=1)
+
+
+class _Streams:
+    """Sorteios por jogo; com um Generator, cresce sob demanda em blocos"""
+
+    def __init__(self, values, rng=None, n_symbols: int = 0, block: int = 0):
+        self.values = values
+        self.rng = rng
+        self.n_symbols = n_symbols
+        self.block = block
+        self.cursor = np.zeros(values.shape[0], dtype=np.int64)
+
+    def take(self, games, counts):
+        """Reserva counts sorteios para cada jogo; retorna os inícios"""
+        needed = int((self.cursor[games] + counts).max(initial=0))
+        if needed > self.values.shape[1]:
+            if self.rng is None:
+                raise ValueError("streams não tem sorteios suficientes para a cascata")
+            extra = max(self.block, needed - self.values.shape[1])
+            more = self.rng.integers(0, self.n_symbols, size=(self.values.shape[0], extra), dtype=np.int8)
+            self.values = np.concatenate([self.values, more], axis=1)
+        start = self.cursor[games].copy()
+        self.cursor[games] += counts
+        return start
+
+
+def simulate_moves(boards, swaps, rng=None, streams=None, symbols: Sequence[str] = SYMBOLS,
+                   max_rounds: int = 100) -> Dict:
+    """Processa N jogadas de uma vez.
+
+    boards: array (N, linhas, colunas) de códigos de símbolo (encode_boards).
+    swaps: array (N, 4) com linha1, coluna1, linha2, coluna2 (base 0).
+    rng: np.random.Generator usado para as reposições, ou streams: array
+    (N, K) com os índices de símbolo já sorteados para cada jogo.
+
+    Retorna um dict com "boards", "points", "depth" (rodadas da cascata)
+    e "valid" por jogo. Jogadas sem combinação mantêm o tabuleiro original.
+    Com os mesmos sorteios (StreamRNG), o resultado de cada jogo é igual ao
+    de board.process_move.
+    """
+    _require_numpy()
+    boards = np.array(boards, dtype=np.int8)
+    swaps = np.asarray(swaps, dtype=np.int64)
+    games, rows, cols = boards.shape
+    if swaps.shape != (games, 4):
+        raise ValueError("swaps deve ter formato (N, 4)")
+    if ((swaps[:, [0, 2]] < 0) | (swaps[:, [0, 2]] >= rows)
+            | (swaps[:, [1, 3]] < 0) | (swaps[:, [1, 3]] >= cols)).any():
+        raise ValueError("Coordenadas fora do tabuleiro")
+
+    if streams is not None:
+        draws = _Streams(np.asarray(streams, dtype=np.int8))
+    else:
+        rng = rng if rng is not None else np.random.default_rng()
+        block = rows * cols
+        draws = _Streams(rng.integers(0, len(symbols), size=(games, block), dtype=np.int8),
+                         rng, len(symbols), block)
+
+    game = np.arange(games)
+    current = boards.copy()
+    first = current[game, swaps[:, 0], swaps[:, 1]].copy()
+    current[game, swaps[:, 0], swaps[:, 1]] = current[game, swaps[:, 2], swaps[:, 3]]
+    current[game, swaps[:, 2], swaps[:, 3]] = first
+
+    points = np.zeros(games, dtype=np.int64)
+    depth = np.zeros(games, dtype=np.int32)
+    sizes = match_sizes(current)
+    valid = (sizes > 0).any(axis=(1, 2))
+    active = np.flatnonzero(valid)
+
+    for _ in range(max_rounds):
+        if not active.size:
+            break
+        work = current[active]
+        work_sizes = sizes[active]
+        matched = work_sizes > 0
+
+        points[active] += np.where(matched, 100 + 50 * (work_sizes - 3), 0).sum(axis=(1, 2))
+        depth[active] += 1
+        work[matched] = EMPTY
+        work = _apply_gravity(work)
+
+        # Reposição em ordem de linha, como board.fill_board
+        holes = (work == EMPTY).reshape(len(active), -1)
+        counts = holes.sum(axis=1)
+        start = draws.take(active, counts)
+        rank = np.cumsum(holes, axis=1) - 1
+        picks = draws.values[active[:, None], start[:, None] + rank]
+        flat = work.reshape(len(active), -1)
+        flat[holes] = picks[holes]
+        work = flat.reshape(work.shape)
+
+        current[active] = work
+        work_sizes = match_sizes(work)
+        sizes[active] = work_sizes
+        active = active[(work_sizes > 0).any(axis=(1, 2))]
+
+    current[~valid] = boards[~valid]
+    return {
+        "boards": current,
+        "points": points,
+        "depth": depth,
+        "valid": valid,
+    }
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import os
+from typing import Dict
+
+
+class SnapshotLog:
+    """Estado dos jogos em andamento num log só de acréscimos (uma linha JSON por snapshot).
+
+    mark(game) só anota o jogo como alterado; flush, chamado a cada interval
+    segundos pelo agendador, serializa todos os jogos anotados e grava o lote
+    numa thread, sem bloquear o loop. A última linha de cada jogo vale; uma
+    linha {"id": ..., "end": 1} remove o jogo. Quando o log cresce demais em
+    relação aos jogos vivos, ele é reescrito só com as linhas atuais.
+    """
+
+    def __init__(self, path: str, interval: float = 0.5, compact_ratio: int = 4):
+        self.path = path
+        self.interval = interval
+        self.compact_ratio = compact_ratio
+        self.dirty = {}    # game_id -> jogo com alterações ainda não gravadas
+        self.latest = {}   # game_id -> última linha gravada (base da compactação)
+        self.lines = 0
+        self.writing = False
+        self.timer = None
+
+    def load(self) -> Dict[int, Dict]:
+        """Lê o log inteiro de uma vez e o reescreve compactado; retorna os snapshots vivos"""
+        snapshots = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Última linha cortada por uma queda no meio da gravação
+                        continue
+                    if record.get("end"):
+                        snapshots.pop(record["id"], None)
+                        self.latest.pop(record["id"], None)
+                    else:
+                        snapshots[record["id"]] = record
+                        self.latest[record["id"]] = line if line.endswith("\n") else line + "\n"
+        self._rewrite(list(self.latest.values()))
+        self.lines = len(self.latest)
+        return snapshots
+
+    def mark(self, game, scheduler):
+        """Anota o jogo para o próximo lote"""
+        self.dirty[game.game_id] = game
+        if self.timer is None:
+            self.timer = scheduler.schedule(self.interval, self.flush, scheduler)
+
+    def remove(self, game_id, scheduler):
+        """Jogo terminado: sai do log no próximo lote"""
+        self.dirty[game_id] = None
+        if self.timer is None:
+            self.timer = scheduler.schedule(self.interval, self.flush, scheduler)
+
+    async def flush(self, scheduler=None):
+        self.timer = None
+        if self.writing:
+            # Um lote ainda está sendo gravado; este fica para a próxima rodada
+            if scheduler is not None:
+                self.timer = scheduler.schedule(self.interval, self.flush, scheduler)
+            return
+        chunk = self._collect()
+        if not chunk:
+            return
+        compact = self.lines > max(1000, self.compact_ratio * len(self.latest))
+        self.writing = True
+        try:
+            loop = asyncio.get_running_loop()
+            if compact:
+                self.lines = len(self.latest)
+                await loop.run_in_executor(None, self._rewrite, list(self.latest.values()))
+            else:
+                await loop.run_in_executor(None, self._append, "".join(chunk))
+        except OSError as e:
+            print(f"Erro ao gravar snapshots: {e}")
+        finally:
+            self.writing = False
+
+    def close(self):
+        """Grava o que falta de forma síncrona (encerramento do servidor)"""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        chunk = self._collect()
+        if chunk:
+            self._append("".join(chunk))
+
+    def _collect(self):
+        """Serializa os jogos anotados; retorna as linhas a acrescentar"""
+        dirty, self.dirty = self.dirty, {}
+        chunk = []
+        for game_id, game in dirty.items():
+            if game is None:
+                if self.latest.pop(game_id, None) is not None:
+                    chunk.append(json.dumps({"id": game_id, "end": 1}) + "\n")
+            else:
+                line = json.dumps(game.snapshot(), separators=(",", ":")) + "\n"
+                self.latest[game_id] = line
+                chunk.append(line)
+        self.lines += len(chunk)
+        return chunk
+
+    def _append(self, text: str):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(text)
+
+    def _rewrite(self, lines):
+        # Arquivo novo e troca atômica: uma queda no meio mantém o log antigo
+        temp = self.path + ".tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        os.replace(temp, self.path)
@@ -0,0 +1,71 @@
+import asyncio
+from typing import Iterable, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import websockets
+
+
+def parse_watch_path(path: str) -> Tuple[bool, Optional[int]]:
+    """Reconhece ws://host:8765/watch?game=<id>; retorna (é observador, id do jogo)"""
+    parts = urlsplit(path or "")
+    if parts.path.rstrip("/") != "/watch":
+        return False, None
+    try:
+        return True, int(parse_qs(parts.query)["game"][0])
+    except (KeyError, ValueError):
+        return True, None
+
+
+class SpectatorChannel:
+    """Canal somente leitura de um jogo para observadores.
+
+    Guarda apenas a mensagem mais recente de cada chave (tabuleiro de cada
+    jogador, placar, eventos) com um número de sequência. Cada observador só
+    lembra a última sequência que recebeu: quem fica para trás pula direto
+    para o estado mais novo, e publicar custa O(1) para o jogo.
+    """
+
+    def __init__(self):
+        self.latest = {}
+        self.seq = 0
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+        self.closed = False
+
+    def publish(self, key, payload: str):
+        """Registra o payload já serializado como estado atual de key"""
+        self.seq += 1
+        self.latest[key] = (self.seq, payload)
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def close(self):
+        """Fim do jogo: os observadores recebem o que falta e saem"""
+        self.closed = True
+        self.changed.set()
+
+    async def follow(self, websocket, snapshot: Iterable[str], send_timeout: float = 2.0):
+        """Envia o estado inicial e depois as atualizações até o jogo acabar"""
+        self.subscribers += 1
+        last = self.seq
+        try:
+            for payload in snapshot:
+                await websocket.send(payload)
+            while True:
+                if last == self.seq:
+                    if self.closed:
+                        break
+                    await self.changed.wait()
+                    continue
+                pending = sorted(item for item in self.latest.values() if item[0] > last)
+                for seq, payload in pending:
+                    try:
+                        await asyncio.wait_for(websocket.send(payload), send_timeout)
+                    except asyncio.TimeoutError:
+                        # Observador lento: o próximo envio já leva o estado mais novo
+                        pass
+                    last = seq
+        except (websockets.exceptions.ConnectionClosed, ConnectionResetError):
+            pass
+        finally:
+            self.subscribers -= 1
@@ -0,0 +1,123 @@
+import os
+import random
+
+from bitboard import BitBoard
+from board import (CascadeCache, apply_gravity, calculate_points, fill_board,
+                   find_matches, match_cells, palette, process_move)
+
+# Quantidade de tabuleiros sorteados por teste e semente fixa, para a falha se
+# repetir. O padrão é curto para rodar sempre; antes de mexer no motor de bits
+# rode uma vez com BITBOARD_BOARDS=100000 (alguns minutos). test_simulate.py
+# usa os mesmos valores
+BOARDS = int(os.environ.get("BITBOARD_BOARDS", "300"))
+SEED = int(os.environ.get("BITBOARD_SEED", "2024"))
+
+
+def random_board(rng: random.Random):
+    """Tabuleiro qualquer, sem garantir que esteja estável (pode ter combinações)"""
+    rows, cols = rng.randint(3, 12), rng.randint(3, 12)
+    symbols = palette(rng.randint(3, 5))
+    return [[rng.choice(symbols) for _ in range(cols)] for _ in range(rows)], symbols
+
+
+def random_swap(rng: random.Random, rows: int, cols: int):
+    if rng.random() < 0.5 and cols > 1:
+        i, j = rng.randrange(rows), rng.randrange(cols - 1)
+        return i, j, i, j + 1
+    i, j = rng.randrange(rows - 1), rng.randrange(cols)
+    return i, j, i + 1, j
+
+
+def reference_move(board, move, rng, symbols):
+    """process_move só com as funções em listas (varredura completa a cada rodada)"""
+    row1, col1, row2, col2 = move
+    current = [row.copy() for row in board]
+    current[row1][col1], current[row2][col2] = current[row2][col2], current[row1][col1]
+    matches = find_matches(current)
+    if not matches:
+        return False, board, 0
+    points = 0
+    while matches:
+        points += calculate_points(matches)
+        for i, j in matches:
+            current[i][j] = ' '
+        apply_gravity(current)
+        fill_board(current, rng, symbols)
+        matches = find_matches(current)
+    return True, current, points
+
+
+def with_holes(board, rng: random.Random):
+    """Cópia com uma fração sorteada das células vazias (' ')"""
+    fraction = rng.random() * 0.5
+    return [[' ' if rng.random() < fraction else cell for cell in row] for row in board]
+
+
+def test_list_functions_equal_bitboard():
+    """find_matches, apply_gravity e fill_board (em listas) fazem o mesmo que o motor de
+    bits, em tabuleiros com buracos; BITBOARD_BOARDS tabuleiros"""
+    rng = random.Random(SEED + 2)
+    for _ in range(BOARDS):
+        board, symbols = random_board(rng)
+        board = with_holes(board, rng)
+        bitboard = BitBoard.from_rows(board)
+        assert find_matches(board) == match_cells(bitboard, bitboard.match_sizes())
+
+        fallen = [row.copy() for row in board]
+        apply_gravity(fallen)
+        bitboard.apply_gravity()
+        assert bitboard.to_rows() == fallen
+
+        seed = rng.random()
+        fill_board(fallen, random.Random(seed), symbols)
+        bitboard.fill(symbols, random.Random(seed))
+        assert bitboard.to_rows() == fallen
+
+
+def test_incremental_matches_equal_full_scan():
+    """A busca só nas linhas/colunas alteradas acha o mesmo que find_matches, rodada a
+    rodada; BITBOARD_BOARDS tabuleiros, três trocas em cada"""
+    rng = random.Random(SEED)
+    for _ in range(BOARDS):
+        board, symbols = random_board(rng)
+        rows, cols = len(board), len(board[0])
+        bitboard = BitBoard.from_rows(board)
+        # Três trocas seguidas; a primeira busca é completa, as outras incrementais
+        for _ in range(3):
+            row1, col1, row2, col2 = random_swap(rng, rows, cols)
+            stride = bitboard.layout.stride
+            bitboard.swap(row1 * stride + col1, row2 * stride + col2)
+            sizes = bitboard.match_sizes()
+            while True:
+                full = find_matches(bitboard.to_rows())
+                assert match_cells(bitboard, sizes) == full
+                if not sizes:
+                    break
+                cleared = 0
+                for mask in sizes.values():
+                    cleared |= mask
+                bitboard.clear(cleared)
+                bitboard.apply_gravity()
+                bitboard.fill(symbols, rng)
+                sizes = bitboard.match_sizes()
+
+
+def test_process_move_equals_full_scan_reference():
+    """process_move (motor de bits, com e sem cache) refaz a cascata das funções em listas,
+    inclusive em tabuleiros que chegam com combinações pendentes; BITBOARD_BOARDS jogadas"""
+    rng = random.Random(SEED + 1)
+    cache = CascadeCache()
+    pending = 0
+    for _ in range(BOARDS):
+        board, symbols = random_board(rng)
+        pending += bool(find_matches(board))
+        move = random_swap(rng, len(board), len(board[0]))
+        seed = rng.random()
+        valid, expected, points = reference_move(board, move, random.Random(seed), symbols)
+        for used in (None, cache, cache):
+            result = process_move(board, move, random.Random(seed), symbols, cache=used)
+            assert result["valid"] == valid
+            assert result["board"] == expected
+            assert result["points"] == points
+    # Os tabuleiros sorteados não são estáveis: o caso das pendentes foi exercitado
+    assert pending > 0
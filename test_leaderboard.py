@@ -0,0 +1,145 @@
+import bisect
+import json
+import random
+
+from events import merge_results
+from leaderboard import INITIAL_RATING, K_FACTOR, Leaderboard, RankTree
+
+SEED = 2024
+
+
+def check_tree(tree: RankTree, keys):
+    """Compara a árvore com a lista ordenada das mesmas chaves"""
+    assert len(tree) == len(keys)
+    assert list(tree.first(len(keys) + 1)) == keys
+    for k, key in enumerate(keys):
+        assert tree.nth(k) == key
+        assert tree.rank(key) == bisect.bisect_left(keys, key)
+    for probe in (-1, 500, 1001):
+        assert tree.rank(probe) == bisect.bisect_left(keys, probe)
+
+
+def mutate(tree: RankTree, keys, rng: random.Random, steps: int):
+    """Inserções e remoções sorteadas, conferindo a árvore depois de cada uma"""
+    for _ in range(steps):
+        if keys and rng.random() < 0.4:
+            key = keys.pop(rng.randrange(len(keys)))
+            tree.remove(key)
+        else:
+            key = rng.randrange(1000)
+            tree.insert(key)
+            bisect.insort(keys, key)
+        check_tree(tree, keys)
+
+
+def test_rank_tree_insert_remove():
+    """insert/remove em sequência, inclusive chaves repetidas e a árvore esvaziando"""
+    rng = random.Random(SEED)
+    tree, keys = RankTree(random.Random(SEED)), []
+    mutate(tree, keys, rng, 400)
+    while keys:
+        tree.remove(keys.pop(rng.randrange(len(keys))))
+        check_tree(tree, keys)
+
+
+def test_rank_tree_build_then_update():
+    """A árvore montada de uma vez continua certa depois de inserções e remoções"""
+    rng = random.Random(SEED + 1)
+    for size in (0, 1, 2, 7, 64, 300):
+        keys = sorted(rng.randrange(1000) for _ in range(size))
+        tree = RankTree.build(keys, random.Random(size))
+        check_tree(tree, keys)
+        mutate(tree, keys, rng, 100)
+
+
+def result(scores, names, winner, t=0.0):
+    return {"e": "end", "g": 1, "t": t, "w": winner, "s": scores, "n": names}
+
+
+def test_elo_two_players():
+    board = Leaderboard()
+    board.record(result({"player1": 300, "player2": 100},
+                        {"player1": "ana", "player2": "bia"}, "player1"))
+    ana, bia = board.players["ana"], board.players["bia"]
+    # Mesmo rating: metade de K para cada lado
+    assert ana.rating == INITIAL_RATING + K_FACTOR / 2
+    assert bia.rating == INITIAL_RATING - K_FACTOR / 2
+    assert (ana.games, ana.wins, ana.best) == (1, 1, 300)
+    assert (bia.games, bia.wins, bia.best) == (1, 0, 100)
+    assert board.rank("ana") == 1 and board.rank("bia") == 2
+    assert board.rank("bia", by="score") == 2
+
+    # O favorito ganha menos do que perde
+    board.record(result({"player1": 500, "player2": 50},
+                        {"player1": "ana", "player2": "bia"}, "player1"))
+    gain = ana.rating - (INITIAL_RATING + K_FACTOR / 2)
+    assert 0 < gain < K_FACTOR / 2
+    assert abs(ana.rating + bia.rating - 2 * INITIAL_RATING) < 1e-9
+
+
+def test_elo_draw_and_multiplayer():
+    board = Leaderboard()
+    board.record(result({"player1": 200, "player2": 200},
+                        {"player1": "ana", "player2": "bia"}, "player1"))
+    assert board.players["ana"].rating == board.players["bia"].rating == INITIAL_RATING
+    # Empate divide a posição
+    assert board.rank("ana") == board.rank("bia") == 1
+
+    board = Leaderboard()
+    board.record(result({"player1": 300, "player2": 200, "player3": 100},
+                        {"player1": "ana", "player2": "bia", "player3": "caio"}, "player1"))
+    # K dividido pelos adversários: contra dois, cada confronto vale K/2
+    assert board.players["ana"].rating == INITIAL_RATING + K_FACTOR / 2
+    assert board.players["bia"].rating == INITIAL_RATING
+    assert board.players["caio"].rating == INITIAL_RATING - K_FACTOR / 2
+    assert [entry["name"] for entry in board.top(3)] == ["ana", "bia", "caio"]
+
+
+def test_unrated_games_still_count_best_score():
+    """Um só jogador com nome (o resto bots/anônimos) ou o mesmo nome duas vezes: sem Elo"""
+    board = Leaderboard()
+    board.record(result({"player1": 100, "player2": 900}, {"player1": "ana"}, "player2"))
+    board.record(result({"player1": 400, "player2": 250},
+                        {"player1": "ana", "player2": "ana"}, "player1"))
+    ana = board.players["ana"]
+    assert ana.rating == INITIAL_RATING
+    assert (ana.games, ana.wins, ana.best) == (2, 1, 400)
+    board.record(result({"player1": 1}, {}, "player1"))
+    assert len(board.players) == 1
+
+
+def random_results(rng: random.Random, count: int):
+    names = [f"jogador{i}" for i in range(12)]
+    results = []
+    for k in range(count):
+        seats = rng.randint(2, 4)
+        scores = {f"player{i + 1}": rng.randrange(0, 2000, 50) for i in range(seats)}
+        named = {player_id: rng.choice(names) for player_id in scores if rng.random() < 0.8}
+        winner = max(scores, key=scores.get)
+        results.append(result(scores, named, winner, t=float(k)))
+    return results
+
+
+def test_rebuild_equals_incremental():
+    """rebuild (árvores montadas no fim) dá a mesma classificação que record um a um"""
+    results = random_results(random.Random(SEED), 300)
+    incremental = Leaderboard()
+    for item in results:
+        incremental.record(item)
+    rebuilt = Leaderboard()
+    assert rebuilt.rebuild(iter(results)) == len(results)
+    for by in Leaderboard.BOARDS:
+        assert rebuilt.top(100, by) == incremental.top(100, by)
+        for name in incremental.players:
+            assert rebuilt.rank(name, by) == incremental.rank(name, by)
+
+
+def test_merge_results_from_worker_logs(tmp_path):
+    """Os logs de cada worker são lidos como uma só sequência, pelo horário do fim"""
+    results = random_results(random.Random(SEED + 1), 60)
+    paths = [str(tmp_path / f"events.log.{worker}") for worker in range(3)]
+    for k, item in enumerate(results):
+        with open(paths[k % 3 if k % 5 else 0], "a", encoding="utf-8") as f:
+            f.write(json.dumps({"e": "move", "g": 1}) + "\n")
+            f.write(json.dumps(item, separators=(",", ":")) + "\n")
+    assert list(merge_results(paths + [str(tmp_path / "ausente")])) == results
@@ -0,0 +1,54 @@
+import asyncio
+import json
+
+from matchmaking import QueueKey
+from memory_bench import fill_games
+from replay import MoveLog, verify_game
+from server import GameManager
+
+
+def record_games(path: str, key: QueueKey, sessions: int):
+    """Joga partidas completas (jogadas válidas até o fim) gravando o log de jogadas em path"""
+    async def play():
+        manager = GameManager(move_log_path=path)
+        games = await fill_games(manager, key, sessions, key.moves)
+        manager.move_log.close()
+        return games
+
+    games = asyncio.run(play())
+    assert games and all(game.finished for game in games)
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_recorded_games_replay_without_divergence(tmp_path):
+    """As partidas gravadas por MoveLog são refeitas por verify_game com o mesmo placar"""
+    for k, key in enumerate((QueueKey(), QueueKey(3, 4, 8, 5, 5))):
+        records = record_games(str(tmp_path / f"moves.log.{k}"), key, key.players * 2)
+        assert len(records) == 2
+        for record in records:
+            assert len(record["moves"]) == key.players * key.moves
+            result = verify_game(record)
+            assert result["mismatches"] == []
+            assert result["ok"]
+
+
+def test_flush_waits_for_write_in_flight(tmp_path):
+    """Um flush durante uma gravação não começa outra: as linhas esperam a próxima rodada"""
+    log = MoveLog(str(tmp_path / "moves.log"))
+    log.pending = ["a\n"]
+
+    async def overlap():
+        first = asyncio.ensure_future(log.flush())
+        await asyncio.sleep(0)
+        assert log.writing
+        log.pending.append("b\n")
+        await log.flush()
+        assert log.pending == ["b\n"]
+        await first
+        assert not log.writing
+        await log.flush()
+
+    asyncio.run(overlap())
+    with open(log.path, encoding="utf-8") as f:
+        assert f.read() == "a\nb\n"
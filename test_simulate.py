@@ -0,0 +1,33 @@
+import random
+
+import pytest
+
+from board import palette, process_move
+from simulate import StreamRNG, decode_boards, encode_boards, simulate_moves
+from test_bitboard import BOARDS, SEED, random_swap
+
+# simulate.py importa sem o NumPy; só a simulação precisa dele
+np = pytest.importorskip("numpy")
+
+
+def test_simulate_moves_equals_process_move():
+    """simulate_moves dá, jogo a jogo, a mesma validade, tabuleiro, pontos e profundidade
+    de process_move com os mesmos sorteios (StreamRNG); BITBOARD_BOARDS jogos por formato"""
+    rng = random.Random(SEED + 3)
+    draws = np.random.default_rng(SEED)
+    for rows, cols, colors in ((6, 6, 6), (8, 5, 4), (12, 12, 3)):
+        symbols = palette(colors)
+        boards = [[[rng.choice(symbols) for _ in range(cols)] for _ in range(rows)]
+                  for _ in range(BOARDS)]
+        swaps = [random_swap(rng, rows, cols) for _ in range(BOARDS)]
+        # Sorteios de sobra: cascatas longas repõem o tabuleiro várias vezes
+        streams = draws.integers(0, colors, size=(BOARDS, rows * cols * 20), dtype=np.int8)
+        result = simulate_moves(encode_boards(boards, symbols), swaps, streams=streams,
+                                symbols=symbols)
+        finals = decode_boards(result["boards"], symbols)
+        for k in range(BOARDS):
+            expected = process_move(boards[k], swaps[k], StreamRNG(streams[k]), symbols)
+            assert bool(result["valid"][k]) == expected["valid"]
+            assert finals[k] == expected["board"]
+            assert int(result["points"][k]) == expected["points"]
+            assert int(result["depth"][k]) == len(expected["steps"]) // 2
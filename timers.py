@@ -0,0 +1,120 @@
+import asyncio
+import heapq
+import itertools
+
+
+class Timer:
+    """Prazo cancelável registrado num Scheduler"""
+
+    __slots__ = ("scheduler", "deadline", "queued_at", "callback", "args", "cancelled")
+
+    def __init__(self, scheduler, deadline, callback, args):
+        self.scheduler = scheduler
+        self.deadline = deadline
+        self.queued_at = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    @property
+    def fired(self) -> bool:
+        """O prazo venceu e o callback já foi chamado"""
+        return self.scheduler is None
+
+    def reschedule(self, delay: float):
+        """Adia (ou antecipa) o prazo para daqui a delay segundos.
+
+        Adiar só troca o número: a entrada antiga do heap é reaproveitada
+        quando vencer. Antecipar insere uma nova entrada. Um timer que já
+        disparou não volta: reschedule não faz nada.
+        """
+        if self.scheduler is None:
+            return
+        self.deadline = self.scheduler.now() + delay
+        if self.deadline < self.queued_at:
+            self.scheduler._push(self)
+
+    def cancel(self):
+        if self.scheduler is not None and not self.cancelled:
+            self.cancelled = True
+            self.scheduler._discard()
+
+
+class Scheduler:
+    """Todos os prazos do processo num único heap.
+
+    Só existe um callback armado no loop, para o prazo mais próximo; o custo
+    cresce com o número de prazos que vencem, não com o número de jogos.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.counter = itertools.count()
+        self.handle = None
+        self.armed_for = None
+        self.stale = 0
+
+    def now(self) -> float:
+        return asyncio.get_event_loop().time()
+
+    def schedule(self, delay: float, callback, *args) -> Timer:
+        """Chama callback(*args) daqui a delay segundos; corrotinas viram tasks"""
+        timer = Timer(self, self.now() + delay, callback, args)
+        self._push(timer)
+        return timer
+
+    def __len__(self):
+        return len(self.heap)
+
+    def _discard(self):
+        # Entradas canceladas saem do heap quando vencem; se forem a maioria,
+        # reconstrói o heap para não guardar lixo de prazos longos
+        self.stale += 1
+        if self.stale > 64 and self.stale * 2 > len(self.heap):
+            self.heap = [entry for entry in self.heap
+                         if not entry[2].cancelled and entry[0] == entry[2].queued_at]
+            heapq.heapify(self.heap)
+            self.stale = 0
+
+    def _push(self, timer: Timer):
+        timer.queued_at = timer.deadline
+        heapq.heappush(self.heap, (timer.deadline, next(self.counter), timer))
+        self._arm()
+
+    def _arm(self):
+        if not self.heap:
+            return
+        first = self.heap[0][0]
+        if self.handle is not None and self.armed_for <= first:
+            return
+        if self.handle is not None:
+            self.handle.cancel()
+        self.armed_for = first
+        self.handle = asyncio.get_event_loop().call_at(first, self._fire)
+
+    def _fire(self):
+        self.handle = None
+        # O loop pode disparar call_at um pouco antes do horário exato
+        now = self.now() + 0.001
+        heap = self.heap
+        while heap and heap[0][0] <= now:
+            queued_at, _, timer = heapq.heappop(heap)
+            # Entrada antiga de um timer cancelado ou antecipado
+            if timer.cancelled or queued_at != timer.queued_at:
+                if timer.cancelled:
+                    self.stale = max(self.stale - 1, 0)
+                continue
+            # Timer adiado: volta para o heap com o novo prazo
+            if timer.deadline > queued_at:
+                timer.queued_at = timer.deadline
+                heapq.heappush(heap, (timer.deadline, next(self.counter), timer))
+                continue
+            # Já disparou: cancel() passa a ser inócuo
+            timer.scheduler = None
+            try:
+                result = timer.callback(*timer.args)
+                if asyncio.iscoroutine(result):
+                    asyncio.ensure_future(result)
+            except Exception as e:
+                print(f"Erro no timer: {e}")
+        self._arm()
@@ -0,0 +1,134 @@
+import asyncio
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Sequence
+from board import (SYMBOLS, configure_cascade_cache, pack_board, process_cache, process_move,
+                   seeded_board, unpack_board)
+
+
+def _timed(submitted, func, *args):
+    """Roda no worker: devolve o tempo de espera na fila junto com o resultado"""
+    waited = time.monotonic() - submitted
+    return waited, func(*args)
+
+
+def _packed_move(board_text: str, cols: int, move, seed: str = None,
+                 symbols: str = "".join(SYMBOLS)) -> Dict:
+    """process_move com tabuleiros compactos na ida e na volta"""
+    rng = random.Random(seed) if seed is not None else None
+    result = process_move(unpack_board(board_text, cols), move, rng, list(symbols), process_cache())
+    result["board"] = pack_board(result["board"])
+    for step in result["steps"]:
+        step["board"] = pack_board(step["board"])
+    return result
+
+
+def _packed_board(seed: int, rows: int, cols: int, symbols: str) -> str:
+    return pack_board(seeded_board(seed, rows, cols, list(symbols)))
+
+
+def _bot_move(packed: str, cols: int, strength: int, budget: float, seed: float):
+    # Importado aqui porque bots importa este módulo
+    from bots import MoveSearch
+
+    return MoveSearch(strength, budget, random.Random(seed)).choose(packed, cols)
+
+
+class ExecutorBusy(Exception):
+    """A fila do executor está cheia; a jogada deve ser recusada"""
+
+
+class MoveExecutor:
+    """Executa o trabalho de tabuleiro fora do loop do asyncio.
+
+    mode "process" usa um ProcessPoolExecutor (paralelismo real) e "thread"
+    um ThreadPoolExecutor. Os tabuleiros viajam como strings (pack_board).
+    As jogadas de um mesmo jogador são executadas em ordem; com max_queue
+    tarefas pendentes, novas submissões levantam ExecutorBusy.
+    """
+
+    def __init__(self, mode: str = "process", workers: int = None, max_queue: int = 256,
+                 cache_cells: int = None):
+        if mode == "process":
+            # Cada processo tem o seu cascade_cache; cache_cells o dimensiona
+            initializer = configure_cascade_cache if cache_cells is not None else None
+            initargs = (cache_cells,) if cache_cells is not None else ()
+            self.pool = ProcessPoolExecutor(max_workers=workers, initializer=initializer,
+                                            initargs=initargs)
+        elif mode == "thread":
+            self.pool = ThreadPoolExecutor(max_workers=workers)
+        else:
+            raise ValueError(f"Modo de executor desconhecido: {mode}")
+        self.mode = mode
+        self.max_queue = max_queue
+        self.pending = 0
+        self.locks = {}
+        self.waits = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def _submit(self, func, *args):
+        if self.pending >= self.max_queue:
+            raise ExecutorBusy()
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            waited, result = await loop.run_in_executor(
+                self.pool, _timed, time.monotonic(), func, *args)
+        finally:
+            self.pending -= 1
+        self.waits += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        return result
+
+    async def process_move(self, key, board: List[List[str]], move, seed: str = None,
+                           symbols: Sequence[str] = SYMBOLS) -> Dict:
+        """Roda process_move no pool, em ordem para cada chave (jogador).
+
+        move é o texto ou a tupla de coordenadas aceitos por process_move;
+        seed (opcional) semeia o random.Random das reposições no worker.
+        """
+        lock = self.locks.get(key)
+        if lock is None:
+            lock = self.locks[key] = asyncio.Lock()
+        async with lock:
+            cols = len(board[0])
+            result = await self._submit(_packed_move, pack_board(board), cols, move, seed,
+                                        "".join(symbols))
+        result["board"] = unpack_board(result["board"], cols)
+        for step in result["steps"]:
+            step["board"] = unpack_board(step["board"], cols)
+        return result
+
+    def forget(self, key):
+        """Descarta o estado de ordenação de um jogador que saiu"""
+        self.locks.pop(key, None)
+
+    async def generate_board(self, seed: int, rows: int = 6, cols: int = 6,
+                             symbols: Sequence[str] = SYMBOLS) -> List[List[str]]:
+        """seeded_board(seed, rows, cols, symbols) no pool"""
+        return unpack_board(await self._submit(_packed_board, seed, rows, cols, "".join(symbols)), cols)
+
+    async def choose_move(self, search, packed: str, cols: int):
+        """search.choose(packed, cols) (bots.MoveSearch) no pool.
+
+        A semente sai do rng da busca a cada chamada: no worker a cópia do rng
+        não voltaria, e o bot repetiria o mesmo sorteio.
+        """
+        return await self._submit(_bot_move, packed, cols, search.strength, search.budget,
+                                  search.rng.random())
+
+    def stats(self) -> Dict:
+        """Tempo de espera na fila, para dimensionar o pool"""
+        return {
+            "mode": self.mode,
+            "pending": self.pending,
+            "completed": self.waits,
+            "avg_wait": self.total_wait / self.waits if self.waits else 0.0,
+            "max_wait": self.max_wait,
+        }
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)